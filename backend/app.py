@@ -1,13 +1,21 @@
+import time
+# Taken before the other imports so the startup report includes them
+startup_began = time.perf_counter()
+
 from datetime import timedelta
-from flask import Flask, request, jsonify, make_response # type: ignore
+from flask import Flask, Response, g, request, jsonify, make_response # type: ignore
 from flask_cors import CORS, cross_origin # type: ignore
 from controller.studentuser_controller import studentuser_controller
 from controller.professoruser_controller import professoruser_controller
-from controller.chatbot_controller import chatbot_controller
+from controller.chatbot_controller import chatbot_controller, embedding_cache, answer_cache, llm_gateway, vector_store
 from controller.registration_request_controller import registration_request_controller
-from config import Config
+from config import Config, db
 from controller import auth_controller, syllabus_controller
-from groq import Groq
+from service.db_indexes import ensure_indexes
+from service.embedding_service import embedding_service
+from service.health import HealthMonitor
+from service.metrics import registry, http_request_seconds, register_cache_gauges
+from service.warmup import Warmup
 import logging
 from dotenv import load_dotenv
 load_dotenv()
@@ -21,30 +29,73 @@ CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
 
 app.permanent_session_lifetime = timedelta(days=1)
 
-logging.basicConfig(level=logging.DEBUG)
+# DEBUG logs every request and retrieval detail; keep production at INFO or above
+logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO))
+
+# Startup work kept off the import path. Declared indexes are always ensured;
+# the model, vector index and LLM clients are otherwise built on first use.
+# ``preload`` only fills memory (model weights, a vector index snapshot) and is
+# safe in a forking server's master; ``warmup`` opens MongoDB and HTTP
+# connections and runs torch, so it runs in each serving process.
+preload_steps = []
+warmup_steps = [("mongodb_indexes", lambda: ensure_indexes(db))]
+if Config.WARMUP_ON_START:
+    preload_steps.append(("embedding_model", lambda: embedding_service.model))
+    warmup_steps.append(("embedding_model", embedding_service.warm))
+    if vector_store is not None and Config.VECTOR_INDEX_WARMUP:
+        preload_steps.append(("vector_index_snapshot", vector_store.load_snapshot))
+        warmup_steps.append(("vector_index", vector_store.warm_index))
+    warmup_steps.append(("llm_clients", llm_gateway.warm))
+preload = Warmup(preload_steps)
+warmup = Warmup(warmup_steps)
+
+
+def check_mongodb():
+    if db is None:
+        raise RuntimeError("MongoDB is not configured.")
+    db.client.admin.command("ping")
+
+
+def check_llm_providers():
+    """Local state only: at least one provider has a key and a breaker that is not open."""
+    states = llm_gateway.status()
+    if not any(state in ("closed", "half-open") for state in states.values()):
+        raise RuntimeError(f"No usable LLM provider: {states}")
+
+
+health_monitor = HealthMonitor(
+    {"mongodb": check_mongodb, "llm": check_llm_providers},
+    interval_seconds=Config.HEALTH_CHECK_INTERVAL_SECONDS
+)
 
-def check_groq_connection():
-    """Function to check connection to Groq AI."""
-    try:
-        groq_client = Groq(api_key="YOUR_SECONDARY_API_KEY")
-        groq_client.health_check()  # Example health-check method
-        logging.debug("[DEBUG] Groq AI connection successful.")
-        return True
-    except Exception as e:
-        logging.error(f"[ERROR] Groq AI connection failed: {e}")
-        return False
 
 @app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint for API and Groq AI connection."""
-    groq_ai_status = check_groq_connection()
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness: the process is up and serving requests. Never touches a dependency."""
+    return jsonify({"status": "ok"}), 200
 
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: warmup finished and the last background dependency checks passed."""
+    checks_ok, checks = health_monitor.status()
+    ready = checks_ok and warmup.state == "done"
     status = {
-        "status": "ok",
-        "message": "API is running",
-        "groq_ai_connection": "successful" if groq_ai_status else "failed"
+        "status": "ready" if ready else "not_ready",
+        "checks": checks,
+        "warmup": warmup.report(),
+        "embedding_model_loaded": embedding_service.is_loaded
     }
-    return jsonify(status), 200 if groq_ai_status else 500
+    return jsonify(status), 200 if ready else 503
+
+register_cache_gauges(registry, embedding_cache, answer_cache)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this worker process."""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/')
 def home():
@@ -63,6 +114,7 @@ app.add_url_rule('/syllabus/<pdf_id>', 'get_single_syllabus', syllabus_controlle
 app.add_url_rule('/update_syllabus/<pdf_id>', 'update_syllabus', syllabus_controller.update_syllabus, methods=['PUT'])
 app.add_url_rule('/delete_syllabus/<pdf_id>', 'delete_syllabus', syllabus_controller.delete_syllabus, methods=['DELETE'])
 app.add_url_rule('/extract_pdf_content/<pdf_id>', 'extract_pdf_content', syllabus_controller.extract_pdf_content, methods=['GET'])
+app.add_url_rule('/ingestion_status/<job_id>', 'get_ingestion_status', syllabus_controller.get_ingestion_status, methods=['GET'])
 
 app.register_blueprint(registration_request_controller, url_prefix='/registration_requests')
 
@@ -81,6 +133,24 @@ def handle_options():
         response.headers["Access-Control-Allow-Credentials"] = "true"
         return response, 200
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_timing(response):
+    start = g.get("request_start")
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        http_request_seconds.observe(
+            elapsed, endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code
+        )
+        if Config.SERVER_TIMING_ENABLED:
+            stage_timer = g.get("stage_timer")
+            stages = f"{stage_timer.server_timing()}, " if stage_timer is not None and stage_timer.timings else ""
+            response.headers["Server-Timing"] = f"{stages}total;dur={elapsed * 1000:.1f}"
+    return response
+
 @app.errorhandler(500)
 def internal_server_error(e):
     logging.error(f"[ERROR] Internal server error: {e}")
@@ -91,6 +161,13 @@ def not_found_error(e):
     logging.warning(f"[WARNING] Resource not found: {e}")
     return jsonify({"error": "The requested resource was not found."}), 404
 
+logging.info(f"[INFO] App initialized in {time.perf_counter() - startup_began:.2f}s.")
+# Under gunicorn's preload this import runs in the master, whose threads do
+# not survive the fork; gunicorn.conf.py starts warmup in each worker instead.
+if not Config.WEB_PRELOAD:
+    warmup.start()
+
 if __name__ == "__main__":
     logging.info("[INFO] Starting Flask server on http://localhost:5000")
+    syllabus_controller.ingestion_queue.resume_pending()
     app.run(debug=True, host="0.0.0.0", port=5000)
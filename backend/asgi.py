@@ -0,0 +1,103 @@
+"""ASGI entry point. The chat routes are served here so that a worker awaits
+the LLM instead of holding a thread for the whole call; every other route is
+the Flask app, run through a WSGI adapter.
+
+    WEB_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+Retrieval and prompt building are CPU-bound and run in the thread pool, with
+the same code as the Flask routes (``prepare_*_chat``).
+"""
+import logging
+import time
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+
+from app import app as flask_app
+from config import Config
+from controller.chatbot_controller import (
+    FAILOVER_DECLINED, SSE_HEADERS, llm_gateway, prepare_embeddings_chat, prepare_pdf_chat, prepare_syllabi_chat
+)
+from service.llm_gateway import LLMUnavailableError
+from service.metrics import StageTimer, http_request_seconds, log_sampled
+
+
+def session_user_id(request):
+    """The logged-in user from Flask's signed session cookie, if any."""
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return None
+    try:
+        max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        return serializer.loads(cookie, max_age=max_age).get("user_id")
+    except BadSignature:
+        return None
+
+
+async def respond(turn):
+    """Async counterpart of ``chatbot_controller.respond``."""
+    if turn.reply is not None:
+        body, status = turn.reply
+        return JSONResponse(body, status_code=status)
+    if turn.stream:
+        # Starlette iterates the synchronous generator in its thread pool
+        return StreamingResponse(turn.sse_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+    if turn.cached_answer is not None:
+        return JSONResponse(await run_in_threadpool(turn.finish, turn.cached_answer["response"]))
+
+    try:
+        with turn.timer.stage("llm_call"):
+            response, provider = await llm_gateway.acomplete(turn.chat_history, allow_failover=turn.allow_failover)
+    except LLMUnavailableError:
+        if not turn.allow_failover:
+            logging.warning("[WARNING] Primary API failed and user declined to switch to Groq AI.")
+            return JSONResponse(FAILOVER_DECLINED, status_code=400)
+        raise
+
+    log_sampled(logging.INFO, f"[INFO] {turn.timer.route} response served by the {provider} provider.", Config.LOG_SAMPLE_RATE)
+    return JSONResponse(await run_in_threadpool(turn.finish, response))
+
+
+def chat_endpoint(route, prepare):
+    async def endpoint(request):
+        if request.method != "POST":
+            return JSONResponse({"error": "Method not allowed."}, status_code=405)
+        start = time.perf_counter()
+        try:
+            data = await request.json()
+            timer = StageTimer(route)
+            turn = await run_in_threadpool(prepare, data, session_user_id(request), timer)
+            response = await respond(turn)
+            if Config.SERVER_TIMING_ENABLED and timer.timings:
+                response.headers["Server-Timing"] = timer.server_timing()
+        except Exception as e:
+            logging.error(f"[ERROR] Exception in /{route}: {e}", exc_info=True)
+            response = JSONResponse({"error": "An internal server error occurred."}, status_code=500)
+        http_request_seconds.observe(
+            time.perf_counter() - start, endpoint=f"chatbot_controller.{route}", method="POST", status=response.status_code
+        )
+        return response
+
+    # Same CORS policy as app.py applies to the Flask routes; wrapped per route
+    # so the Flask responses do not get a second set of headers
+    return CORSMiddleware(
+        request_response(endpoint),
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"]
+    )
+
+
+app = Starlette(routes=[
+    Route("/chatbot/chat_with_pdf", chat_endpoint("chat_with_pdf", prepare_pdf_chat)),
+    Route("/chatbot/chat_with_pdf_embeddings", chat_endpoint("chat_with_pdf_embeddings", prepare_embeddings_chat)),
+    Route("/chatbot/chat_with_syllabi", chat_endpoint("chat_with_syllabi", prepare_syllabi_chat)),
+    Mount("/", app=WSGIMiddleware(flask_app)),
+])
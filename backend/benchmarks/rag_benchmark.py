@@ -0,0 +1,436 @@
+"""End-to-end RAG benchmark over a synthetic syllabus corpus.
+
+Generates syllabus PDFs with fitz (course facts such as the instructor,
+office, exam dates and grading weights, padded with weekly schedule
+text) plus labelled questions about those facts, then runs the
+production retrieval path against them:
+
+* ingest: GridFS upload, PdfTextStore extraction, ``iter_chunks``,
+  ``CustomMongoDBVectorStore.ingest_chunks`` (batched embedding and
+  inserts) and the BM25 index, as ``syllabus_controller.ingest_pdf`` does
+* query: query embedding, ``EmbeddingMatrixCache``, ``rank_candidates``
+  (dense + BM25 fusion), ``ContextPacker`` and prompt assembly, followed by
+  a stub LLM call
+
+Reports ingest pages/s and chunks/s, query QPS and p50/p95/p99 latency (per
+stage too), recall@k (a question counts as answered when its labelled answer
+string is in the retrieved chunks) and peak RSS. Runs on mongomock
+(``pip install mongomock``) unless ``--mongo-uri`` points at a MongoDB
+server; the named database is dropped before and after the run.
+
+With ``--embedder auto`` the SentenceTransformer model is used when it is
+installed, otherwise a hashing embedder with whitespace token counts. Hash
+recall is only comparable with other hash runs.
+
+Run from the backend directory:
+
+    python -m benchmarks.rag_benchmark --syllabi 50 --pages 4 --output rag.json
+"""
+import argparse
+import hashlib
+import json
+import platform
+import random
+import resource
+import subprocess
+import textwrap
+import time
+
+import fitz
+import numpy as np
+import pymongo
+import gridfs
+
+from config import Config
+from service.chunking import chunk_hash, iter_chunks
+from service.context_packer import ContextPacker
+from service.embedding_cache import EmbeddingMatrixCache
+from service.lexical_index import LexicalIndexStore, tokenize
+from service.metrics import StageTimer
+from service.pdf_text import PdfTextStore, iter_page_blocks
+from service.retrieval import rank_candidates
+from service.vector_store import CustomMongoDBVectorStore
+
+# Lines of 10pt text per rendered page
+LINES_PER_PAGE = 58
+
+FIRST_NAMES = ["Maria", "James", "Aisha", "Wei", "Carlos", "Priya", "Daniel", "Elena", "Kwame", "Yuki",
+               "Omar", "Sofia", "Liam", "Grace", "Mateo", "Hana", "Noah", "Ingrid", "Ravi", "Chloe"]
+LAST_NAMES = ["Okafor", "Lindqvist", "Tanaka", "Moreno", "Patel", "Fischer", "Nguyen", "Adeyemi", "Kowalski",
+              "Haddad", "Brennan", "Castillo", "Sato", "Mendes", "Volkov", "Osei", "Larsen", "Duarte"]
+DEPARTMENTS = ["CS", "MATH", "PHYS", "BIO", "ECON", "HIST", "CHEM", "STAT"]
+SUBJECTS = ["Algorithms", "Databases", "Linear Algebra", "Thermodynamics", "Genetics", "Macroeconomics",
+            "Modern History", "Organic Chemistry", "Probability", "Operating Systems", "Compilers", "Ecology"]
+BUILDINGS = ["Hamilton Hall", "Baker Center", "North Science Building", "Keller Annex", "Lowry Library"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+MONTHS = ["September", "October", "November", "December"]
+PUBLISHERS = ["Pearson", "MIT Press", "Wiley", "Springer", "Cambridge University Press"]
+FILLER_WORDS = (
+    "students will review the assigned readings discuss key concepts in small groups and complete practice "
+    "problems lectures introduce core ideas while labs apply them to worked examples participation in class "
+    "discussion is expected and questions are welcome during every session the material builds on earlier "
+    "weeks so keeping up with readings matters collaboration is encouraged on practice sets but submitted "
+    "work must be your own notes and slides are posted after each lecture"
+).split()
+
+
+def make_syllabus(index, rng, pages):
+    """Return ``(lines, questions)`` for one synthetic syllabus.
+
+    ``questions`` are ``(question, answer)`` pairs whose answer string appears
+    exactly once in the document.
+    """
+    department = DEPARTMENTS[index % len(DEPARTMENTS)]
+    course_code = f"{department}-{4000 + index}"
+    course_name = f"{rng.choice(SUBJECTS)} {rng.choice(['I', 'II', 'Seminar', 'Workshop'])}"
+    instructor = f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    office = f"{rng.choice(BUILDINGS)} Room {rng.randint(100, 499)}"
+    office_hours = f"{rng.choice(DAYS)}s {rng.randint(1, 4)}:{rng.choice(['00', '15', '30', '45'])} PM"
+    email = f"{instructor.split()[-1].lower()}{index}@university.edu"
+    midterm = f"{rng.choice(MONTHS[:2])} {rng.randint(1, 28)}"
+    final_exam = f"{rng.choice(MONTHS[2:])} {rng.randint(1, 20)}"
+    final_weight = f"{rng.randint(25, 45)}%"
+    project_weight = f"{rng.randint(10, 24)}%"
+    textbook = f"{rng.choice(['Foundations of', 'Principles of', 'Introduction to'])} {course_name.split()[0]}, " \
+               f"{rng.randint(2, 9)}th edition ({rng.choice(PUBLISHERS)})"
+    late_penalty = f"{rng.randint(5, 20)} percent per day"
+
+    facts = [
+        ("Course Information", [
+            f"Course code: {course_code}. Course title: {course_name}.",
+            f"Instructor: {instructor}. Email: {email}.",
+            f"Office location: {office}. Office hours are held on {office_hours} or by appointment.",
+        ]),
+        ("Required Materials", [f"The required textbook is {textbook}."]),
+        ("Grading", [
+            f"The final exam is worth {final_weight} of the course grade.",
+            f"The term project is worth {project_weight} of the course grade.",
+            "Homework and quizzes make up the remaining weight.",
+        ]),
+        ("Exams", [
+            f"The midterm exam takes place on {midterm} during the regular lecture time.",
+            f"The final exam is scheduled for {final_exam} in the main lecture hall.",
+        ]),
+        ("Late Work Policy", [f"Late assignments lose {late_penalty} unless an extension was approved in advance."]),
+    ]
+    questions = [
+        ("Who is the instructor for this course?", instructor),
+        ("What is the instructor's email address?", email),
+        ("Where is the office located?", office),
+        ("When are office hours held?", office_hours),
+        ("What is the required textbook?", textbook),
+        ("How much is the final exam worth?", final_weight),
+        ("How much is the term project worth?", project_weight),
+        ("When is the midterm exam?", midterm),
+        ("When is the final exam scheduled?", final_exam),
+        ("What is the penalty for late assignments?", late_penalty),
+        ("What is the course code?", course_code),
+    ]
+
+    lines = [f"{course_code}: {course_name}", "Syllabus", ""]
+    for heading, sentences in facts:
+        lines += [heading, *textwrap.wrap(" ".join(sentences), 95), ""]
+
+    # Weekly schedule padding until the document reaches the requested length
+    week = 1
+    while len(lines) < pages * LINES_PER_PAGE:
+        filler = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(40, 90)))
+        lines += [f"Week {week}", *textwrap.wrap(f"{filler.capitalize()}.", 95), ""]
+        week += 1
+    return lines, questions
+
+
+def render_pdf(lines):
+    document = fitz.open()
+    try:
+        for start in range(0, len(lines), LINES_PER_PAGE):
+            page = document.new_page()
+            for offset, line in enumerate(lines[start:start + LINES_PER_PAGE]):
+                page.insert_text((50, 50 + offset * 12), line, fontsize=10)
+        return document.tobytes(), len(document)
+    finally:
+        document.close()
+
+
+def make_corpus(n_syllabi, pages, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(n_syllabi):
+        lines, questions = make_syllabus(index, rng, pages)
+        pdf_bytes, page_count = render_pdf(lines)
+        corpus.append({"pdf_bytes": pdf_bytes, "pages": page_count, "questions": questions})
+    return corpus
+
+
+class HashEmbedder:
+    """Feature-hashing stand-in for the SentenceTransformer model, with its ``encode`` signature."""
+
+    def __init__(self, dims=384):
+        self.dims = dims
+
+    def _embed(self, text):
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dims
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        vectors = np.array([self._embed(text) for text in ([sentences] if single else sentences)], dtype=np.float32)
+        vectors = vectors.reshape(-1, self.dims)
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
+
+
+def whitespace_count_tokens(text):
+    return len(text.split()) if text else 0
+
+
+def whitespace_truncate_to_tokens(text, max_tokens):
+    words = text.split()
+    return text if len(words) <= max_tokens else " ".join(words[:max_tokens])
+
+
+def load_embedder(name):
+    """Return ``(embedder, count_tokens, truncate_to_tokens, label)``."""
+    if name in ("auto", "model"):
+        try:
+            import sentence_transformers  # noqa: F401
+        except ImportError:
+            if name == "model":
+                raise
+        else:
+            from service.embedding_service import embedding_service
+            from service.tokens import count_tokens, truncate_to_tokens
+            return embedding_service, count_tokens, truncate_to_tokens, Config.EMBEDDING_MODEL_NAME
+    return HashEmbedder(), whitespace_count_tokens, whitespace_truncate_to_tokens, "hash"
+
+
+def connect(mongo_uri, database):
+    if mongo_uri:
+        client = pymongo.MongoClient(mongo_uri)
+    else:
+        import mongomock
+        import mongomock.gridfs
+        mongomock.gridfs.enable_gridfs_integration()
+        client = mongomock.MongoClient()
+    client.drop_database(database)
+    return client, client[database]
+
+
+class StubLLM:
+    """Fixed-latency stand-in for ``LLMGateway.complete``."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+
+    def complete(self, messages, allow_failover=True):
+        if self.latency:
+            time.sleep(self.latency)
+        return f"Stub answer from {len(messages[-1]['content'])} prompt characters.", "stub"
+
+
+def hash_chunk_text(text):
+    return chunk_hash(text, Config.EMBEDDING_MODEL_NAME)
+
+
+def ingest(corpus, db, fs, embedder, count_tokens, truncate_to_tokens, args):
+    pdf_text_store = PdfTextStore(db["pdf_text"], fs)
+    lexical_index_store = LexicalIndexStore(db["lexical_index"])
+    vector_store = CustomMongoDBVectorStore(
+        collection=db["embeddings"],
+        embedding_function=embedder,
+        storage_format=Config.EMBEDDING_STORAGE_FORMAT,
+        batch_size=Config.EMBEDDING_INSERT_BATCH_SIZE,
+        max_batch_bytes=Config.EMBEDDING_INSERT_MAX_BATCH_BYTES
+    )
+
+    total_chunks = 0
+    start = time.perf_counter()
+    for syllabus in corpus:
+        pdf_id = str(fs.put(syllabus["pdf_bytes"], filename="syllabus.pdf", content_type="application/pdf"))
+        pages = pdf_text_store.get_pages(pdf_id)
+        page_blocks = iter_page_blocks(syllabus["pdf_bytes"]) if args.strategy == "layout" else None
+        chunks = iter_chunks(
+            pages,
+            count_tokens,
+            truncate_to_tokens,
+            strategy=args.strategy,
+            max_tokens=args.max_tokens,
+            min_tokens=Config.CHUNK_MIN_TOKENS,
+            overlap_sentences=Config.CHUNK_OVERLAP_SENTENCES,
+            page_blocks=page_blocks
+        )
+        _, texts = vector_store.ingest_chunks(pdf_id, chunks, hash_chunk_text)
+        lexical_index_store.build(pdf_id, texts)
+        syllabus["pdf_id"] = pdf_id
+        total_chunks += len(texts)
+    return vector_store, lexical_index_store, total_chunks, time.perf_counter() - start
+
+
+def build_prompt(context, question):
+    return f"Context:\n{context}\n\nQuestion:\n{question}"
+
+
+def run_queries(corpus, vector_store, lexical_index_store, embedder, count_tokens, llm, args):
+    embedding_cache = EmbeddingMatrixCache(max_bytes=Config.EMBEDDING_CACHE_MAX_BYTES)
+    context_packer = ContextPacker(
+        count_tokens,
+        token_budget=Config.RAG_CONTEXT_TOKEN_BUDGET,
+        min_k=Config.RAG_MIN_K,
+        max_k=args.k,
+        min_score=Config.RAG_MIN_SCORE,
+        score_margin=Config.RAG_SCORE_MARGIN
+    )
+
+    latencies = []
+    stage_latencies = {}
+    candidate_hits = 0
+    context_hits = 0
+    questions = [(syllabus["pdf_id"], q, a) for syllabus in corpus for q, a in syllabus["questions"]]
+    start = time.perf_counter()
+    for pdf_id, question, answer in questions:
+        query_start = time.perf_counter()
+        timer = StageTimer("benchmark")
+        query_vector = embedder.encode(question, normalize_embeddings=True)
+        timer.lap("embed_query")
+        cached = embedding_cache.get_or_load(pdf_id, vector_store.load_embeddings)
+        timer.lap("mongo_fetch")
+        candidates, _ = rank_candidates(
+            query_vector,
+            cached,
+            depth=max(Config.HYBRID_CANDIDATES, args.k),
+            limit=args.k,
+            lexical_index=lexical_index_store.get_or_build(pdf_id, cached.texts) if args.lexical else None,
+            query_text=question,
+            rrf_k=Config.RRF_K
+        )
+        timer.lap("scoring")
+        top_chunks, _ = context_packer.pack(candidates)
+        timer.lap("context_assembly")
+        prompt = build_prompt("\n\n".join(top_chunks), question)
+        timer.lap("prompt_build")
+        with timer.stage("llm_call"):
+            llm.complete([{"role": "user", "content": prompt}])
+        latencies.append((time.perf_counter() - query_start) * 1000)
+        for name, seconds in timer.timings:
+            stage_latencies.setdefault(name, []).append(seconds * 1000)
+
+        answer = answer.lower()
+        candidate_hits += any(answer in text.lower() for _, text, _ in candidates)
+        context_hits += any(answer in text.lower() for text in top_chunks)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": len(questions),
+        "qps": round(len(questions) / elapsed, 2),
+        **percentiles(latencies),
+        "recall_at_k": round(candidate_hits / len(questions), 4),
+        "context_recall": round(context_hits / len(questions), 4),
+        "stages": {name: percentiles(values) for name, values in stage_latencies.items()},
+    }
+
+
+def percentiles(latencies):
+    latencies = np.array(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--syllabi", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=4, help="approximate pages per syllabus")
+    parser.add_argument("--k", type=int, default=Config.RAG_MAX_K, help="candidates per question")
+    parser.add_argument("--strategy", default=Config.CHUNK_STRATEGY, choices=["tokens", "headings", "layout"])
+    parser.add_argument("--max-tokens", type=int, default=Config.CHUNK_MAX_TOKENS)
+    parser.add_argument("--lexical", action=argparse.BooleanOptionalAction, default=Config.LEXICAL_SEARCH_ENABLED,
+                        help="fuse BM25 results with dense scores")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "model", "hash"])
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM call time")
+    parser.add_argument("--mongo-uri", help="MongoDB server to use instead of mongomock")
+    parser.add_argument("--database", default="rag_benchmark", help="database to create and drop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    embedder, count_tokens, truncate_to_tokens, embedder_name = load_embedder(args.embedder)
+    corpus = make_corpus(args.syllabi, args.pages, args.seed)
+    total_pages = sum(syllabus["pages"] for syllabus in corpus)
+    print(f"Corpus: {args.syllabi} syllabi, {total_pages} pages, embedder {embedder_name}, "
+          f"{'mongod' if args.mongo_uri else 'mongomock'}")
+
+    client, db = connect(args.mongo_uri, args.database)
+    try:
+        vector_store, lexical_index_store, total_chunks, ingest_seconds = ingest(
+            corpus, db, gridfs.GridFS(db), embedder, count_tokens, truncate_to_tokens, args
+        )
+        ingest_report = {
+            "pages": total_pages,
+            "chunks": total_chunks,
+            "seconds": round(ingest_seconds, 3),
+            "pages_per_second": round(total_pages / ingest_seconds, 2),
+            "chunks_per_second": round(total_chunks / ingest_seconds, 2),
+        }
+        query_report = run_queries(
+            corpus, vector_store, lexical_index_store, embedder, count_tokens, StubLLM(args.llm_latency_ms), args
+        )
+    finally:
+        client.drop_database(args.database)
+        client.close()
+
+    print(f"Ingest: {ingest_report['pages_per_second']} pages/s, {ingest_report['chunks_per_second']} chunks/s "
+          f"({total_chunks} chunks in {ingest_report['seconds']}s)")
+    print(f"Query: {query_report['qps']} QPS, p50 {query_report['p50_ms']} ms, p95 {query_report['p95_ms']} ms, "
+          f"p99 {query_report['p99_ms']} ms")
+    print(f"Recall@{args.k}: {query_report['recall_at_k']} (after packing: {query_report['context_recall']})")
+    print(f"{'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in query_report["stages"].items():
+        print(f"{name:<20}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"Peak RSS: {peak_rss_mb()} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({
+                "commit": git_commit(),
+                "config": {
+                    "syllabi": args.syllabi,
+                    "pages": args.pages,
+                    "k": args.k,
+                    "strategy": args.strategy,
+                    "max_tokens": args.max_tokens,
+                    "lexical": args.lexical,
+                    "embedder": embedder_name,
+                    "backend": "mongod" if args.mongo_uri else "mongomock",
+                    "seed": args.seed,
+                },
+                "ingest": ingest_report,
+                "query": query_report,
+                "peak_rss_mb": peak_rss_mb(),
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
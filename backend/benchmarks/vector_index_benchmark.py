@@ -0,0 +1,130 @@
+"""Recall/latency benchmark for the vector indexes against brute-force search.
+
+Generates clustered synthetic embeddings shaped like MiniLM output (384 dims,
+chunks grouped by PDF), then compares:
+
+* ``loop``: the original per-document cosine loop with a full sort
+* ``exact``: ExactIndex (single matrix multiply + argpartition)
+* ``ivf``: IVFIndex at several ``n_probe`` settings
+
+Run from the backend directory:
+
+    python -m benchmarks.vector_index_benchmark --pdfs 500 --chunks-per-pdf 200
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from service.vector_index import ExactIndex, IVFIndex
+
+
+def make_corpus(n_pdfs, chunks_per_pdf, dims, n_topics, seed):
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dims))
+    corpus = {}
+    for pdf in range(n_pdfs):
+        labels = rng.integers(0, n_topics, chunks_per_pdf)
+        vectors = topics[labels] + 0.6 * rng.normal(size=(chunks_per_pdf, dims))
+        corpus[f"pdf-{pdf}"] = vectors.astype(np.float32)
+    queries = topics[rng.integers(0, n_topics, 200)] + 0.6 * rng.normal(size=(200, dims))
+    return corpus, queries.astype(np.float32)
+
+
+def loop_search(documents, query, k):
+    """The pre-index path: one cosine similarity per document, then a full sort."""
+    results = []
+    for content, embedding in documents:
+        similarity = np.dot(query, embedding) / (np.linalg.norm(query) * np.linalg.norm(embedding))
+        results.append((content, similarity))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return [content for content, _ in results[:k]]
+
+
+def timed(search, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def summarize(name, latencies, recall):
+    latencies = np.array(latencies)
+    return {
+        "name": name,
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def recall(results, truth):
+    hits = [len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)]
+    return np.mean(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=200)
+    parser.add_argument("--chunks-per-pdf", type=int, default=150)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--loop-queries", type=int, default=10,
+                        help="queries to run through the slow per-document loop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus, queries = make_corpus(args.pdfs, args.chunks_per_pdf, args.dims, args.topics, args.seed)
+    total = sum(len(vectors) for vectors in corpus.values())
+    print(f"Corpus: {args.pdfs} PDFs, {total} chunks, {args.dims} dims, {len(queries)} queries")
+
+    exact = ExactIndex()
+    ivf = IVFIndex(train_threshold=1)
+    start = time.perf_counter()
+    for pdf_id, vectors in corpus.items():
+        texts = [f"{pdf_id}#{i}" for i in range(len(vectors))]
+        exact.add(pdf_id, vectors, texts)
+    exact_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pdf_id, vectors in corpus.items():
+        ivf.add(pdf_id, vectors, [f"{pdf_id}#{i}" for i in range(len(vectors))])
+    ivf_build = time.perf_counter() - start
+    print(f"Build: exact {exact_build:.2f}s, ivf {ivf_build:.2f}s ({len(ivf._centroids)} lists)")
+
+    truth, exact_latencies = timed(lambda q: [t for _, t, _ in exact.search(q, args.k)], queries)
+    report = [summarize("exact", exact_latencies, 1.0)]
+
+    documents = [
+        (f"{pdf_id}#{i}", vector)
+        for pdf_id, vectors in corpus.items()
+        for i, vector in enumerate(vectors)
+    ]
+    loop_queries = queries[:args.loop_queries]
+    loop_results, loop_latencies = timed(lambda q: loop_search(documents, q, args.k), loop_queries)
+    report.append(summarize("loop", loop_latencies, recall(loop_results, truth[:len(loop_queries)])))
+
+    for n_probe in args.probes:
+        ivf.n_probe = n_probe
+        results, latencies = timed(lambda q: [t for _, t, _ in ivf.search(q, args.k)], queries)
+        report.append(summarize(f"ivf(n_probe={n_probe})", latencies, recall(results, truth)))
+
+    print(f"{'index':<20}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in report:
+        print(f"{row['name']:<20}{row['recall_at_k']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"corpus_chunks": total, "k": args.k, "results": report}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
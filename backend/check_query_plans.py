@@ -0,0 +1,21 @@
+import sys
+
+from config import db
+from service.db_indexes import collection_scans, ensure_indexes, HOT_QUERIES
+
+# Explain every hot query and fail if any would scan its whole collection.
+# Usage: python check_query_plans.py [--ensure]   (--ensure creates the indexes first)
+
+if db is None:
+    print("MongoDB is not connected; set MONGO_URI.")
+    sys.exit(2)
+
+if "--ensure" in sys.argv[1:]:
+    ensure_indexes(db)
+
+scans = collection_scans(db)
+for name, plan in scans:
+    print(f"COLLSCAN: {name}\n  {plan}")
+
+print(f"{len(HOT_QUERIES) - len(scans)}/{len(HOT_QUERIES)} hot queries use an index.")
+sys.exit(1 if scans else 0)
@@ -14,6 +14,131 @@ class Config:
     MONGODB_URI = os.getenv("MONGO_URI") or os.getenv("MONGODB_URI")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "syllabusdb")
 
+    # Shared embedding model; concurrent small encode calls are micro-batched
+    EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+    EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))  # 0 keeps torch's default
+
+    # Memory budget for the per-PDF embedding matrix cache used by chat retrieval
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+    # How chunk embeddings are stored: "float32", "float16" or "int8" (BSON binary), or legacy "list"
+    EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32")
+
+    # Ingestion chunking: "tokens" (sentence windows), "layout" (fitz blocks) or "headings"
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "tokens")
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+    CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "32"))
+    CHUNK_OVERLAP_SENTENCES = int(os.getenv("CHUNK_OVERLAP_SENTENCES", "1"))
+
+    # Semantic answer cache for repeated questions about the same syllabus
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+    ANSWER_CACHE_SHARED = os.getenv("ANSWER_CACHE_SHARED", "false").lower() == "true"
+
+    # Token budget for server-assembled PDF context in /chatbot/chat_with_pdf
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+
+    # Retrieved context for /chatbot/chat_with_pdf_embeddings: token budget, bounds on the
+    # adaptive k, and the score floor / margin below the best score a chunk must reach
+    RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+    RAG_MIN_K = int(os.getenv("RAG_MIN_K", "2"))
+    RAG_MAX_K = int(os.getenv("RAG_MAX_K", "8"))
+    RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.1"))
+    RAG_SCORE_MARGIN = float(os.getenv("RAG_SCORE_MARGIN", "0.15"))
+
+    # Hybrid retrieval: BM25 candidates fused with dense ones by reciprocal rank fusion
+    LEXICAL_SEARCH_ENABLED = os.getenv("LEXICAL_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    LEXICAL_CACHE_MAX_ENTRIES = int(os.getenv("LEXICAL_CACHE_MAX_ENTRIES", "256"))
+
+    # Multi-syllabus chat (/chatbot/chat_with_syllabi): at most this many
+    # syllabi per question, each contributing up to K chunks, sharing one budget
+    MULTI_SYLLABUS_MAX_PDFS = int(os.getenv("MULTI_SYLLABUS_MAX_PDFS", "20"))
+    MULTI_SYLLABUS_K_PER_PDF = int(os.getenv("MULTI_SYLLABUS_K_PER_PDF", "3"))
+    MULTI_SYLLABUS_TOKEN_BUDGET = int(os.getenv("MULTI_SYLLABUS_TOKEN_BUDGET", "3000"))
+
+    # Per-session conversation history fed back into chat prompts
+    CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")  # "memory" or "mongo"
+    CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+    CONVERSATION_IDLE_SECONDS = int(os.getenv("CONVERSATION_IDLE_SECONDS", "1800"))
+    CONVERSATION_SUMMARIZE = os.getenv("CONVERSATION_SUMMARIZE", "false").lower() == "true"
+
+    # Batched chunk writes to the embeddings collection
+    EMBEDDING_INSERT_BATCH_SIZE = int(os.getenv("EMBEDDING_INSERT_BATCH_SIZE", "256"))
+    EMBEDDING_INSERT_MAX_BATCH_BYTES = int(os.getenv("EMBEDDING_INSERT_MAX_BATCH_MB", "8")) * 1024 * 1024
+
+    # Background ingestion: job store is "mongo" (shared across workers) or "memory"
+    INGESTION_JOB_STORE = os.getenv("INGESTION_JOB_STORE", "mongo")
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+    INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+
+    # Cross-syllabus vector index: "exact" or "ivf", searched in "exact" or "approximate" mode
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "ivf")
+    VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "approximate")
+    VECTOR_INDEX_PATH = os.getenv(
+        "VECTOR_INDEX_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "vector_index")
+    )
+    IVF_N_PROBE = int(os.getenv("IVF_N_PROBE", "8"))
+    # Load or build the cross-syllabus index at startup. Off while no route calls
+    # vector_store.search(); the index is otherwise built on first search
+    VECTOR_INDEX_WARMUP = os.getenv("VECTOR_INDEX_WARMUP", "false").lower() == "true"
+    # Index snapshot writes after ingest/delete are coalesced over this many seconds
+    VECTOR_INDEX_PERSIST_DELAY_SECONDS = float(os.getenv("VECTOR_INDEX_PERSIST_DELAY_SECONDS", "5"))
+
+    # Syllabus listings: page sizes and how often the shared change counter is re-read for ETags
+    SYLLABUS_PAGE_DEFAULT_LIMIT = int(os.getenv("SYLLABUS_PAGE_DEFAULT_LIMIT", "50"))
+    SYLLABUS_PAGE_MAX_LIMIT = int(os.getenv("SYLLABUS_PAGE_MAX_LIMIT", "200"))
+    LISTING_VERSION_REFRESH_SECONDS = float(os.getenv("LISTING_VERSION_REFRESH_SECONDS", "2"))
+    # How stale another worker's cached embedding matrices and answers may be after a chunk write
+    EMBEDDINGS_VERSION_REFRESH_SECONDS = float(os.getenv("EMBEDDINGS_VERSION_REFRESH_SECONDS", "2"))
+
+    # PDF downloads are streamed from GridFS in chunks of this size; browsers may reuse them this long
+    PDF_STREAM_CHUNK_BYTES = int(os.getenv("PDF_STREAM_CHUNK_KB", "256")) * 1024
+    PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE", "86400"))
+
+    # LLM gateway: models, an OpenAI-compatible base URL override (e.g. a local fake server),
+    # per-attempt timeout, overall deadline, connection pool size and circuit breakers
+    PRIMARY_MODEL = os.getenv("PRIMARY_MODEL", "llama-3.1-8b-instant")
+    SECONDARY_MODEL = os.getenv("SECONDARY_MODEL", "llama3-8b-8192")
+    LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+    # Fire the secondary once the primary exceeds this latency percentile (0 disables hedging)
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+
+    # Logging level, the fraction of hot-path log lines emitted, and per-response Server-Timing headers
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+    # Preload the embedding model, vector index and LLM clients at startup
+    # instead of on the first request; /health/ready reports 503 until done
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+    # How often the readiness checks (MongoDB ping, LLM providers) are refreshed
+    HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "15"))
+
+    # Production serving (gunicorn.conf.py). Workers are forked after warmup so
+    # the model weights are shared copy-on-write; 0 picks one per CPU core.
+    WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:5000")
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+    # Threads per worker for the threaded WSGI worker; ignored by the ASGI worker
+    WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+    WEB_WORKER_CLASS = os.getenv("WEB_WORKER_CLASS", "gthread")  # "gthread" (app:app) or "uvicorn_worker.UvicornWorker" (asgi:app)
+    WEB_TIMEOUT_SECONDS = int(os.getenv("WEB_TIMEOUT_SECONDS", "120"))
+    # How long a stopping worker may spend finishing requests and queued ingestion jobs
+    WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("WEB_GRACEFUL_TIMEOUT_SECONDS", "60"))
+    # Set by gunicorn.conf.py: the app is imported in a master that later forks workers
+    WEB_PRELOAD = os.getenv("WEB_PRELOAD", "false").lower() == "true"
+
 db = None
 fs = None
 CONNECTION_SUCCESS = False
@@ -23,7 +148,9 @@ try:
         raise ValueError("MONGO_URI (or MONGODB_URI) is not set in environment.")
 
     # `connect` returns a pymongo.MongoClient
-    client = connect(Config.DATABASE_NAME, host=Config.MONGODB_URI)
+    # connect=False defers sockets and monitor threads to the first operation,
+    # so a gunicorn master can import this module and fork safely
+    client = connect(Config.DATABASE_NAME, host=Config.MONGODB_URI, connect=False)
 
     # Access the DB and init GridFS
     db = client[Config.DATABASE_NAME]
@@ -1,294 +1,742 @@
 import os
+import json
+import hashlib
 import logging
-import numpy as np
-from flask import Blueprint, request, jsonify
-from groq import Groq
-from config import db  # Ensure db is correctly set up in config
-from sentence_transformers import SentenceTransformer
+import time
+import gridfs
+from bson import ObjectId
+from flask import Blueprint, Response, g, has_request_context, request, jsonify, session, stream_with_context
+from config import db, fs, Config  # Ensure db is correctly set up in config
+from model.syllabus import Syllabus
+from service.embedding_cache import EmbeddingMatrixCache
+from service.embedding_service import embedding_service
+from service.answer_cache import MongoAnswerStore, SemanticAnswerCache
+from service.change_counter import ChangeCounter
+from service.pdf_text import PdfTextStore
+from service.tokens import count_tokens, truncate_to_tokens
+from service.llm_gateway import LLMGateway, LLMUnavailableError, Provider
+from service.metrics import StageTimer, llm_call_seconds, llm_failovers, llm_hedges, log_sampled
+from service.conversation_memory import ConversationMemory, InMemoryConversationStore, MongoConversationStore, is_follow_up
+from service.scoring import score_top_k
+from service.retrieval import rank_candidates, rank_candidates_across
+from service.lexical_index import LexicalIndexStore
+from service.context_packer import ContextPacker
+from service.vector_store import CustomMongoDBVectorStore
 
 # Flask Blueprint for chatbot routes
 chatbot_controller = Blueprint('chatbot_controller', __name__)
 
-# Validate and set OpenAI API key
+# LLM API keys; a provider without one is skipped and /health/ready reports it
 PRIMARY_API_KEY = os.getenv("PRIMARY_API_KEY")
 if not PRIMARY_API_KEY:
-    raise Exception("PRIMARY_API_KEY environment variable is not set.")
-primary_client = Groq(api_key=PRIMARY_API_KEY)
+    logging.warning("[WARNING] PRIMARY_API_KEY environment variable is not set.")
 
 # Groq Client Setup
 SECONDARY_API_KEY = os.getenv("SECONDARY_API_KEY")
-client = Groq(api_key=SECONDARY_API_KEY)
+
+
+def build_provider(name, api_key, model, temperature):
+    return Provider(
+        name,
+        api_key=api_key,
+        model=model,
+        temperature=temperature,
+        base_url=Config.LLM_BASE_URL,
+        timeout=Config.LLM_TIMEOUT_SECONDS,
+        max_connections=Config.LLM_MAX_CONNECTIONS,
+        failure_threshold=Config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=Config.LLM_CIRCUIT_RESET_SECONDS
+    )
+
+
+def observe_llm_call(event, provider, seconds):
+    """Record gateway events in the LLM metrics and the current request's stage timings."""
+    if event == "failover":
+        llm_failovers.inc(provider=provider)
+    elif event == "hedge":
+        llm_hedges.inc(provider=provider)
+    else:
+        llm_call_seconds.observe(seconds, provider=provider, outcome=event)
+        # Time lost on a failed provider before the request moved on
+        if event == "error" and has_request_context() and g.get("stage_timer") is not None:
+            g.stage_timer.record("failover", seconds)
+
+
+# Primary model first, secondary (Groq) as failover and hedge target
+llm_gateway = LLMGateway(
+    [
+        build_provider("primary", PRIMARY_API_KEY, Config.PRIMARY_MODEL, 1.0),
+        build_provider("secondary", SECONDARY_API_KEY, Config.SECONDARY_MODEL, 1.2),
+    ],
+    deadline=Config.LLM_DEADLINE_SECONDS,
+    hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
+    observer=observe_llm_call,
+    # A primary call and its hedge for each request thread
+    max_workers=2 * Config.WEB_THREADS
+)
 
 # MongoDB Collection Setup
 collection = db["embeddings"] if db is not None else None
 
-# Embedding Model Initialization
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Per-PDF BM25 indexes over the same chunks, built at ingest and fused with dense scores
+lexical_index_store = LexicalIndexStore(
+    db["lexical_index"], max_entries=Config.LEXICAL_CACHE_MAX_ENTRIES
+) if db is not None else None
 
+# Bumped whenever any PDF's stored chunks change, in any worker; cached matrices
+# and answers loaded at an older version are reloaded on their next use
+embeddings_version = ChangeCounter(
+    db["counters"], "embeddings", refresh_seconds=Config.EMBEDDINGS_VERSION_REFRESH_SECONDS
+) if db is not None else None
 
-class CustomMongoDBVectorStore:
-    def __init__(self, collection, embedding_function):
-        self.collection = collection
-        self.embedding_function = embedding_function
+# Per-PDF embedding matrices, versioned by embeddings_version
+embedding_cache = EmbeddingMatrixCache(max_bytes=Config.EMBEDDING_CACHE_MAX_BYTES)
 
-    def add_document(self, pdf_id, pdf_content):
-        try:
-            embedding = self.embedding_function.encode([pdf_content], normalize_embeddings=False)[0]
-            vector_data = {
-                "pdf_id": pdf_id,
-                "embedding": embedding.tolist(),
-                "content": pdf_content
-            }
-            self.collection.insert_one(vector_data)
-            logging.info(f"[INFO] Document added successfully with PDF ID: {pdf_id}")
-        except Exception as e:
-            logging.error(f"[ERROR] Failed to add document: {e}", exc_info=True)
-
-    def search(self, query, top_k=5):
-        try:
-            query_embedding = self.embedding_function.encode(query, normalize_embeddings=False)
-            query_vector = np.array(query_embedding)
-
-            results = []
-            for doc in self.collection.find():
-                doc_embedding = np.array(doc["embedding"])
-                similarity = self._cosine_similarity(query_vector, doc_embedding)
-                results.append((doc["content"], similarity))
-
-            if not results:
-                logging.warning("[WARNING] No documents found in the vector store.")
-                return []
-
-            results.sort(key=lambda x: x[1], reverse=True)
-            return [content for content, _ in results[:top_k]]
-        except Exception as e:
-            logging.error(f"[ERROR] Vector store search failed: {e}", exc_info=True)
-            return []
-
-    def _cosine_similarity(self, vec1, vec2):
-        try:
-            dot_product = np.dot(vec1, vec2)
-            norm_vec1 = np.linalg.norm(vec1)
-            norm_vec2 = np.linalg.norm(vec2)
-            if norm_vec1 == 0 or norm_vec2 == 0:
-                logging.warning("[WARNING] Zero norm vector detected in cosine similarity.")
-                return 0.0
-            return dot_product / (norm_vec1 * norm_vec2)
-        except Exception as e:
-            logging.error(f"[ERROR] Cosine similarity calculation failed: {e}", exc_info=True)
-            return 0.0
+# Extracted PDF text, parsed once per GridFS file and reused by extraction and chat
+pdf_text_store = PdfTextStore(db["pdf_text"], fs) if db is not None else None
 
+# Answers to semantically repeated questions, versioned alongside embedding_cache
+answer_cache = SemanticAnswerCache(
+    threshold=Config.ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+    shared_store=MongoAnswerStore(db["answer_cache"]) if Config.ANSWER_CACHE_SHARED and db is not None else None
+)
 
 # Initialize vector store
 if collection is not None:
-    vector_store = CustomMongoDBVectorStore(collection=collection, embedding_function=embedding_model)
+    vector_store = CustomMongoDBVectorStore(
+        collection=collection,
+        embedding_function=embedding_service,
+        index_path=Config.VECTOR_INDEX_PATH,
+        persist_delay=Config.VECTOR_INDEX_PERSIST_DELAY_SECONDS,
+        changes=embeddings_version,
+        search_mode=Config.VECTOR_SEARCH_MODE,
+        storage_format=Config.EMBEDDING_STORAGE_FORMAT,
+        batch_size=Config.EMBEDDING_INSERT_BATCH_SIZE,
+        max_batch_bytes=Config.EMBEDDING_INSERT_MAX_BATCH_BYTES
+    )
 else:
-    raise Exception("MongoDB connection failed, 'pdf_embeddings' collection not found.")
-
+    logging.error("[ERROR] MongoDB connection failed, 'embeddings' collection not available.")
+    vector_store = None
 
-# Conversation memory class
-class ConversationMemory:
-    def __init__(self):
-        self.messages = []
 
-    def add_message(self, role, message):
-        self.messages.append({"role": role, "message": message})
+def current_embeddings_version():
+    return embeddings_version.version() if embeddings_version is not None else None
 
-    def get_context(self):
-        return " ".join([msg["message"] for msg in self.messages])
 
+def load_pdf_embeddings(pdf_id, version=None):
+    """The cached embedding matrix for a PDF, reloaded if the stored chunks changed since."""
+    if version is None:
+        version = current_embeddings_version()
+    return embedding_cache.get_or_load(pdf_id, vector_store.load_embeddings, version)
 
-memory = ConversationMemory()
 
+def invalidate_pdf_caches(pdf_id):
+    """Drop cached retrieval state for a PDF whose embeddings changed, here and in other workers."""
+    embedding_cache.invalidate(str(pdf_id))
+    answer_cache.invalidate(str(pdf_id))
+    if embeddings_version is not None:
+        embeddings_version.bump()
 
-def call_primary_api(prompt):
-    """Call OpenAI API as the primary API (new SDK)."""
-    try:
-        logging.info("[INFO] Attempting to call OpenAI primary API.")
-        response = primary_client.chat.completions.create(
-            model="llama-3.1-8b-instant",   # pick the model you actually have access to
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant. If the user greets you (e.g., 'Hello'), reply politely without summarizing or referencing the document. "
-                    "For all other queries, provide concise and relevant answers."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=512,
-            temperature=1.0,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"[ERROR] Exception during OpenAI API call: {e}", exc_info=True)
-        raise
 
+GENERAL_SYSTEM_PROMPT = (
+    "You are a helpful assistant. If the user greets you (e.g., 'Hello'), reply politely without summarizing or referencing the document. "
+    "For all other queries, provide concise and relevant answers."
+)
 
-def call_groq_api(chat_history):
-    """Call the Groq AI API."""
-    try:
-        logging.info("[INFO] Attempting to call the Groq AI API.")
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=chat_history,
-            max_tokens=512,
-            temperature=1.2
-        )
-        logging.info("[INFO] Groq API response received successfully.")
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"[ERROR] Exception during Groq API call: {e}", exc_info=True)
-        raise
+SYLLABUS_SYSTEM_PROMPT = (
+    "You are a helpful assistant answering questions about a course syllabus. "
+    "Use your understanding to match the intent of the question to the context, "
+    "even if the wording differs. Only say you couldn't find something if it is "
+    "genuinely absent from the context."
+)
 
+SYLLABI_SYSTEM_PROMPT = (
+    "You are a helpful assistant answering questions that span several course syllabi. "
+    "Each excerpt in the context is labelled with its course. Say which course every "
+    "fact comes from, and when the question compares courses, cover each course that "
+    "has relevant information."
+)
 
-@chatbot_controller.route('/chat_with_pdf', methods=['POST'])
-def chat_with_pdf():
-    """Route to handle chat with PDF content."""
-    try:
-        data = request.json
-        user_message = data.get("message")
-        pdf_content = data.get("pdfContent")
 
-        if not user_message or not pdf_content:
-            logging.error("[ERROR] Missing required parameters.")
-            return jsonify({"error": "Missing required parameters (message and pdfContent)."}), 400
+def build_chat_history(system_prompt, prompt, history=None):
+    """Chat messages for one turn: system prompt, prior conversation, then the new prompt."""
+    return [{"role": "system", "content": system_prompt}, *(history or []), {"role": "user", "content": prompt}]
 
-        prompt = f"PDF Content:\n{pdf_content}\nUser Message: {user_message}"
 
-        # Attempt to call primary API
-        try:
-            logging.info("[INFO] Using primary API for response.")
-            primary_response = call_primary_api(prompt)
-            return jsonify({"response": primary_response}), 200
-        except Exception:
-            logging.warning("[WARNING] Primary API failed. Switching to Groq AI.")
-            user_confirmation = data.get("switchToGroq", True)
-            if not user_confirmation:
-                return jsonify({"error": "Primary API failed, and user declined to switch to Groq AI."}), 400
-
-            # Build conversation history for Groq API
-            system_prompt = {
-                "role": "system",
-                "content": (
-                    "You are a helpful assistant. If the user greets you (e.g., 'Hello'), reply politely without summarizing or referencing the document. "
-                    "For all other queries, provide concise and relevant answers."
-                )
-            }
-
-            chat_history = [system_prompt]
-            chat_history.append({"role": "user", "content": prompt})
-
-            # Call Groq API
-            groq_response = call_groq_api(chat_history)
-            return jsonify({"response": groq_response}), 200
+def summarize_turns(previous_summary, turns):
+    """Fold dropped conversation turns into a short rolling summary."""
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    summary, _ = llm_gateway.complete([
+        {"role": "system", "content": "Summarize this conversation about a course syllabus in at most three sentences. "
+                                      "Keep names, dates and facts the student asked about."},
+        {"role": "user", "content": f"Earlier summary: {previous_summary or 'none'}\n\nNew turns:\n{transcript}"}
+    ])
+    return summary
 
-    except Exception as e:
-        logging.error(f"[ERROR] Exception in /chat_with_pdf: {e}", exc_info=True)
-        return jsonify({"error": "An internal server error occurred."}), 500
 
-@chatbot_controller.route('/chat_with_pdf_embeddings', methods=['POST'])
-def chat_with_pdf_embeddings():
+if Config.CONVERSATION_STORE == "mongo" and db is not None:
+    conversation_store = MongoConversationStore(db["conversations"], idle_seconds=Config.CONVERSATION_IDLE_SECONDS)
+else:
+    conversation_store = InMemoryConversationStore(idle_seconds=Config.CONVERSATION_IDLE_SECONDS)
+
+conversation_memory = ConversationMemory(
+    conversation_store,
+    count_tokens=count_tokens,
+    token_budget=Config.CONVERSATION_TOKEN_BUDGET,
+    summarizer=summarize_turns if Config.CONVERSATION_SUMMARIZE else None
+)
+
+
+# Retrieved chunks sent with each RAG prompt, chosen by score within a token budget
+context_packer = ContextPacker(
+    count_tokens,
+    token_budget=Config.RAG_CONTEXT_TOKEN_BUDGET,
+    min_k=Config.RAG_MIN_K,
+    max_k=Config.RAG_MAX_K,
+    min_score=Config.RAG_MIN_SCORE,
+    score_margin=Config.RAG_SCORE_MARGIN
+)
+
+# Per-syllabus selection in multi-syllabus chat; one relevant chunk per course can be enough
+syllabi_packer = ContextPacker(
+    count_tokens,
+    token_budget=Config.MULTI_SYLLABUS_TOKEN_BUDGET,
+    min_k=1,
+    max_k=Config.MULTI_SYLLABUS_K_PER_PDF,
+    min_score=Config.RAG_MIN_SCORE,
+    score_margin=Config.RAG_SCORE_MARGIN
+)
+
+
+def conversation_session_id(data, user_id):
+    """Conversation key for this client, never one that belongs to someone else.
+
+    A client ``sessionId`` only picks a conversation within its own scope: it
+    is nested under the logged-in user, and anonymous ids get a prefix no user
+    id can match. Without a sessionId a logged-in user has a single conversation.
     """
-    Route to handle chat using stored PDF embeddings (RAG-based).
+    client_session_id = data.get("sessionId")
+    if client_session_id is not None and not isinstance(client_session_id, str):
+        client_session_id = None
+    if user_id:
+        return f"{user_id}:{client_session_id}" if client_session_id else str(user_id)
+    return f"anonymous:{client_session_id}" if client_session_id else None
+
+
+def conversation_history(data, session_id, conversation_key):
+    """Prior turns for this request, rewound to the client's ``turn`` after an edit/resend."""
+    turn = data.get("turn")
+    if not isinstance(turn, int) or isinstance(turn, bool) or turn < 0:
+        turn = None
+    return conversation_memory.history(session_id, conversation_key, turn=turn)
+
+
+def pdf_conversation_key(pdf_id, pdf_content):
+    """Conversation key for /chat_with_pdf; legacy clients without a pdfId are keyed by their content."""
+    if pdf_id:
+        return pdf_id
+    return "pdf_content:" + hashlib.sha256(pdf_content.encode("utf-8")).hexdigest()
+
+
+def syllabi_conversation_key(pdf_ids):
+    return "syllabi:" + ",".join(sorted(pdf_ids))
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+FAILOVER_DECLINED = {"error": "Primary API failed, and user declined to switch to Groq AI."}
+
+
+def start_stage_timer(route):
+    """Stage timer for this request; app.py turns it into a Server-Timing header."""
+    g.stage_timer = StageTimer(route)
+    return g.stage_timer
+
+
+def sse_chat_events(tokens, retrieved_chunks=None, on_complete=None, metadata=None, timer=None):
+    """Turn a ``(provider, token)`` iterator such as ``llm_gateway.stream`` into text/event-stream events.
+
+    Emits an early ``chunks`` event (when retrieval ran), one ``token`` event per
+    token, then ``done`` with the full answer and any ``metadata``, or ``error``
+    if generation failed. ``on_complete(response)`` is called before ``done``.
+    With a ``timer``, time to first token and the whole generation are recorded
+    as the ``llm_first_token`` and ``llm_call`` stages.
     """
+    if retrieved_chunks is not None:
+        yield sse_event("chunks", {"retrieved_chunks": retrieved_chunks})
+
+    parts = []
+    provider = None
+    start = time.perf_counter()
     try:
-        data = request.json
-        user_message = data.get("message")
-        pdf_id = data.get("pdfId")
+        for provider, token in tokens:
+            if not parts and timer is not None:
+                timer.record("llm_first_token", time.perf_counter() - start)
+            parts.append(token)
+            yield sse_event("token", {"content": token})
+        if timer is not None:
+            timer.record("llm_call", time.perf_counter() - start)
+        response = "".join(parts).strip()
+        if on_complete is not None and response:
+            on_complete(response)
+        yield sse_event("done", {"response": response, "provider": provider, **(metadata or {})})
+    except Exception as e:
+        logging.error(f"[ERROR] Streaming chat response failed: {e}", exc_info=True)
+        yield sse_event("error", {"error": "An internal server error occurred."})
 
-        if not user_message or not pdf_id:
-            logging.error("[ERROR] Missing required parameters.")
-            return jsonify({"error": "Missing required parameters (message and pdfId)."}), 400
 
-        # Step 1: Retrieve relevant chunks for this specific PDF
-        query_embedding = embedding_model.encode(user_message, normalize_embeddings=False)
-        query_vector = np.array(query_embedding)
+class ChatTurn:
+    """A chat request taken up to the LLM call, shared by the Flask and ASGI routes.
 
-        results = []
+    ``chat_history`` is what to send to the LLM and ``finish(response)``
+    records the answer and returns the JSON body. ``reply`` is a ready
+    ``(body, status)`` for requests that end before the LLM (bad input,
+    missing PDF); ``cached_answer`` is a semantic cache hit that stands in for
+    the LLM call.
+    """
 
-        for doc in collection.find({"pdf_id": pdf_id}):
-            doc_embedding = np.array(doc["embedding"])
-            similarity = vector_store._cosine_similarity(query_vector, doc_embedding)
-            results.append((doc["content"], similarity))
+    def __init__(self, timer, chat_history=None, stream=False, allow_failover=True, retrieved_chunks=None,
+                 extras=None, on_complete=None, cached_answer=None, reply=None):
+        self.timer = timer
+        self.chat_history = chat_history
+        self.stream = bool(stream)
+        self.allow_failover = allow_failover
+        self.retrieved_chunks = retrieved_chunks
+        self.extras = extras or {}
+        self.on_complete = on_complete
+        self.cached_answer = cached_answer
+        self.reply = reply
+
+    def sse_events(self):
+        if self.cached_answer is not None:
+            return sse_chat_events(
+                iter([("cache", self.cached_answer["response"])]),
+                retrieved_chunks=self.retrieved_chunks,
+                on_complete=self.on_complete
+            )
+        return sse_chat_events(
+            llm_gateway.stream(self.chat_history, allow_failover=self.allow_failover),
+            retrieved_chunks=self.retrieved_chunks,
+            on_complete=self.on_complete,
+            metadata=self.extras or None,
+            timer=self.timer
+        )
 
-        if not results:
-            logging.warning("[WARNING] No matching embeddings found for this PDF.")
-            return jsonify({"error": "No embeddings found for this PDF ID."}), 404
+    def finish(self, response):
+        if self.on_complete is not None:
+            self.on_complete(response)
+        if self.cached_answer is not None:
+            return {**self.cached_answer, "cached": True}
+        body = {"response": response}
+        if self.retrieved_chunks is not None:
+            body["retrieved_chunks"] = self.retrieved_chunks
+        body.update(self.extras)
+        return body
 
-        results.sort(key=lambda x: x[1], reverse=True)
 
-        # Step 2: Increase top_k and log similarity scores for debugging
-        top_k = 5
-        top_results = results[:top_k]
-        
-        logging.info(f"[DEBUG] Top similarity scores: {[round(score, 4) for _, score in top_results]}")
+def assemble_pdf_context(pdf_id, user_message, budget):
+    """Build prompt context for a stored PDF within ``budget`` tokens.
 
-        # Step 3: Only filter out chunks with near-zero similarity
-        SIMILARITY_THRESHOLD = 0.1
-        top_chunks = [
-            content for content, score in top_results
-            if score > SIMILARITY_THRESHOLD
-        ]
+    Returns ``(context, mode, context_tokens)``. ``mode`` is "full" when the whole
+    document fits, "retrieval" when the best-matching chunks are packed up to the
+    budget (in document order), or "truncated" when no embeddings exist yet.
+    """
+    # Only the stored per-page token counts are read here; the page text is
+    # loaded for the "full" and "truncated" modes alone
+    total_tokens = sum(pdf_text_store.get_page_tokens(pdf_id, count_tokens))
+    if total_tokens <= budget:
+        return pdf_text_store.get_text(pdf_id), "full", total_tokens
+
+    cached = load_pdf_embeddings(pdf_id)
+    if cached is not None:
+        query_vector = embedding_service.encode(user_message, normalize_embeddings=True)
+        indices, _ = score_top_k(query_vector, cached.matrix, len(cached.texts))
+
+        selected = []
+        used = 0
+        for i in indices[0]:
+            tokens = count_tokens(cached.texts[i])
+            if used + tokens > budget:
+                continue
+            selected.append(i)
+            used += tokens
+            if budget - used < 32:
+                break
+
+        selected.sort()
+        return "\n\n".join(cached.texts[i] for i in selected), "retrieval", used
+
+    context = truncate_to_tokens(pdf_text_store.get_text(pdf_id), budget)
+    return context, "truncated", count_tokens(context)
+
+
+def prepare_pdf_chat(data, user_id, timer):
+    """Take a /chat_with_pdf request up to the LLM call."""
+    user_message = data.get("message")
+    pdf_content = data.get("pdfContent")
+    pdf_id = data.get("pdfId")
+
+    if not user_message or not (pdf_content or pdf_id):
+        logging.error("[ERROR] Missing required parameters.")
+        return ChatTurn(timer, reply=({"error": "Missing required parameters (message and pdfContent or pdfId)."}, 400))
+
+    # Legacy clients post the whole PDF text; newer ones send only its id and
+    # the server assembles a budgeted context from the stored extraction.
+    usage = None
+    if not pdf_content:
+        if not ObjectId.is_valid(pdf_id):
+            return ChatTurn(timer, reply=({"error": "Invalid PDF ID."}, 400))
+        try:
+            pdf_content, context_mode, context_tokens = assemble_pdf_context(
+                pdf_id, user_message, Config.CHAT_CONTEXT_TOKEN_BUDGET
+            )
+        except gridfs.errors.NoFile:
+            return ChatTurn(timer, reply=({"error": "PDF file not found."}, 404))
+        usage = {"context_mode": context_mode, "context_tokens": context_tokens}
+        timer.lap("context_assembly")
+
+    session_id = conversation_session_id(data, user_id)
+    conversation_key = pdf_conversation_key(pdf_id, data.get("pdfContent"))
+    history = conversation_history(data, session_id, conversation_key)
+
+    prompt = f"PDF Content:\n{pdf_content}\nUser Message: {user_message}"
+    chat_history = build_chat_history(GENERAL_SYSTEM_PROMPT, prompt, history)
+
+    if usage:
+        usage["prompt_tokens"] = sum(count_tokens(message["content"]) for message in chat_history)
+    timer.lap("prompt_build")
+
+    return ChatTurn(
+        timer,
+        chat_history=chat_history,
+        stream=data.get("stream"),
+        allow_failover=data.get("switchToGroq", True),
+        extras={"usage": usage} if usage else None,
+        on_complete=lambda response: conversation_memory.add_turn(
+            session_id, conversation_key, user_message, response
+        )
+    )
+
+
+def prepare_embeddings_chat(data, user_id, timer):
+    """Take a /chat_with_pdf_embeddings request up to the LLM call (RAG over stored chunks)."""
+    user_message = data.get("message")
+    pdf_id = data.get("pdfId")
+
+    if not user_message or not pdf_id:
+        logging.error("[ERROR] Missing required parameters.")
+        return ChatTurn(timer, reply=({"error": "Missing required parameters (message and pdfId)."}, 400))
+
+    query_vector = embedding_service.encode(user_message, normalize_embeddings=True)
+    timer.lap("embed_query")
+
+    session_id = conversation_session_id(data, user_id)
+    history = conversation_history(data, session_id, pdf_id)
+    # Read before anything is loaded, so results of a concurrent write are never tagged current
+    version = current_embeddings_version()
+
+    # Serve repeated questions from the semantic answer cache. Decided per
+    # turn: a self-contained question is cacheable mid-conversation, while a
+    # follow-up depends on the earlier turns and always goes to the LLM.
+    use_answer_cache = Config.ANSWER_CACHE_ENABLED and not (history and is_follow_up(user_message))
+    if use_answer_cache:
+        cached_answer = answer_cache.lookup(pdf_id, query_vector, version)
+        if cached_answer is not None:
+            timer.lap("answer_cache")
+            return ChatTurn(
+                timer,
+                stream=data.get("stream"),
+                cached_answer=cached_answer,
+                retrieved_chunks=cached_answer["retrieved_chunks"],
+                on_complete=lambda response: conversation_memory.add_turn(session_id, pdf_id, user_message, response)
+            )
+    timer.lap("answer_cache")
+
+    # Step 1: Retrieve relevant chunks for this specific PDF
+    cached = load_pdf_embeddings(pdf_id, version)
+    timer.lap("mongo_fetch")
+
+    if cached is None:
+        logging.warning("[WARNING] No matching embeddings found for this PDF.")
+        return ChatTurn(timer, reply=({"error": "No embeddings found for this PDF ID."}, 404))
+
+    # Step 2: Score the top candidates, fusing exact-term matches (course
+    # codes, rooms, dates) from BM25 by rank, and log similarity scores
+    candidates, dense_scores = rank_candidates(
+        query_vector,
+        cached,
+        depth=max(Config.HYBRID_CANDIDATES, context_packer.max_k),
+        limit=context_packer.max_k,
+        lexical_index=lexical_index_store.get_or_build(pdf_id, cached.texts) if Config.LEXICAL_SEARCH_ENABLED else None,
+        query_text=user_message,
+        rrf_k=Config.RRF_K
+    )
+    log_sampled(
+        logging.DEBUG,
+        lambda: f"[DEBUG] Top similarity scores: {[round(score, 4) for score in dense_scores[:context_packer.max_k]]}",
+        Config.LOG_SAMPLE_RATE
+    )
+    timer.lap("scoring")
+
+    # Step 3: Pick k from the score distribution, drop overlapping sentences
+    # and fill the prompt token budget by score
+    top_chunks, context_stats = context_packer.pack(candidates)
+    log_sampled(logging.DEBUG, lambda: f"[DEBUG] Packed RAG context: {context_stats}", Config.LOG_SAMPLE_RATE)
+
+    context = "\n\n".join(top_chunks)
+
+    # Step 4: More flexible prompt that handles paraphrased questions
+    prompt = f"""
+    You are a helpful assistant answering questions about a course syllabus.
+
+    If the user greets you (e.g., 'Hello'), reply politely without referencing the document.
+
+    Use the provided context to answer the question. 
+    The question may be phrased differently from the text — use your understanding to match the intent.
+    For example, "who is teaching this course", "who is the instructor", and "who is the professor" all mean the same thing.
+
+    If the answer truly cannot be found in the context, say "I couldn't find that in the document."
+    Do NOT say that if the answer is present but just worded differently.
+
+    Context:
+    {context}
+
+    Question:
+    {user_message}
+    """
 
-        if not top_chunks:
-            # Fall back to top 3 regardless of score
-            top_chunks = [content for content, _ in results[:3]]
+    chat_history = build_chat_history(SYLLABUS_SYSTEM_PROMPT, prompt, history)
+    timer.lap("prompt_build")
 
-        context = "\n\n".join(top_chunks)
+    def remember_answer(response):
+        if use_answer_cache:
+            answer_cache.store(pdf_id, query_vector, response, top_chunks, version)
+        conversation_memory.add_turn(session_id, pdf_id, user_message, response)
 
-        # Step 4: More flexible prompt that handles paraphrased questions
-        prompt = f"""
-        You are a helpful assistant answering questions about a course syllabus.
+    return ChatTurn(
+        timer,
+        chat_history=chat_history,
+        stream=data.get("stream"),
+        retrieved_chunks=top_chunks,
+        extras={"context_stats": context_stats},
+        on_complete=remember_answer
+    )
 
-        If the user greets you (e.g., 'Hello'), reply politely without referencing the document.
 
-        Use the provided context to answer the question. 
-        The question may be phrased differently from the text — use your understanding to match the intent.
-        For example, "who is teaching this course", "who is the instructor", and "who is the professor" all mean the same thing.
+def prepare_syllabi_chat(data, user_id, timer):
+    """Take a /chat_with_syllabi request up to the LLM call.
 
-        If the answer truly cannot be found in the context, say "I couldn't find that in the document."
-        Do NOT say that if the answer is present but just worded differently.
+    Syllabi are selected by ``pdfIds`` or by ``departmentId``/``courseIds``.
+    Their cached embedding matrices are scored in one pass and each syllabus
+    contributes its own best chunks, labelled with the course they came from.
+    """
+    user_message = data.get("message")
+    pdf_ids = data.get("pdfIds") or []
+    department_id = data.get("departmentId")
+    course_ids = data.get("courseIds") or []
+
+    if not user_message or not (pdf_ids or department_id or course_ids):
+        logging.error("[ERROR] Missing required parameters.")
+        return ChatTurn(
+            timer, reply=({"error": "Missing required parameters (message and pdfIds, departmentId or courseIds)."}, 400)
+        )
+    if not isinstance(pdf_ids, list) or not isinstance(course_ids, list):
+        return ChatTurn(timer, reply=({"error": "pdfIds and courseIds must be lists."}, 400))
+
+    query = {}
+    if pdf_ids:
+        query["syllabus_pdf__in"] = pdf_ids
+    if department_id:
+        query["department_id"] = department_id
+    if course_ids:
+        query["course_id__in"] = course_ids
+    syllabi = list(
+        Syllabus.objects(**query)
+        .only("course_id", "course_name", "syllabus_pdf")
+        .order_by("course_id")
+        .limit(Config.MULTI_SYLLABUS_MAX_PDFS + 1)
+        .as_pymongo()
+    )
+    if not syllabi:
+        return ChatTurn(timer, reply=({"error": "No syllabi match the selection."}, 404))
+    if len(syllabi) > Config.MULTI_SYLLABUS_MAX_PDFS:
+        return ChatTurn(timer, reply=({
+            "error": f"More than {Config.MULTI_SYLLABUS_MAX_PDFS} syllabi match; narrow the selection."
+        }, 400))
+    timer.lap("syllabus_lookup")
+
+    query_vector = embedding_service.encode(user_message, normalize_embeddings=True)
+    timer.lap("embed_query")
+
+    version = current_embeddings_version()
+    found = []
+    entries = []
+    missing = []
+    for syllabus in syllabi:
+        cached = load_pdf_embeddings(syllabus["syllabus_pdf"], version)
+        if cached is None:
+            missing.append(syllabus["syllabus_pdf"])
+        else:
+            found.append(syllabus)
+            entries.append(cached)
+    timer.lap("mongo_fetch")
+
+    if not entries:
+        logging.warning("[WARNING] No embeddings found for the selected syllabi.")
+        return ChatTurn(timer, reply=({"error": "No embeddings found for the selected syllabi."}, 404))
+
+    per_syllabus = rank_candidates_across(
+        query_vector,
+        entries,
+        depth=max(Config.HYBRID_CANDIDATES, syllabi_packer.max_k),
+        limit=syllabi_packer.max_k,
+        lexical_indexes=[
+            lexical_index_store.get_or_build(syllabus["syllabus_pdf"], cached.texts)
+            for syllabus, cached in zip(found, entries)
+        ] if Config.LEXICAL_SEARCH_ENABLED else None,
+        query_text=user_message,
+        rrf_k=Config.RRF_K
+    )
+    timer.lap("scoring")
+
+    # The token budget is split evenly so every selected course gets a say
+    budget = syllabi_packer.token_budget // len(entries)
+    sources = []
+    sections = []
+    for syllabus, candidates in zip(found, per_syllabus):
+        chunks, context_stats = syllabi_packer.pack(candidates, token_budget=budget)
+        sources.append({
+            "pdf_id": syllabus["syllabus_pdf"],
+            "course_id": syllabus.get("course_id"),
+            "course_name": syllabus.get("course_name"),
+            "retrieved_chunks": chunks,
+            "context_stats": context_stats
+        })
+        if chunks:
+            label = f"{syllabus.get('course_id')} - {syllabus.get('course_name')}"
+            sections.append(f"[{label}]\n" + "\n\n".join(chunks))
+    timer.lap("context_assembly")
+
+    context = "\n\n".join(sections)
+    prompt = f"""
+    Answer the question using the syllabus excerpts below. Each excerpt starts
+    with its course in square brackets.
+
+    Name the course for every fact you use. If the question compares courses,
+    go through each course that has relevant information. If a course's excerpts
+    do not cover the question, leave it out rather than guessing.
+
+    Syllabi:
+    {context}
+
+    Question:
+    {user_message}
+    """
 
-        Context:
-        {context}
+    session_id = conversation_session_id(data, user_id)
+    conversation_key = syllabi_conversation_key(source["pdf_id"] for source in sources)
+    history = conversation_history(data, session_id, conversation_key)
+    chat_history = build_chat_history(SYLLABI_SYSTEM_PROMPT, prompt, history)
+    timer.lap("prompt_build")
+
+    extras = {"sources": sources}
+    if missing:
+        extras["missing_pdf_ids"] = missing
+    return ChatTurn(
+        timer,
+        chat_history=chat_history,
+        stream=data.get("stream"),
+        retrieved_chunks=[chunk for source in sources for chunk in source["retrieved_chunks"]],
+        extras=extras,
+        on_complete=lambda response: conversation_memory.add_turn(
+            session_id, conversation_key, user_message, response
+        )
+    )
 
-        Question:
-        {user_message}
-        """
 
-        try:
-            logging.info("[INFO] Using primary API for embedding-based response.")
-            response = call_primary_api(prompt)
-            return jsonify({
-                "response": response,
-                "retrieved_chunks": top_chunks
-            }), 200
-
-        except Exception:
-            logging.warning("[WARNING] Primary API failed. Switching to Groq.")
-            system_prompt = {
-                "role": "system",
-                "content": (
-                    "You are a helpful assistant answering questions about a course syllabus. "
-                    "Use your understanding to match the intent of the question to the context, "
-                    "even if the wording differs. Only say you couldn't find something if it is "
-                    "genuinely absent from the context."
-                )
-            }
-
-            chat_history = [
-                system_prompt,
-                {"role": "user", "content": prompt}
-            ]
-
-            groq_response = call_groq_api(chat_history)
-
-            return jsonify({
-                "response": groq_response,
-                "retrieved_chunks": top_chunks
-            }), 200
+def respond(turn):
+    """Flask response for a prepared chat turn, calling the LLM on this thread."""
+    if turn.reply is not None:
+        body, status = turn.reply
+        return jsonify(body), status
+    if turn.stream:
+        return Response(stream_with_context(turn.sse_events()), mimetype="text/event-stream", headers=SSE_HEADERS)
+    if turn.cached_answer is not None:
+        return jsonify(turn.finish(turn.cached_answer["response"])), 200
+
+    try:
+        with turn.timer.stage("llm_call"):
+            response, provider = llm_gateway.complete(turn.chat_history, allow_failover=turn.allow_failover)
+    except LLMUnavailableError:
+        if not turn.allow_failover:
+            logging.warning("[WARNING] Primary API failed and user declined to switch to Groq AI.")
+            return jsonify(FAILOVER_DECLINED), 400
+        raise
+
+    log_sampled(logging.INFO, f"[INFO] {turn.timer.route} response served by the {provider} provider.", Config.LOG_SAMPLE_RATE)
+    return jsonify(turn.finish(response)), 200
+
+
+@chatbot_controller.route('/chat_with_pdf', methods=['POST'])
+def chat_with_pdf():
+    """Route to handle chat with PDF content."""
+    try:
+        return respond(prepare_pdf_chat(request.json, session.get("user_id"), start_stage_timer("chat_with_pdf")))
+    except Exception as e:
+        logging.error(f"[ERROR] Exception in /chat_with_pdf: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred."}), 500
+
 
+@chatbot_controller.route('/chat_with_pdf_embeddings', methods=['POST'])
+def chat_with_pdf_embeddings():
+    """
+    Route to handle chat using stored PDF embeddings (RAG-based).
+    """
+    try:
+        timer = start_stage_timer("chat_with_pdf_embeddings")
+        return respond(prepare_embeddings_chat(request.json, session.get("user_id"), timer))
     except Exception as e:
         logging.error(f"[ERROR] Exception in /chat_with_pdf_embeddings: {e}", exc_info=True)
         return jsonify({"error": "An internal server error occurred."}), 500
-    
+
+
+@chatbot_controller.route('/chat_with_syllabi', methods=['POST'])
+def chat_with_syllabi():
+    """Route to answer one question across several syllabi with a single LLM call."""
+    try:
+        timer = start_stage_timer("chat_with_syllabi")
+        return respond(prepare_syllabi_chat(request.json, session.get("user_id"), timer))
+    except Exception as e:
+        logging.error(f"[ERROR] Exception in /chat_with_syllabi: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred."}), 500
+
+
+@chatbot_controller.route('/reset_conversation', methods=['POST'])
+def reset_conversation():
+    """Forget the server-side history of one conversation (pdfId, pdfContent or pdfIds)."""
+    data = request.json or {}
+    session_id = conversation_session_id(data, session.get("user_id"))
+    pdf_ids = data.get("pdfIds")
+    if pdf_ids and isinstance(pdf_ids, list):
+        conversation_key = syllabi_conversation_key(pdf_ids)
+    elif data.get("pdfId") or data.get("pdfContent"):
+        conversation_key = pdf_conversation_key(data.get("pdfId"), data.get("pdfContent"))
+    else:
+        return jsonify({"error": "Missing required parameters (pdfId, pdfContent or pdfIds)."}), 400
+    if not session_id:
+        return jsonify({"error": "No conversation session."}), 400
+
+    conversation_memory.clear(session_id, conversation_key)
+    return jsonify({"message": "Conversation reset."}), 200
+
+
 @chatbot_controller.route('/add_pdf_embeddings', methods=['POST'])
 def add_pdf_embeddings():
     """Route to add PDF embeddings to MongoDB."""
@@ -301,7 +749,13 @@ def add_pdf_embeddings():
             logging.error("[ERROR] Invalid input data for embedding.")
             return jsonify({"error": "Invalid input. Please provide PDF content and PDF ID."}), 400
 
-        vector_store.add_document(pdf_id, pdf_content)
+        result = vector_store.add_document(pdf_id, pdf_content)
+        if result is None:
+            return jsonify({"error": "Failed to add PDF embeddings."}), 500
+
+        # New chunks change retrieval for this PDF, so cached matrices and answers are stale
+        invalidate_pdf_caches(pdf_id)
+
         logging.info(f"[INFO] PDF content embeddings added successfully for PDF ID: {pdf_id}")
         return jsonify({"message": "PDF content embeddings added successfully."}), 200
 
@@ -319,3 +773,9 @@ def list_pdf_embeddings():
     except Exception as e:
         logging.error(f"[ERROR] Failed to list PDF embeddings: {e}", exc_info=True)
         return jsonify({"error": "Failed to list PDF embeddings."}), 500
+
+
+@chatbot_controller.route('/answer_cache_stats', methods=['GET'])
+def answer_cache_stats():
+    """Report semantic answer cache hit/miss counters for this worker."""
+    return jsonify(answer_cache.stats()), 200
@@ -1,30 +1,107 @@
-import io
-import re
-from flask import jsonify, request, send_file, session
-from config import db, fs
-import fitz
+import hashlib
+from flask import Response, jsonify, make_response, request, session
+from werkzeug.http import http_date
+from config import db, fs, Config
 from bson import ObjectId
 from model.syllabus import Syllabus
-from sentence_transformers import SentenceTransformer
-from controller.chatbot_controller import CustomMongoDBVectorStore
+from controller.chatbot_controller import invalidate_pdf_caches, vector_store, pdf_text_store, lexical_index_store
+from service.chunking import chunk_hash, iter_chunks
+from service.pdf_text import iter_page_blocks, read_gridfs_file
+from service.tokens import count_tokens, truncate_to_tokens
+from service.ingestion import IngestionQueue, InMemoryJobStore, MongoJobStore
+from service.change_counter import ChangeCounter
+from service.gridfs_stream import RangeNotSatisfiable, gridfs_etag, iter_gridfs, parse_range
 import logging
 import gridfs
 
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+embeddings_collection = db["embeddings"] if db is not None else None
 
-embeddings_collection = db["embeddings"]
+# Bumped on every syllabus write; drives the listing ETags
+syllabi_version = ChangeCounter(
+    db["counters"], "syllabi", refresh_seconds=Config.LISTING_VERSION_REFRESH_SECONDS
+) if db is not None else None
 
-vector_store = CustomMongoDBVectorStore(
-    collection=embeddings_collection,
-    embedding_function=embedding_model
+# Fields returned by the syllabus listings
+LISTING_FIELDS = (
+    "course_id", "course_name", "department_id", "department_name",
+    "uploaded_by", "syllabus_description", "syllabus_pdf"
 )
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
 
 
+def hash_chunk_text(text):
+    return chunk_hash(text, Config.EMBEDDING_MODEL_NAME)
+
+
+def ingest_pdf(pdf_id, previous_pdf_id=None):
+    """Extract, chunk and embed a stored PDF. Safe to retry for the same pdf_id.
+
+    Chunks whose content hash matches one already stored for this PDF or for
+    ``previous_pdf_id`` (the file it replaced) reuse that embedding, so only
+    new or changed text is embedded. Chunks are embedded and written in
+    batches as they are generated. The previous PDF's chunks are removed
+    once the new set is fully written.
+    """
+    pages = pdf_text_store.get_pages(pdf_id)
+
+    page_blocks = None
+    if Config.CHUNK_STRATEGY == "layout":
+        pdf_bytes, _ = read_gridfs_file(fs.get(ObjectId(pdf_id)))
+        page_blocks = iter_page_blocks(pdf_bytes)
+
+    chunks = iter_chunks(
+        pages,
+        count_tokens,
+        truncate_to_tokens,
+        strategy=Config.CHUNK_STRATEGY,
+        max_tokens=Config.CHUNK_MAX_TOKENS,
+        min_tokens=Config.CHUNK_MIN_TOKENS,
+        overlap_sentences=Config.CHUNK_OVERLAP_SENTENCES,
+        page_blocks=page_blocks
+    )
+    result, texts = vector_store.ingest_chunks(pdf_id, chunks, hash_chunk_text, reuse_from=(previous_pdf_id,))
+
+    if texts:
+        lexical_index_store.build(pdf_id, texts)
+        logging.info(
+            f"[INFO] Embedded {result['embedded']} new chunks, reused {result['reused']} "
+            f"({Config.CHUNK_STRATEGY} strategy)."
+        )
+    else:
+        lexical_index_store.delete(pdf_id)
+        logging.warning("[WARNING] No readable text found. Embeddings not created.")
+    invalidate_pdf_caches(pdf_id)
+    remove_previous_pdf(previous_pdf_id)
+    return result
+
+
+def remove_previous_pdf(previous_pdf_id):
+    """Drop the chunks and retrieval state of a PDF that has been replaced."""
+    if not previous_pdf_id:
+        return
+    embeddings_collection.delete_many({"pdf_id": previous_pdf_id})
+    vector_store.remove_pdf(previous_pdf_id)
+    lexical_index_store.delete(previous_pdf_id)
+    invalidate_pdf_caches(previous_pdf_id)
+
+
+if Config.INGESTION_JOB_STORE == "memory" or db is None:
+    job_store = InMemoryJobStore()
+else:
+    job_store = MongoJobStore(db["ingestion_jobs"])
+
+ingestion_queue = IngestionQueue(
+    handler=ingest_pdf,
+    store=job_store,
+    workers=Config.INGESTION_WORKERS,
+    max_attempts=Config.INGESTION_MAX_ATTEMPTS
+)
+
+
 def add_syllabus():
-    """Add a new syllabus, store the PDF in GridFS, and generate embeddings automatically."""
+    """Add a new syllabus, store the PDF in GridFS, and queue embedding generation."""
     try:
         username = session.get('username')
         if not username:
@@ -56,75 +133,18 @@ def add_syllabus():
             uploaded_by=username
         )
         syllabus.save()
+        syllabi_version.bump()
 
-        try:
-            logging.info("[INFO] Generating embeddings for uploaded PDF.")
-
-            # Avoid duplicate embeddings
-            existing = embeddings_collection.find_one({"pdf_id": str(pdf_file_id)})
-            if not existing:
-
-                file_data = fs.get(ObjectId(pdf_file_id))
-                pdf_stream = io.BytesIO(file_data.read())
-                document = fitz.open(stream=pdf_stream, filetype="pdf")
-
-                text_content = ""
-                for page in document:
-                    text_content += page.get_text()
-
-                document.close()
-
-                if text_content.strip():
-
-                    def create_overlapping_chunks(text, chunk_size=3, overlap=1):
-                        # Split into individual sentences
-                        sentences = [
-                            s.strip()
-                            for s in re.split(r'(?<=[.!?])\s+', text)
-                            if s.strip()
-                        ]
-
-                        chunks = []
-                        step = chunk_size - overlap  # step = 2
-
-                        for i in range(0, len(sentences), step):
-                            chunk = " ".join(sentences[i:i + chunk_size])
-                            if chunk.strip():
-                                chunks.append(chunk)
-
-                        return chunks
-
-                    chunks = create_overlapping_chunks(
-                        text_content,
-                        chunk_size=3,
-                        overlap=1
-                    )
-
-                    logging.info(f"[INFO] Total chunks created: {len(chunks)}")
-
-                    embeddings = embedding_model.encode(chunks, normalize_embeddings=False)
-
-                    for chunk, embedding in zip(chunks, embeddings):
-                        embeddings_collection.insert_one({
-                            "pdf_id": str(pdf_file_id),
-                            "embedding": embedding.tolist(),  # ✅ removed duplicate line
-                            "content": chunk
-                        })
-
-                    logging.info("[INFO] Embeddings stored successfully.")
-
-                else:
-                    logging.warning("[WARNING] No readable text found. Embeddings not created.")
-
-        except Exception as embed_error:
-            logging.error(f"[ERROR] Embedding generation failed: {embed_error}", exc_info=True)
+        job = ingestion_queue.submit(str(pdf_file_id))
 
         return jsonify({
-            "message": "Syllabus added successfully!",
+            "message": "Syllabus added successfully! Embeddings are being generated.",
             "pdf_file_id": str(pdf_file_id),
             "course_id": course_id,
-            "course_name": course_name
-        }), 201
+            "course_name": course_name,
+            "job_id": job["_id"],
+            "ingestion_status": job["status"]
+        }), 202
 
     except gridfs.errors.GridFSError as gridfs_error:
         print(f"[ERROR] GridFS error: {str(gridfs_error)}")
@@ -134,24 +154,93 @@ def add_syllabus():
         print(f"[ERROR] Unexpected error in add_syllabus: {str(e)}")
         return jsonify({"error": "An unexpected error occurred. Please try again later."}), 500
 
+def get_ingestion_status(job_id):
+    """Report the embedding-generation status for an uploaded syllabus."""
+    try:
+        job = ingestion_queue.status(job_id)
+        if not job:
+            return jsonify({"error": "Ingestion job not found"}), 404
+
+        return jsonify({
+            "job_id": job["_id"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "error": job["error"],
+            "result": job["result"],
+            "updated_at": job["updated_at"].isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve ingestion status: {str(e)}"}), 500
+
+
+def syllabus_listing(**base_filter):
+    """Respond with syllabi matching ``base_filter`` plus the request's filters.
+
+    ``department_id`` and ``course_id`` query parameters filter the list. With
+    ``limit`` (and optionally ``cursor``, the ``next_cursor`` of the previous
+    page) the response is ``{"items", "next_cursor"}`` ordered by ``_id``;
+    without them it is the full array, as before. Responses carry an ETag built
+    from the syllabi change counter, so an unchanged list is answered with 304
+    before MongoDB is queried.
+    """
+    filters = dict(base_filter)
+    for field in ("department_id", "course_id"):
+        if request.args.get(field):
+            filters[field] = request.args[field]
+
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit", type=int)
+    if cursor and not ObjectId.is_valid(cursor):
+        return jsonify({"error": "Invalid cursor."}), 400
+    paginated = limit is not None or cursor is not None
+    if paginated:
+        limit = min(max(limit or Config.SYLLABUS_PAGE_DEFAULT_LIMIT, 1), Config.SYLLABUS_PAGE_MAX_LIMIT)
+
+    etag = hashlib.sha1(
+        f"{syllabi_version.version()}|{sorted(filters.items())}|{cursor}|{limit}".encode("utf-8")
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        query = Syllabus.objects(**filters).only(*LISTING_FIELDS).order_by("id")
+        if cursor:
+            query = query.filter(id__gt=ObjectId(cursor))
+        if paginated:
+            query = query.limit(limit + 1)
+        documents = list(query.as_pymongo())
+
+        next_cursor = None
+        if paginated and len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = str(documents[-1]["_id"])
+
+        syllabus_list = [{
+            "course_id": s.get("course_id"),
+            "course_name": s.get("course_name"),
+            "department_id": s.get("department_id"),
+            "department_name": s.get("department_name"),
+            "professor": s.get("uploaded_by"),
+            "syllabus_description": s.get("syllabus_description"),
+            "syllabus_pdf": s.get("syllabus_pdf")
+        } for s in documents]
+
+        body = {"items": syllabus_list, "next_cursor": next_cursor} if paginated else syllabus_list
+        response = make_response(jsonify(body), 200)
+
+    response.set_etag(etag)
+    # Revalidate every time; the session cookie decides which professor's list this is
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
 def get_professor_syllabi():
     username = session.get('username')
     if not username:
         return jsonify({"error": "User is not logged in"}), 401
 
     try:
-        syllabi = Syllabus.objects(uploaded_by=username)
-        syllabus_list = [{
-            "course_id": s.course_id,
-            "course_name": s.course_name,
-            "department_id": s.department_id,
-            "department_name": s.department_name,
-            "professor": s.uploaded_by,
-            "syllabus_description": s.syllabus_description,
-            "syllabus_pdf": s.syllabus_pdf
-        } for s in syllabi]
-
-        return jsonify(syllabus_list), 200
+        return syllabus_listing(uploaded_by=username)
 
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve syllabi: {str(e)}"}), 500
@@ -159,35 +248,60 @@ def get_professor_syllabi():
 
 def get_syllabi():
     try:
-        syllabi = Syllabus.objects()
-        syllabus_list = [{
-            "course_id": s.course_id,
-            "course_name": s.course_name,
-            "department_id": s.department_id,
-            "department_name": s.department_name,
-            "professor": s.uploaded_by,
-            "syllabus_description": s.syllabus_description,
-            "syllabus_pdf": s.syllabus_pdf
-        } for s in syllabi]
-
-        return jsonify(syllabus_list), 200
+        return syllabus_listing()
 
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve syllabi: {str(e)}"}), 500
 
 
 def get_pdf_file(pdf_id):
+    """Stream a syllabus PDF from GridFS, honouring Range and If-None-Match."""
     try:
         file_data = fs.get(ObjectId(pdf_id))
-        return send_file(
-            io.BytesIO(file_data.read()),
-            mimetype='application/pdf',
-            as_attachment=False,
-            download_name=file_data.filename
-        )
     except Exception as e:
         return jsonify({"error": f"PDF file not found: {str(e)}"}), 404
 
+    etag = gridfs_etag(file_data)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"private, max-age={Config.PDF_CACHE_MAX_AGE}",
+        "Last-Modified": http_date(file_data.upload_date),
+    }
+
+    if request.if_none_match.contains(etag):
+        file_data.close()
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    # A stale If-Range means the client's partial copy is outdated: send the whole file
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range.strip('"') == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), file_data.length)
+        except RangeNotSatisfiable:
+            file_data.close()
+            return Response(status=416, headers={"Content-Range": f"bytes */{file_data.length}"})
+
+    if byte_range is None:
+        start, end, status = 0, file_data.length - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_data.length}"
+
+    response = Response(
+        iter_gridfs(file_data, start, end, chunk_size=Config.PDF_STREAM_CHUNK_BYTES),
+        status=status,
+        mimetype="application/pdf",
+        headers=headers,
+        direct_passthrough=True
+    )
+    response.content_length = end - start + 1
+    response.set_etag(etag)
+    response.headers.set("Content-Disposition", "inline", filename=file_data.filename or f"{pdf_id}.pdf")
+    return response
+
 
 def get_single_syllabus(pdf_id):
     try:
@@ -231,10 +345,24 @@ def update_syllabus(pdf_id):
         new_file = request.files.get('syllabus_pdf')
         if new_file and allowed_file(new_file.filename):
             fs.delete(ObjectId(pdf_id))
+            pdf_text_store.invalidate(pdf_id)
             new_pdf_id = fs.put(new_file, filename=new_file.filename, content_type='application/pdf')
             syllabus.syllabus_pdf = str(new_pdf_id)
+            syllabus.save()
+            syllabi_version.bump()
+
+            # Re-embed in the background, reusing the old file's vectors for unchanged chunks;
+            # the old pdf_id's embeddings are removed once the new ones are written.
+            job = ingestion_queue.submit(str(new_pdf_id), previous_pdf_id=pdf_id)
+            return jsonify({
+                "message": "Syllabus updated successfully",
+                "syllabus_pdf": str(new_pdf_id),
+                "job_id": job["_id"],
+                "ingestion_status": job["status"]
+            }), 202
 
         syllabus.save()
+        syllabi_version.bump()
         return jsonify({"message": "Syllabus updated successfully"}), 200
 
     except Exception as e:
@@ -246,16 +374,7 @@ def extract_pdf_content(pdf_id):
         if not ObjectId.is_valid(pdf_id):
             return jsonify({"error": "Invalid PDF ID."}), 400
 
-        file_data = fs.get(ObjectId(pdf_id))
-        pdf_stream = io.BytesIO(file_data.read())
-
-        document = fitz.open(stream=pdf_stream, filetype="pdf")
-        text_content = ""
-
-        for page in document:
-            text_content += page.get_text()
-
-        document.close()
+        text_content = pdf_text_store.get_text(pdf_id)
 
         if not text_content.strip():
             return jsonify({"error": "No readable text found in the PDF file."}), 400
@@ -277,8 +396,13 @@ def delete_syllabus(pdf_id):
             return jsonify({"error": "Syllabus not found"}), 404
 
         fs.delete(ObjectId(pdf_id))
+        pdf_text_store.invalidate(pdf_id)
         embeddings_collection.delete_many({"pdf_id": pdf_id})  # 🔥 Also delete embeddings
+        vector_store.remove_pdf(pdf_id)
+        lexical_index_store.delete(pdf_id)
+        invalidate_pdf_caches(pdf_id)
         syllabus.delete()
+        syllabi_version.bump()
         return jsonify({"message": "Syllabus deleted successfully"}), 200
 
     except Exception as e:
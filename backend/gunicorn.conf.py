@@ -0,0 +1,82 @@
+"""Gunicorn settings for production serving. Run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+or, with the chat routes awaiting LLM calls on an event loop (see asgi.py):
+
+    WEB_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+The app is imported in the master and its pure in-memory state (embedding
+model weights and, with VECTOR_INDEX_WARMUP, the vector index snapshot) is loaded before any worker is
+forked, so the workers share those pages copy-on-write instead of each
+loading its own copy. MongoDB and HTTP clients and torch thread pools are not
+fork-safe, so everything that opens them runs in each worker after the fork.
+"""
+import gc
+import os
+import sys
+
+# The gunicorn script's directory, not the backend, is first on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Read by config.py, so it must be set before that import
+os.environ["WEB_PRELOAD"] = "true"
+
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS or os.cpu_count() or 1
+worker_class = Config.WEB_WORKER_CLASS
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT_SECONDS
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT_SECONDS
+preload_app = True
+
+
+def on_starting(server):
+    """Load model weights (and any enabled index snapshot) in the master, before workers are forked."""
+    from app import preload
+    preload.run()
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers do not write to (and copy) those pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Per-worker setup. Threads started in the master do not survive the fork,
+    so background threads (ingestion, health checks, embedding batcher) start here
+    or on first use.
+    """
+    from service.embedding_service import embedding_service
+
+    # Split the cores between workers instead of every worker using all of them
+    embedding_service.num_threads = Config.EMBEDDING_NUM_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    if embedding_service.is_loaded:
+        import torch
+        torch.set_num_threads(embedding_service.num_threads)
+
+    # Database indexes, the torch forward pass, the vector index when enabled
+    # (reconciled with or built from MongoDB) and LLM clients, on this worker's
+    # own connections and thread pools
+    from app import warmup
+    warmup.start()
+
+    # Only the first worker of this master resumes jobs left by a previous run
+    if worker.age == 1:
+        from controller.syllabus_controller import ingestion_queue
+        ingestion_queue.resume_pending()
+
+
+def worker_exit(server, worker):
+    """Let queued and running ingestion jobs finish before the worker exits, then
+    write out any pending vector index snapshot.
+
+    Jobs still unfinished when the graceful timeout kills the worker stay
+    pending in the job store and are resumed on the next start.
+    """
+    from controller.syllabus_controller import ingestion_queue
+    ingestion_queue.shutdown(wait=True, timeout=Config.WEB_GRACEFUL_TIMEOUT_SECONDS)
+
+    from controller.chatbot_controller import vector_store
+    if vector_store is not None:
+        vector_store.flush()
@@ -0,0 +1,36 @@
+import sys
+from pymongo import UpdateOne
+from config import db, Config
+from service.vector_codec import EMBEDDING_PROJECTION, LEGACY_FORMAT, decode_embedding, encode_embedding
+
+# Usage: python migrate_embedding_format.py [float32|float16|int8|list]
+storage_format = sys.argv[1] if len(sys.argv) > 1 else Config.EMBEDDING_STORAGE_FORMAT
+batch_size = 500
+
+collection = db["embeddings"]
+pending = []
+migrated = 0
+
+# Legacy list documents have no embedding_format field, so for the list target
+# only documents that carry one (packed binary) still need converting
+if storage_format == LEGACY_FORMAT:
+    query = {"embedding_format": {"$exists": True}}
+else:
+    query = {"embedding_format": {"$ne": storage_format}}
+
+for doc in collection.find(query, EMBEDDING_PROJECTION):
+    fields = encode_embedding(decode_embedding(doc), storage_format)
+    update = {"$set": fields}
+    stale_fields = {name: "" for name in ("embedding_format", "embedding_scale") if name not in fields}
+    if stale_fields:
+        update["$unset"] = stale_fields
+    pending.append(UpdateOne({"_id": doc["_id"]}, update))
+
+    if len(pending) >= batch_size:
+        migrated += collection.bulk_write(pending, ordered=False).modified_count
+        pending = []
+
+if pending:
+    migrated += collection.bulk_write(pending, ordered=False).modified_count
+
+print(f"Migration completed. {migrated} embeddings converted to {storage_format}.")
@@ -9,4 +9,12 @@ class Syllabus(Document):
     syllabus_pdf = StringField(required=True)  # This stores the GridFS file ID
     uploaded_by = StringField(required=True)
 
-    meta = {'collection': 'syllabi'}
\ No newline at end of file
+    meta = {
+        'collection': 'syllabi',
+        'indexes': [
+            'syllabus_pdf',                   # lookups by GridFS file id (get/update/delete)
+            'uploaded_by',                    # a professor's own syllabi
+            ('department_id', 'course_id'),   # listing filters
+            'course_id',                      # multi-syllabus chat by course
+        ]
+    }
\ No newline at end of file
@@ -11,5 +11,6 @@ class User(Document):
     status = StringField(default="pending", choices=["pending", "approved"])  # New field added
 
     meta = {
-        'collection': 'users'  # Explicitly define the collection name (optional)
+        'collection': 'users',  # Explicitly define the collection name (optional)
+        'indexes': ['user_type', 'status']  # username and email get unique indexes from their fields
     }
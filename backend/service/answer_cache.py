@@ -0,0 +1,180 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from service.vector_codec import decode_embedding, encode_embedding
+
+
+class MongoAnswerStore:
+    """Shared answer tier in a MongoDB collection, expired by a TTL index.
+
+    Its indexes are declared in ``service.db_indexes`` and created at warmup.
+    """
+
+    def __init__(self, collection, max_candidates=200):
+        self.collection = collection
+        self.max_candidates = max_candidates
+
+    def candidates(self, pdf_id):
+        now = datetime.now(timezone.utc)
+        cursor = self.collection.find(
+            {"pdf_id": pdf_id, "expires_at": {"$gt": now}},
+            {"_id": 0, "embedding": 1, "embedding_format": 1, "response": 1, "retrieved_chunks": 1, "expires_at": 1}
+        ).sort("created_at", -1).limit(self.max_candidates)
+        return list(cursor)
+
+    def add(self, pdf_id, query_vector, response, retrieved_chunks, ttl_seconds):
+        now = datetime.now(timezone.utc)
+        self.collection.insert_one({
+            "pdf_id": pdf_id,
+            "response": response,
+            "retrieved_chunks": retrieved_chunks,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+            **encode_embedding(query_vector, "float32")
+        })
+
+    def invalidate(self, pdf_id):
+        self.collection.delete_many({"pdf_id": pdf_id})
+
+
+class SemanticAnswerCache:
+    """Caches chat answers per PDF, keyed by the (unit-normalized) query embedding.
+
+    A lookup hits when a cached query for the same PDF has cosine similarity of
+    at least ``threshold``. Entries expire after ``ttl_seconds`` and the least
+    recently used are evicted beyond ``max_entries``. An optional ``shared_store``
+    (MongoAnswerStore) is consulted on local misses so workers share answers.
+    Local entries remember the embeddings ``version`` they were answered at and
+    are dropped when a lookup passes a different one.
+    """
+
+    def __init__(self, threshold=0.95, ttl_seconds=3600, max_entries=5000, shared_store=None):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_store = shared_store
+
+        self._entries = OrderedDict()
+        self._by_pdf = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def lookup(self, pdf_id, query_vector, version=None):
+        """Return ``{"response", "retrieved_chunks"}`` for a similar cached query, or None."""
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        now = time.monotonic()
+
+        with self._lock:
+            entry_ids = [
+                entry_id for entry_id in self._by_pdf.get(pdf_id, ())
+                if self._entries[entry_id]["expires"] > now
+                and (version is None or self._entries[entry_id]["version"] == version)
+            ]
+            for expired_id in set(self._by_pdf.get(pdf_id, ())) - set(entry_ids):
+                self._remove(expired_id)
+
+            if entry_ids:
+                vectors = np.vstack([self._entries[entry_id]["vector"] for entry_id in entry_ids])
+                scores = vectors @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = entry_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id]["answer"]
+
+        answer = self._lookup_shared(pdf_id, query_vector, version)
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+        return answer
+
+    def _lookup_shared(self, pdf_id, query_vector, version):
+        if self.shared_store is None:
+            return None
+        try:
+            candidates = self.shared_store.candidates(pdf_id)
+        except Exception as e:
+            logging.warning(f"[WARNING] Shared answer cache lookup failed: {e}")
+            return None
+        if not candidates:
+            return None
+
+        vectors = np.vstack([decode_embedding(doc) for doc in candidates])
+        scores = vectors @ query_vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        doc = candidates[best]
+        answer = {"response": doc["response"], "retrieved_chunks": doc["retrieved_chunks"]}
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        self._add_local(pdf_id, vectors[best], answer, remaining, version)
+        return answer
+
+    def store(self, pdf_id, query_vector, response, retrieved_chunks, version=None):
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        answer = {"response": response, "retrieved_chunks": retrieved_chunks}
+        self._add_local(pdf_id, query_vector, answer, self.ttl_seconds, version)
+
+        if self.shared_store is not None:
+            try:
+                self.shared_store.add(pdf_id, query_vector, response, retrieved_chunks, self.ttl_seconds)
+            except Exception as e:
+                logging.warning(f"[WARNING] Shared answer cache write failed: {e}")
+
+    def _add_local(self, pdf_id, query_vector, answer, ttl_seconds, version=None):
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "pdf_id": pdf_id,
+                "vector": query_vector,
+                "answer": answer,
+                "expires": time.monotonic() + ttl_seconds,
+                "version": version,
+            }
+            self._by_pdf.setdefault(pdf_id, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        pdf_entries = self._by_pdf[entry["pdf_id"]]
+        pdf_entries.remove(entry_id)
+        if not pdf_entries:
+            del self._by_pdf[entry["pdf_id"]]
+
+    def invalidate(self, pdf_id):
+        with self._lock:
+            for entry_id in list(self._by_pdf.get(pdf_id, ())):
+                self._remove(entry_id)
+        if self.shared_store is not None:
+            try:
+                self.shared_store.invalidate(pdf_id)
+            except Exception as e:
+                logging.warning(f"[WARNING] Shared answer cache invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+
+class ChangeCounter:
+    """Version number for a collection, bumped on every write through the app.
+
+    The counter lives in a small MongoDB document so all workers share it;
+    reads are served from memory and re-read from MongoDB at most every
+    ``refresh_seconds``, so a cached listing can be validated without a query.
+    A write in this process is visible here immediately.
+    """
+
+    def __init__(self, collection, name, refresh_seconds=2.0):
+        self.collection = collection
+        self.name = name
+        self.refresh_seconds = refresh_seconds
+        self._version = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def version(self):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._fetched_at < self.refresh_seconds:
+                return self._version
+        doc = self.collection.find_one({"_id": self.name}, {"version": 1})
+        return self._remember(doc["version"] if doc else 0)
+
+    def bump(self):
+        doc = self.collection.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._remember(doc["version"])
+
+    def _remember(self, version):
+        with self._lock:
+            self._version = version
+            self._fetched_at = time.monotonic()
+        return version
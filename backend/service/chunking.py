@@ -0,0 +1,254 @@
+import hashlib
+import re
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+LINE_BOUNDARY = re.compile(r"\n+")
+STRATEGIES = ("tokens", "layout", "headings")
+
+# Short lines that open a syllabus section: "WEEK 3", "Grading Policy", "2.1 Exams", "Office Hours:"
+HEADING_PREFIX = re.compile(r"^(?:week|module|unit|part|section|chapter|lecture)\s+\d+\b|^\d+(?:\.\d+)*[.)]?\s+[A-Z]", re.I)
+
+
+class Segment:
+    """An unsplittable-by-preference piece of text with its source position."""
+
+    __slots__ = ("text", "page", "start", "end", "tokens", "heading")
+
+    def __init__(self, text, page, start, end, tokens, heading=None):
+        self.text = text
+        self.page = page
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.heading = heading
+
+
+class Chunk:
+    """A chunk's text plus the metadata stored alongside its embedding.
+
+    ``char_start``/``char_end`` are character offsets into the PDF's extracted text
+    (the pages joined as ``PdfTextStore.get_text`` returns them), or None when
+    the chunk's text could not be located there.
+    """
+
+    __slots__ = ("segments", "carried")
+
+    def __init__(self, segments, carried=0):
+        self.segments = segments
+        self.carried = carried
+
+    @property
+    def text(self):
+        return " ".join(segment.text for segment in self.segments)
+
+    @property
+    def tokens(self):
+        return sum(segment.tokens for segment in self.segments)
+
+    def metadata(self):
+        first, last = self.segments[0], self.segments[-1]
+        metadata = {
+            "page": first.page,
+            "end_page": last.page,
+            "char_start": first.start,
+            "char_end": last.end,
+            "tokens": self.tokens,
+        }
+        if first.heading:
+            metadata["heading"] = first.heading
+        return metadata
+
+
+def chunk_hash(text, model_name=""):
+    """Content hash identifying a chunk's embedding: same text and model, same vector."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _spans(text, boundary):
+    """Yield ``(start, end)`` of each non-blank piece of ``text`` between ``boundary`` matches."""
+    position = 0
+    for match in boundary.finditer(text):
+        yield from _stripped(text, position, match.start())
+        position = match.end()
+    yield from _stripped(text, position, len(text))
+
+
+def _stripped(text, start, end):
+    piece = text[start:end]
+    if piece.strip():
+        start += len(piece) - len(piece.lstrip())
+        end -= len(piece) - len(piece.rstrip())
+        yield start, end
+
+
+def is_heading(line):
+    line = line.strip()
+    words = line.split()
+    if not words or len(line) > 80 or len(words) > 10 or line.endswith((".", ",", ";")):
+        return False
+    if HEADING_PREFIX.match(line):
+        return True
+    if line.endswith(":") and len(words) <= 6:
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return True
+    return len(words) <= 6 and all(word[0].isupper() or not word[0].isalpha() for word in words)
+
+
+def _sentence_segments(pages, count_tokens):
+    base = 0
+    for page_number, text in enumerate(pages, start=1):
+        for start, end in _spans(text, SENTENCE_BOUNDARY):
+            sentence = text[start:end]
+            yield Segment(sentence, page_number, base + start, base + end, count_tokens(sentence))
+        base += len(text)
+
+
+def _heading_segments(pages, count_tokens):
+    """Sentences within lines, with each heading line flagged as a section start."""
+    base = 0
+    for page_number, text in enumerate(pages, start=1):
+        for line_start, line_end in _spans(text, LINE_BOUNDARY):
+            line = text[line_start:line_end]
+            if is_heading(line):
+                yield Segment(line, page_number, base + line_start, base + line_end, count_tokens(line), heading=line)
+                continue
+            for start, end in _spans(line, SENTENCE_BOUNDARY):
+                sentence = line[start:end]
+                yield Segment(sentence, page_number, base + line_start + start, base + line_start + end,
+                              count_tokens(sentence))
+        base += len(text)
+
+
+def _locate_words(text, words, cursor):
+    """``(start, end)`` of ``words`` appearing in order in ``text`` from ``cursor``, or None."""
+    start = text.find(words[0], cursor)
+    if start < 0:
+        return None
+    end = start
+    for word in words:
+        found = text.find(word, end)
+        if found < 0:
+            # Extraction differs from the block text; assume the normalised length
+            return start, min(len(text), start + len(" ".join(words)))
+        end = found + len(word)
+    return start, end
+
+
+def _block_segments(pages, page_blocks, count_tokens):
+    """One segment per fitz text block (paragraph, list item, table cell)."""
+    base = 0
+    for page_number, (text, blocks) in enumerate(zip(pages, page_blocks), start=1):
+        cursor = 0
+        for block in blocks:
+            block = " ".join(block.split())
+            if not block:
+                continue
+            # Locate the block in the stored page text for offsets; whitespace may differ
+            span = _locate_words(text, block.split(), cursor)
+            if span is not None:
+                cursor = span[1]
+                start, end = base + span[0], base + span[1]
+            else:
+                start, end = None, None
+            yield Segment(block, page_number, start, end, count_tokens(block))
+        base += len(text)
+
+
+def _split_oversized(segment, count_tokens, truncate_to_tokens, max_tokens):
+    """Split a segment longer than ``max_tokens`` into consecutive pieces that fit."""
+    rest = segment.text
+    offset = 0
+    while rest:
+        piece = truncate_to_tokens(rest, max_tokens) or rest
+        start = None if segment.start is None else segment.start + offset
+        end = None if start is None else start + len(piece)
+        yield Segment(piece, segment.page, start, end, count_tokens(piece), segment.heading)
+        consumed = len(piece)
+        remainder = rest[consumed:]
+        offset += consumed + len(remainder) - len(remainder.lstrip())
+        rest = remainder.lstrip()
+
+
+def _pack(segments, count_tokens, truncate_to_tokens, max_tokens, min_tokens, overlap):
+    """Greedily pack segments into chunks of at most ``max_tokens``.
+
+    Chunks below ``min_tokens`` are merged into the previous chunk when the
+    result still fits, so one chunk is held back before it is yielded. A
+    heading always starts a new chunk and is never merged backwards.
+    """
+    buffer = []
+    carried = 0
+    pending = None
+
+    def emit(chunk):
+        nonlocal pending
+        if pending is not None:
+            fresh = chunk.segments[chunk.carried:]
+            fresh_tokens = sum(segment.tokens for segment in fresh)
+            small = chunk.tokens < min_tokens or pending.tokens < min_tokens
+            starts_section = chunk.segments[0].heading is not None
+            if small and not starts_section and pending.tokens + fresh_tokens <= max_tokens:
+                pending = Chunk(pending.segments + fresh, pending.carried)
+                return None
+        previous, pending = pending, chunk
+        return previous
+
+    for segment in segments:
+        pieces = [segment]
+        if segment.tokens > max_tokens:
+            pieces = _split_oversized(segment, count_tokens, truncate_to_tokens, max_tokens)
+
+        for piece in pieces:
+            used = sum(s.tokens for s in buffer)
+            section_break = piece.heading is not None
+            if buffer and (section_break or used + piece.tokens > max_tokens):
+                ready = emit(Chunk(buffer, carried))
+                if ready is not None:
+                    yield ready
+                # Carry trailing sentences into the next chunk, never across a section
+                tail = [] if section_break or overlap <= 0 else buffer[-overlap:]
+                if sum(s.tokens for s in tail) + piece.tokens > max_tokens or len(tail) == len(buffer):
+                    tail = []
+                buffer, carried = list(tail), len(tail)
+            buffer.append(piece)
+
+    if len(buffer) > carried:
+        ready = emit(Chunk(buffer, carried))
+        if ready is not None:
+            yield ready
+    if pending is not None:
+        yield pending
+
+
+def iter_chunks(pages, count_tokens, truncate_to_tokens, strategy="tokens", max_tokens=200, min_tokens=32,
+                overlap_sentences=1, page_blocks=None):
+    """Yield ``Chunk`` objects for a PDF, one page at a time.
+
+    ``pages`` are the extracted page texts. Strategies:
+
+    * ``"tokens"``: sentences packed up to ``max_tokens``, with
+      ``overlap_sentences`` carried into the next chunk.
+    * ``"layout"``: fitz text blocks (``page_blocks``, one list of block texts
+      per page) packed whole, so table rows and list items are not cut apart.
+    * ``"headings"``: like ``"tokens"`` but a heading line starts a new chunk
+      and is recorded in its metadata.
+
+    Any single sentence or block above ``max_tokens`` is split by tokens;
+    chunks below ``min_tokens`` are merged into their predecessor.
+    """
+    if strategy == "tokens":
+        segments = _sentence_segments(pages, count_tokens)
+    elif strategy == "headings":
+        segments = _heading_segments(pages, count_tokens)
+        overlap_sentences = 0
+    elif strategy == "layout":
+        if page_blocks is None:
+            raise ValueError("The layout chunking strategy needs page_blocks.")
+        segments = _block_segments(pages, page_blocks, count_tokens)
+        overlap_sentences = 0
+    else:
+        raise ValueError(f"Unknown chunking strategy '{strategy}'. Expected one of {STRATEGIES}.")
+
+    yield from _pack(segments, count_tokens, truncate_to_tokens, max_tokens, min_tokens, overlap_sentences)
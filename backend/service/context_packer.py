@@ -0,0 +1,86 @@
+import re
+
+import numpy as np
+
+# Same boundary the ingestion chunker uses, plus line breaks for lists and tables
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def adaptive_k(scores, min_k=2, max_k=8, min_score=0.1, score_margin=0.15):
+    """Number of candidates worth sending, read from the shape of ``scores``.
+
+    ``scores`` are cosine similarities in rank order. Candidates within
+    ``score_margin`` of the best score (and above ``min_score``) are counted,
+    so a sharply peaked distribution yields a small k and a flat one a larger
+    k, clamped to ``[min_k, max_k]``.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return 0
+    cutoff = max(min_score, float(scores.max()) - score_margin)
+    k = int(np.count_nonzero(scores[:max_k] >= cutoff))
+    return min(max(k, min_k), max_k, scores.size)
+
+
+class ContextPacker:
+    """Select retrieved chunks for a prompt within a token budget.
+
+    ``pack`` takes candidates as ``(position, text, score)`` in rank order, where
+    ``position`` is the chunk's place in the document. It keeps the top
+    ``adaptive_k`` of them, drops sentences already contributed by a
+    higher-scoring chunk (the overlap between neighbouring sentence windows),
+    then fills ``token_budget`` in score order, skipping chunks that do not
+    fit. Chunks are returned in document order together with per-request stats.
+    """
+
+    def __init__(self, count_tokens, token_budget=1500, min_k=2, max_k=8, min_score=0.1, score_margin=0.15):
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.min_k = min_k
+        self.max_k = max_k
+        self.min_score = min_score
+        self.score_margin = score_margin
+
+    def pack(self, candidates, token_budget=None):
+        budget = self.token_budget if token_budget is None else token_budget
+        k = adaptive_k([score for _, _, score in candidates], self.min_k, self.max_k,
+                       self.min_score, self.score_margin)
+
+        seen = set()
+        selected = []
+        tokens_used = 0
+        dropped_duplicate = 0
+        dropped_budget = 0
+
+        for position, text, score in candidates[:k]:
+            sentences = [sentence for sentence in split_sentences(text) if sentence not in seen]
+            if not sentences:
+                dropped_duplicate += 1
+                continue
+
+            content = " ".join(sentences)
+            tokens = self.count_tokens(content)
+            if tokens_used + tokens > budget:
+                dropped_budget += 1
+                continue
+
+            seen.update(sentences)
+            tokens_used += tokens
+            selected.append((position, content, score))
+
+        selected.sort(key=lambda item: item[0])
+        stats = {
+            "candidates": len(candidates),
+            "k": k,
+            "selected": len(selected),
+            "dropped_low_score": len(candidates) - k,
+            "dropped_duplicate": dropped_duplicate,
+            "dropped_budget": dropped_budget,
+            "tokens_used": tokens_used,
+            "token_budget": budget,
+        }
+        return [content for _, content, _ in selected], stats
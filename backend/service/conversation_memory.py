@@ -0,0 +1,185 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+def _empty_state():
+    return {"summary": "", "summary_tokens": 0, "turns": [], "exchanges": 0}
+
+
+# Words that point back at earlier turns; "this" is left out because
+# "this course" refers to the syllabus itself
+_REFERENCE_WORDS = re.compile(
+    r"\b(it|its|they|them|their|that|those|these|he|she|him|her|his|same|above|previous|earlier|else|again)\b",
+    re.IGNORECASE
+)
+_CONTINUATIONS = re.compile(r"^\s*(and|also|but|so|then|what about|how about|why)\b", re.IGNORECASE)
+
+
+def is_follow_up(message, min_words=4):
+    """Whether ``message`` likely depends on earlier turns to be understood.
+
+    Short messages, ones opening like a continuation ("and the final?", "what
+    about labs") and ones with back-references ("when is it due?") count as
+    follow-ups; everything else is treated as self-contained.
+    """
+    return (
+        len(message.split()) < min_words
+        or bool(_CONTINUATIONS.search(message))
+        or bool(_REFERENCE_WORDS.search(message))
+    )
+
+
+class InMemoryConversationStore:
+    """Process-local conversation states keyed by ``(session_id, pdf_id)``.
+
+    Sessions idle for ``idle_seconds`` are evicted, as are the least recently
+    used ones beyond ``max_sessions``.
+    """
+
+    def __init__(self, idle_seconds=1800, max_sessions=10000):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id, pdf_id):
+        key = (session_id, pdf_id)
+        with self._lock:
+            self._evict_idle()
+            entry = self._states.get(key)
+            if entry is None:
+                return _empty_state()
+            self._states.move_to_end(key)
+            return entry["state"]
+
+    def save(self, session_id, pdf_id, state):
+        key = (session_id, pdf_id)
+        with self._lock:
+            self._states[key] = {"state": state, "last_access": time.monotonic()}
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def clear(self, session_id, pdf_id):
+        with self._lock:
+            self._states.pop((session_id, pdf_id), None)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._states:
+            key, entry = next(iter(self._states.items()))
+            if entry["last_access"] >= cutoff:
+                break
+            self._states.popitem(last=False)
+
+
+class MongoConversationStore:
+    """Conversation states in a MongoDB collection, expired by a TTL index when idle.
+
+    The TTL index is declared in ``service.db_indexes`` and created at warmup.
+    """
+
+    def __init__(self, collection, idle_seconds=1800):
+        self.collection = collection
+        self.idle_seconds = idle_seconds
+
+    def load(self, session_id, pdf_id):
+        doc = self.collection.find_one(
+            {"_id": f"{session_id}:{pdf_id}"},
+            {"_id": 0, "summary": 1, "summary_tokens": 1, "turns": 1, "exchanges": 1}
+        )
+        return doc or _empty_state()
+
+    def save(self, session_id, pdf_id, state):
+        self.collection.replace_one(
+            {"_id": f"{session_id}:{pdf_id}"},
+            {**state, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.idle_seconds)},
+            upsert=True
+        )
+
+    def clear(self, session_id, pdf_id):
+        self.collection.delete_one({"_id": f"{session_id}:{pdf_id}"})
+
+
+class ConversationMemory:
+    """Per-session, per-PDF chat history kept within a token budget.
+
+    ``history`` returns the chat messages to place between the system prompt and
+    the new user message. When a new turn pushes the history over
+    ``token_budget`` the oldest turns are dropped; if a ``summarizer`` is given
+    they are first folded into a rolling summary, itself capped at a quarter of
+    the budget. ``summarizer(previous_summary, dropped_turns)`` returns a string.
+
+    ``turn`` is the number of exchanges the client shows before its new
+    message. When the client has edited an earlier message and discarded the
+    turns after it, the stored history is rewound to match.
+    """
+
+    def __init__(self, store, count_tokens, token_budget=1500, summarizer=None):
+        self.store = store
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+
+    def history(self, session_id, pdf_id, turn=None):
+        if not session_id:
+            return []
+        state = self.store.load(session_id, pdf_id)
+        if turn is not None and turn < self._exchanges(state):
+            state = self._rewind(state, turn)
+            self.store.save(session_id, pdf_id, state)
+        messages = []
+        if state["summary"]:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in state["turns"])
+        return messages
+
+    def add_turn(self, session_id, pdf_id, user_message, assistant_message):
+        if not session_id:
+            return
+        state = self.store.load(session_id, pdf_id)
+        state["exchanges"] = self._exchanges(state) + 1
+        for role, content in (("user", user_message), ("assistant", assistant_message)):
+            state["turns"].append({"role": role, "content": content, "tokens": self.count_tokens(content)})
+
+        dropped = []
+        while state["turns"] and self._tokens(state) > self.token_budget:
+            # Drop whole user/assistant exchanges so the history never starts mid-turn
+            dropped.extend(state["turns"][:2])
+            state["turns"] = state["turns"][2:]
+
+        if dropped and self.summarizer is not None:
+            try:
+                summary = self.summarizer(state["summary"], dropped)
+                summary_tokens = self.count_tokens(summary)
+                if summary_tokens <= self.token_budget // 4:
+                    state["summary"] = summary
+                    state["summary_tokens"] = summary_tokens
+            except Exception as e:
+                logging.warning(f"[WARNING] Conversation summarization failed: {e}")
+
+        self.store.save(session_id, pdf_id, state)
+
+    def clear(self, session_id, pdf_id):
+        if session_id:
+            self.store.clear(session_id, pdf_id)
+
+    @staticmethod
+    def _exchanges(state):
+        # States saved before exchanges were counted only know their kept turns
+        return state.get("exchanges", len(state["turns"]) // 2)
+
+    def _rewind(self, state, turn):
+        discard = self._exchanges(state) - turn
+        kept = len(state["turns"]) // 2 - discard
+        if kept <= 0:
+            # The discarded turns reach into the summary, so nothing earlier can be trusted
+            return _empty_state()
+        return {**state, "turns": state["turns"][:kept * 2], "exchanges": turn}
+
+    def _tokens(self, state):
+        return state["summary_tokens"] + sum(turn["tokens"] for turn in state["turns"])
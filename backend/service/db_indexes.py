@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING
+
+from model.syllabus import Syllabus
+from model.user import User
+from service.ingestion import ACTIVE_STATUSES
+
+# Indexes on collections accessed through PyMongo rather than a mongoengine model.
+# An entry is a key list, or ``(keys, options)`` for create_index options.
+COLLECTION_INDEXES = {
+    "embeddings": [
+        # load_embeddings / delete by PDF, in chunk order
+        [("pdf_id", ASCENDING), ("chunk_index", ASCENDING)],
+        # chunk reuse on syllabus updates
+        [("pdf_id", ASCENDING), ("chunk_hash", ASCENDING)],
+    ],
+    "ingestion_jobs": [
+        [("status", ASCENDING)],
+    ],
+    "answer_cache": [
+        # TTL: shared answers are removed once expires_at has passed
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+        # newest candidates for a PDF
+        [("pdf_id", ASCENDING), ("created_at", DESCENDING)],
+    ],
+    "conversations": [
+        # TTL: idle conversations are removed once expires_at has passed
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+# Queries on request paths, checked by check_query_plans.py. The values only
+# need the right types; explain() plans them without matching documents.
+HOT_QUERIES = [
+    ("embeddings for a PDF", "embeddings", {"pdf_id": "0" * 24}, [("chunk_index", ASCENDING)]),
+    ("reusable chunks by hash", "embeddings", {"pdf_id": "0" * 24, "chunk_hash": "0" * 64}, None),
+    ("syllabus by PDF id", "syllabi", {"syllabus_pdf": "0" * 24}, None),
+    ("syllabi by professor", "syllabi", {"uploaded_by": "professor"}, None),
+    ("syllabi by department and course", "syllabi", {"department_id": "CS", "course_id": "CS101"}, None),
+    ("syllabi by course", "syllabi", {"course_id": {"$in": ["CS101", "CS102"]}}, None),
+    ("user by email", "users", {"email": "user@example.com"}, None),
+    ("user by username", "users", {"username": "user"}, None),
+    ("users by type", "users", {"user_type": "student"}, None),
+    ("pending registrations", "users", {"status": "pending"}, None),
+    ("active ingestion jobs", "ingestion_jobs", {"status": {"$in": list(ACTIVE_STATUSES)}}, None),
+    ("shared answer candidates", "answer_cache",
+     {"pdf_id": "0" * 24, "expires_at": {"$gt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("created_at", DESCENDING)]),
+]
+
+
+def ensure_indexes(db):
+    """Create every declared index; existing indexes are left as they are."""
+    Syllabus.ensure_indexes()
+    User.ensure_indexes()
+    for collection_name, indexes in COLLECTION_INDEXES.items():
+        for index in indexes:
+            keys, options = index if isinstance(index, tuple) else (index, {})
+            db[collection_name].create_index(keys, **options)
+    logging.info("[INFO] MongoDB indexes ensured.")
+
+
+def plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def collection_scans(db):
+    """Return ``[(name, winning_plan)]`` for hot queries that plan as a COLLSCAN."""
+    scans = []
+    for name, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        # Newer servers wrap the classic plan in a query-shape envelope
+        plan = plan.get("queryPlan", plan)
+        if "COLLSCAN" in plan_stages(plan):
+            scans.append((name, plan))
+    return scans
@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from service.scoring import normalize_rows
+
+
+class CachedEmbeddings:
+    """Pre-normalized float32 embedding matrix and chunk texts for one PDF."""
+
+    def __init__(self, matrix, texts, version=None):
+        self.matrix = matrix
+        self.texts = texts
+        self.version = version
+        self.nbytes = matrix.nbytes + sum(len(text.encode("utf-8")) for text in texts)
+
+
+class EmbeddingMatrixCache:
+    """LRU cache of per-PDF embedding matrices bounded by a memory budget.
+
+    Entries may carry the ``version`` of the stored embeddings they were loaded
+    at (a shared counter bumped on every chunk write). Asking for a different
+    version treats the entry as stale, so a write in another worker, or one
+    still in progress when the entry was loaded, is picked up on the next read.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, pdf_id, version=None):
+        with self._lock:
+            entry = self._entries.get(pdf_id)
+            if entry is None:
+                return None
+            if version is not None and entry.version != version:
+                del self._entries[pdf_id]
+                self._size -= entry.nbytes
+                return None
+            self._entries.move_to_end(pdf_id)
+            return entry
+
+    def put(self, pdf_id, embeddings, texts, version=None):
+        entry = CachedEmbeddings(normalize_rows(embeddings), list(texts), version)
+        if entry.nbytes > self.max_bytes:
+            logging.warning(f"[WARNING] Embeddings for PDF ID {pdf_id} exceed the cache budget; not cached.")
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(pdf_id, None)
+            if previous is not None:
+                self._size -= previous.nbytes
+            self._entries[pdf_id] = entry
+            self._size += entry.nbytes
+            while self._size > self.max_bytes:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+                logging.debug(f"[DEBUG] Evicted embeddings for PDF ID {evicted_id} from cache.")
+        return entry
+
+    def get_or_load(self, pdf_id, loader, version=None):
+        """Return the cached entry, calling ``loader(pdf_id)`` on a miss or a stale entry.
+
+        ``loader`` returns ``(embeddings, texts)``; an empty result is not cached.
+        ``version`` must be read before ``loader`` runs, so that data loaded
+        during a concurrent write is tagged with the older version.
+        """
+        entry = self.get(pdf_id, version)
+        if entry is not None:
+            return entry
+
+        embeddings, texts = loader(pdf_id)
+        if len(texts) == 0:
+            return None
+        return self.put(pdf_id, embeddings, texts, version)
+
+    def invalidate(self, pdf_id):
+        with self._lock:
+            entry = self._entries.pop(pdf_id, None)
+            if entry is not None:
+                self._size -= entry.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,134 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from config import Config
+
+
+class EmbeddingService:
+    """Process-wide owner of the SentenceTransformer model.
+
+    The model is loaded on first use. Small ``encode`` calls from concurrent
+    requests are micro-batched: the batcher thread waits up to ``max_wait_ms``
+    for more work and runs one forward pass for everything it collected. Calls
+    with ``max_batch_size`` or more texts (ingestion) go straight to the model.
+    ``encode`` mirrors ``SentenceTransformer.encode`` for the arguments we use.
+    """
+
+    def __init__(self, model_name, max_batch_size=64, max_wait_ms=5, num_threads=0):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.num_threads = num_threads
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    def _load_model(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        start = time.perf_counter()
+        model = SentenceTransformer(self.model_name, device="cpu")
+        model.eval()
+        logging.info(f"[INFO] Loaded embedding model {self.model_name} in {time.perf_counter() - start:.2f}s.")
+        return model
+
+    def warm(self):
+        """Load the model and run one forward pass, without starting the batcher thread."""
+        self.model.encode(["warmup"], normalize_embeddings=True)
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        if kwargs or len(texts) >= self.max_batch_size:
+            embeddings = self.model.encode(texts, normalize_embeddings=normalize_embeddings, **kwargs)
+        else:
+            future = Future()
+            self._ensure_batcher()
+            self._requests.put((texts, normalize_embeddings, future))
+            embeddings = future.result()
+
+        return embeddings[0] if single else embeddings
+
+    def _ensure_batcher(self):
+        if self._batcher is not None and self._batcher.is_alive():
+            return
+        with self._batcher_lock:
+            if self._batcher is None or not self._batcher.is_alive():
+                self._batcher = threading.Thread(target=self._run_batches, name="embedding-batcher", daemon=True)
+                self._batcher.start()
+
+    def _run_batches(self):
+        while True:
+            pending = [self._requests.get()]
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(request)
+                count += len(request[0])
+
+            for normalize in (False, True):
+                group = [request for request in pending if request[1] == normalize]
+                if group:
+                    self._encode_group(group, normalize)
+
+    def _encode_group(self, group, normalize):
+        texts = [text for request_texts, _, _ in group for text in request_texts]
+        try:
+            embeddings = self.model.encode(texts, normalize_embeddings=normalize, batch_size=len(texts))
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for request_texts, _, future in group:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+
+embedding_service = EmbeddingService(
+    Config.EMBEDDING_MODEL_NAME,
+    max_batch_size=Config.EMBEDDING_MAX_BATCH_SIZE,
+    max_wait_ms=Config.EMBEDDING_MAX_WAIT_MS,
+    num_threads=Config.EMBEDDING_NUM_THREADS
+)
@@ -0,0 +1,67 @@
+import re
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+def gridfs_etag(grid_out):
+    """Strong validator for a GridFS file: its md5 when stored, else id, length and upload time.
+
+    GridFS files are never modified in place, so either form changes only when
+    the file is replaced.
+    """
+    md5 = getattr(grid_out, "md5", None)
+    if md5:
+        return md5
+    return f"{grid_out._id}-{grid_out.length}-{int(grid_out.upload_date.timestamp())}"
+
+
+def parse_range(header, length):
+    """Return the inclusive ``(start, end)`` byte range asked for by ``header``.
+
+    Returns None for a missing, malformed, multi-range or backwards
+    (``bytes=5-3``) header, which is served as the whole file, and raises
+    ``RangeNotSatisfiable`` when the range starts past the end of the file.
+    """
+    if not header or length == 0:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable(header)
+        return max(length - suffix, 0), length - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        # An invalid byte-range-spec makes the whole header invalid (RFC 7233 §2.1)
+        return None
+    if start >= length:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last), length - 1) if last else length - 1
+
+
+def iter_gridfs(grid_out, start=0, end=None, chunk_size=256 * 1024):
+    """Yield bytes ``start..end`` (inclusive) of a GridFS file, ``chunk_size`` at a time."""
+    end = grid_out.length - 1 if end is None else end
+    remaining = end - start + 1
+    grid_out.seek(start)
+    try:
+        while remaining > 0:
+            data = grid_out.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        grid_out.close()
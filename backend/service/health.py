@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+
+
+class HealthMonitor:
+    """Dependency checks run on a background thread, served from memory.
+
+    ``checks`` maps a name to a zero-argument callable that raises (or returns
+    False) when the dependency is unusable. Probes read the last results and
+    never wait on a dependency. The refresh thread starts on the first
+    ``status()`` call, so it also starts in each forked server worker; until
+    its first pass completes every check reports ``pending``.
+    """
+
+    def __init__(self, checks, interval_seconds=15.0):
+        self.checks = checks
+        self.interval_seconds = interval_seconds
+        self._results = {name: {"status": "pending"} for name in checks}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.interval_seconds)
+
+    def refresh(self):
+        for name, check in self.checks.items():
+            start = time.perf_counter()
+            try:
+                healthy = check() is not False
+                error = None if healthy else "check returned False"
+            except Exception as e:
+                healthy, error = False, str(e)
+            result = {
+                "status": "ok" if healthy else "failing",
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                "checked_at": time.time(),
+            }
+            if error:
+                result["error"] = error
+            with self._lock:
+                previous = self._results[name]["status"]
+                self._results[name] = result
+            # Log transitions only, not every failing refresh
+            if error and previous != "failing":
+                logging.warning(f"[WARNING] Health check {name} failed: {error}")
+            elif not error and previous == "failing":
+                logging.info(f"[INFO] Health check {name} recovered.")
+
+    def status(self):
+        """Return ``(all_ok, {name: result})`` from the last refresh."""
+        self.start()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        return all(result["status"] == "ok" for result in results.values()), results
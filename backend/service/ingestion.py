@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
+
+PENDING = "pending"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+ACTIVE_STATUSES = (PENDING, RUNNING, RETRYING)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class InMemoryJobStore:
+    """Process-local job store; a stand-in for MongoJobStore in development and tests."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, params):
+        """Create a pending job, or return the existing one for ``job_id``.
+
+        Returns ``(job, created)``. A failed job is reset to pending so it can be
+        resubmitted; active and completed jobs are returned unchanged.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] != FAILED:
+                return dict(job), False
+            job = _new_job(job_id, params)
+            self._jobs[job_id] = job
+            return dict(job), True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=_now())
+            return dict(job)
+
+    def active_jobs(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES]
+
+
+class MongoJobStore:
+    """Job store backed by a MongoDB collection, shared across worker processes."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def create(self, job_id, params):
+        existing = self.collection.find_one({"_id": job_id})
+        if existing is not None and existing["status"] != FAILED:
+            return existing, False
+
+        job = _new_job(job_id, params)
+        if existing is None:
+            try:
+                self.collection.insert_one(job)
+                return job, True
+            except DuplicateKeyError:
+                # Another worker created the job between our read and insert.
+                return self.collection.find_one({"_id": job_id}), False
+
+        result = self.collection.replace_one({"_id": job_id, "status": FAILED}, job)
+        if result.modified_count:
+            return job, True
+        return self.collection.find_one({"_id": job_id}), False
+
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = _now()
+        self.collection.update_one({"_id": job_id}, {"$set": fields})
+        return self.get(job_id)
+
+    def active_jobs(self):
+        return list(self.collection.find({"status": {"$in": list(ACTIVE_STATUSES)}}))
+
+
+def _new_job(job_id, params):
+    now = _now()
+    return {
+        "_id": job_id,
+        "status": PENDING,
+        "params": params,
+        "attempts": 0,
+        "error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class IngestionQueue:
+    """In-process work queue with a small worker pool for syllabus ingestion.
+
+    Jobs are keyed by ``job_id`` (the GridFS pdf_id), so submitting the same PDF
+    twice while it is queued, running or done is a no-op. ``handler(job_id,
+    **params)`` must be idempotent: a failed attempt is retried with exponential
+    backoff up to ``max_attempts`` times. Worker threads start on first use.
+    """
+
+    def __init__(self, handler, store, workers=2, max_attempts=3, retry_backoff=2.0):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._timers = set()
+        self._started = False
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._stopping = False
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ingestion-worker-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id, **params):
+        """Queue ``job_id`` for ingestion and return its job record."""
+        self.start()
+        job, created = self.store.create(job_id, params)
+        if created:
+            self._queue.put(job_id)
+        return job
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+    def resume_pending(self):
+        """Re-queue jobs left pending or running by a previous process."""
+        self.start()
+        for job in self.store.active_jobs():
+            self._queue.put(job["_id"])
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting retries and, if ``wait``, drain queued jobs before returning."""
+        with self._lock:
+            if not self._started:
+                return
+            self._stopping = True
+            for timer in list(self._timers):
+                timer.cancel()
+            self._timers.clear()
+            for _ in self._threads:
+                self._queue.put(None)
+            threads, self._threads = self._threads, []
+            self._started = False
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in (DONE, FAILED):
+            return
+
+        attempts = job["attempts"] + 1
+        self.store.update(job_id, status=RUNNING, attempts=attempts)
+        try:
+            result = self.handler(job_id, **(job.get("params") or {}))
+            self.store.update(job_id, status=DONE, result=result, error=None)
+            logging.info(f"[INFO] Ingestion job {job_id} completed.")
+        except Exception as e:
+            logging.error(f"[ERROR] Ingestion job {job_id} failed (attempt {attempts}): {e}", exc_info=True)
+            if attempts >= self.max_attempts:
+                self.store.update(job_id, status=FAILED, error=str(e))
+                return
+            self.store.update(job_id, status=RETRYING, error=str(e))
+            self._schedule_retry(job_id, self.retry_backoff * (2 ** (attempts - 1)))
+
+    def _schedule_retry(self, job_id, delay):
+        def requeue():
+            self._timers.discard(timer)
+            self._queue.put(job_id)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._lock:
+            if self._stopping:
+                return
+            self._timers.add(timer)
+        timer.start()
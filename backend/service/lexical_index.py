@@ -0,0 +1,155 @@
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+# Keep course codes, times, dates and room numbers ("cs-4550", "10:30", "09/12", "b.204")
+# whole, and also index their alphanumeric parts so "cs 4550" still matches.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./:][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over one PDF's chunks, held as per-term postings arrays.
+
+    Document ids are chunk positions, matching the ``chunk_index`` order of the
+    PDF's embeddings. A query touches only the postings of its own terms.
+    """
+
+    def __init__(self, postings, doc_lengths, k1=1.5, b=0.75):
+        self.postings = postings
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+
+        n = len(self.doc_lengths)
+        avg_length = float(self.doc_lengths.mean()) if n else 0.0
+        # Length normalisation per document, precomputed once
+        self._norms = k1 * (1 - b + b * self.doc_lengths / avg_length) if avg_length else np.full(n, k1, np.float32)
+        self._idf = {
+            term: float(np.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5)))
+            for term, (ids, _) in postings.items()
+        }
+
+    @classmethod
+    def build(cls, texts, **options):
+        postings = {}
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                tfs.append(tf)
+        postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        return cls(postings, doc_lengths, **options)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def scores(self, query):
+        """BM25 score of every chunk for ``query`` (zeros where no term matches)."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, tfs = entry
+            scores[ids] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._norms[ids])
+        return scores
+
+    def search(self, query, k):
+        """Return ``(indices, scores)`` of the top ``k`` matching chunks, best first."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if matched.size > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return order, scores[order]
+
+    def to_document(self):
+        # Terms may contain "." so postings are stored as a list rather than a sub-document
+        return {
+            "doc_lengths": self.doc_lengths.astype(int).tolist(),
+            "postings": [[term, ids.tolist(), tfs.astype(int).tolist()] for term, (ids, tfs) in self.postings.items()],
+        }
+
+    @classmethod
+    def from_document(cls, doc, **options):
+        postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, ids, tfs in doc["postings"]
+        }
+        return cls(postings, doc["doc_lengths"], **options)
+
+
+class LexicalIndexStore:
+    """Per-PDF BM25 indexes persisted in the ``lexical_index`` collection and
+    kept in a small in-process LRU.
+    """
+
+    def __init__(self, collection, max_entries=256):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, pdf_id, index):
+        with self._lock:
+            self._entries[pdf_id] = index
+            self._entries.move_to_end(pdf_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def build(self, pdf_id, texts):
+        """Index ``texts`` (in chunk order) for ``pdf_id`` and persist it."""
+        index = BM25Index.build(texts)
+        self.collection.replace_one({"_id": pdf_id}, {"_id": pdf_id, **index.to_document()}, upsert=True)
+        self._remember(pdf_id, index)
+        return index
+
+    def get(self, pdf_id):
+        with self._lock:
+            index = self._entries.get(pdf_id)
+            if index is not None:
+                self._entries.move_to_end(pdf_id)
+                return index
+
+        doc = self.collection.find_one({"_id": pdf_id})
+        if doc is None:
+            return None
+        index = BM25Index.from_document(doc)
+        self._remember(pdf_id, index)
+        return index
+
+    def get_or_build(self, pdf_id, texts):
+        """Return the index for ``pdf_id``, (re)building it from ``texts`` when it
+        is missing or was built from a different number of chunks.
+        """
+        index = self.get(pdf_id)
+        if index is None or len(index) != len(texts):
+            index = self.build(pdf_id, texts)
+        return index
+
+    def invalidate(self, pdf_id):
+        with self._lock:
+            self._entries.pop(pdf_id, None)
+
+    def delete(self, pdf_id):
+        self.invalidate(pdf_id)
+        self.collection.delete_one({"_id": pdf_id})
@@ -0,0 +1,441 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+import numpy as np
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no provider could produce a completion."""
+
+
+class CircuitBreaker:
+    """Per provider/model breaker: opens after ``failure_threshold`` consecutive
+    failures and lets a single trial call through after ``reset_timeout`` seconds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial slot taken by ``allow()`` for a call that
+        ended without an outcome (deadline already passed, or cancelled).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold or self._opened_at is not None:
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies, in seconds."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile, min_samples=20):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            return float(np.percentile(self._samples, percentile))
+
+
+class Provider:
+    """One model on one API key, with its own pooled clients, breaker and latency window."""
+
+    def __init__(self, name, api_key, model, temperature=1.0, max_tokens=512, base_url=None,
+                 timeout=20.0, max_connections=20, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.api_key)
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from groq import Groq
+                    self._client = Groq(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                        http_client=httpx.Client(limits=self._limits(), timeout=self.timeout)
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        # Built per event loop owner; the ASGI server runs a single loop per worker.
+        if self._async_client is None:
+            from groq import AsyncGroq
+            self._async_client = AsyncGroq(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            )
+        return self._async_client
+
+    def _request(self, messages, timeout, stream=False):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "timeout": timeout,
+            "stream": stream,
+        }
+
+    def complete(self, messages, timeout):
+        response = self.client.chat.completions.create(**self._request(messages, timeout))
+        return response.choices[0].message.content.strip()
+
+    async def acomplete(self, messages, timeout):
+        response = await self.async_client.chat.completions.create(**self._request(messages, timeout))
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages, timeout):
+        for chunk in self.client.chat.completions.create(**self._request(messages, timeout, stream=True)):
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                yield token
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class LLMGateway:
+    """Chat completions across an ordered list of providers.
+
+    Each call has an overall ``deadline`` in seconds shared by every attempt.
+    Providers without an API key or whose circuit breaker is open are
+    skipped. With ``hedge_percentile`` set, a call that runs past that latency
+    percentile of the primary fires the next provider in parallel and returns
+    whichever answers first.
+
+    ``observer(event, provider_name, seconds)``, if given, is called for each
+    attempt (``"ok"`` or ``"error"``), when a call moves on to the next
+    provider after an error (``"failover"``) and when a hedge fires (``"hedge"``).
+
+    Hedged sync calls run on a pool of ``max_workers`` threads, which should
+    cover two calls per concurrent request. When the pool has no room for a
+    call and its hedge, the call runs unhedged on the caller's thread: a call
+    waiting in the pool queue would look slow and fire hedges that only add
+    load.
+    """
+
+    def __init__(self, providers, deadline=30.0, hedge_percentile=None, hedge_min_samples=20, observer=None,
+                 max_workers=16):
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.observer = observer
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._pool_in_use = 0
+        self._pool_lock = threading.Lock()
+
+    def _observe(self, event, provider, seconds=0.0):
+        if self.observer is None:
+            return
+        try:
+            self.observer(event, provider.name, seconds)
+        except Exception as e:
+            logging.warning(f"[WARNING] LLM gateway observer failed: {e}")
+
+    def _candidates(self, allow_failover):
+        providers = self.providers if allow_failover else self.providers[:1]
+        return [provider for provider in providers if provider.configured]
+
+    @staticmethod
+    def _next(candidates):
+        """Pop the next provider whose breaker lets a call through, or None.
+
+        Breakers are asked only when a provider is about to be called, so a
+        half-open trial slot is never claimed by a provider that is not used.
+        """
+        while candidates:
+            provider = candidates.pop(0)
+            if provider.breaker.allow():
+                return provider
+        return None
+
+    def _reserve_pool(self, slots):
+        with self._pool_lock:
+            if self._pool_in_use + slots > self.max_workers:
+                return False
+            self._pool_in_use += slots
+            return True
+
+    def _release_pool(self, slots=1):
+        with self._pool_lock:
+            self._pool_in_use -= slots
+
+    def _submit(self, provider, messages, deadline_at):
+        """Run ``_call`` on a pool slot reserved by ``_reserve_pool``; the slot frees when it finishes."""
+        future = self._executor.submit(self._call, provider, messages, deadline_at)
+        future.add_done_callback(lambda _: self._release_pool())
+        return future
+
+    def _hedge_delay(self, provider):
+        if not self.hedge_percentile:
+            return None
+        return provider.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def _call(self, provider, messages, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            provider.breaker.release()
+            raise TimeoutError("LLM deadline exceeded")
+        start = time.monotonic()
+        try:
+            text = provider.complete(messages, timeout=min(provider.timeout, remaining))
+        except Exception:
+            provider.breaker.record_failure()
+            self._observe("error", provider, time.monotonic() - start)
+            raise
+        except BaseException:
+            provider.breaker.release()
+            raise
+        elapsed = time.monotonic() - start
+        provider.breaker.record_success()
+        provider.latency.record(elapsed)
+        self._observe("ok", provider, elapsed)
+        return text
+
+    def complete(self, messages, allow_failover=True):
+        """Return ``(text, provider_name)`` for ``messages``."""
+        deadline_at = time.monotonic() + self.deadline
+        candidates = self._candidates(allow_failover)
+        errors = []
+
+        while True:
+            provider = self._next(candidates)
+            if provider is None:
+                break
+            hedge_delay = self._hedge_delay(provider) if candidates else None
+            if hedge_delay is not None and not self._reserve_pool(2):
+                hedge_delay = None
+
+            if hedge_delay is None:
+                try:
+                    return self._call(provider, messages, deadline_at), provider.name
+                except Exception as e:
+                    logging.warning(f"[WARNING] LLM provider {provider.name} failed: {e}")
+                    errors.append(e)
+                    if candidates:
+                        self._observe("failover", provider)
+                    continue
+
+            # Hedged attempt: start the backup if the primary is slower than usual.
+            futures = {self._submit(provider, messages, deadline_at): provider}
+            done, _ = wait(futures, timeout=hedge_delay)
+            backup = None if done else self._next(candidates)
+            if backup is not None:
+                logging.info(f"[INFO] Hedging LLM call to {backup.name} after {hedge_delay:.2f}s.")
+                self._observe("hedge", backup, hedge_delay)
+                futures[self._submit(backup, messages, deadline_at)] = backup
+            else:
+                self._release_pool()
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        return future.result(), futures[future].name
+                    logging.warning(f"[WARNING] LLM provider {futures[future].name} failed: {future.exception()}")
+                    errors.append(future.exception())
+                    if pending or candidates:
+                        self._observe("failover", futures[future])
+
+        raise LLMUnavailableError(f"All LLM providers failed: {errors or 'no provider available'}")
+
+    async def acomplete(self, messages, allow_failover=True):
+        """Async variant of ``complete`` for ASGI handlers."""
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        candidates = self._candidates(allow_failover)
+        errors = []
+
+        async def call(provider):
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                provider.breaker.release()
+                raise TimeoutError("LLM deadline exceeded")
+            start = loop.time()
+            try:
+                text = await provider.acomplete(messages, timeout=min(provider.timeout, remaining))
+            except Exception:
+                provider.breaker.record_failure()
+                self._observe("error", provider, loop.time() - start)
+                raise
+            elapsed = loop.time() - start
+            provider.breaker.record_success()
+            provider.latency.record(elapsed)
+            self._observe("ok", provider, elapsed)
+            return text
+
+        def start(provider):
+            task = asyncio.ensure_future(call(provider))
+            # A cancelled hedge loser records no outcome; free any trial slot it holds.
+            task.add_done_callback(lambda t: provider.breaker.release() if t.cancelled() else None)
+            return task
+
+        while True:
+            provider = self._next(candidates)
+            if provider is None:
+                break
+            hedge_delay = self._hedge_delay(provider) if candidates else None
+            tasks = {start(provider): provider}
+
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                backup = None if done else self._next(candidates)
+                if backup is not None:
+                    self._observe("hedge", backup, hedge_delay)
+                    tasks[start(backup)] = backup
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline_at - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        for other in pending:
+                            other.cancel()
+                        return task.result(), tasks[task].name
+                    logging.warning(f"[WARNING] LLM provider {tasks[task].name} failed: {task.exception()}")
+                    errors.append(task.exception())
+                    if pending or candidates:
+                        self._observe("failover", tasks[task])
+            for task in pending:
+                task.cancel()
+
+        raise LLMUnavailableError(f"All LLM providers failed: {errors or 'no provider available'}")
+
+    def stream(self, messages, allow_failover=True):
+        """Yield ``(provider_name, token)``, failing over only before the first token."""
+        deadline_at = time.monotonic() + self.deadline
+        errors = []
+
+        candidates = self._candidates(allow_failover)
+        while True:
+            provider = self._next(candidates)
+            if provider is None:
+                break
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                provider.breaker.release()
+                break
+            start = time.monotonic()
+            tokens = provider.stream(messages, timeout=min(provider.timeout, remaining))
+            try:
+                first = next(tokens)
+            except StopIteration:
+                provider.breaker.record_success()
+                return
+            except Exception as e:
+                provider.breaker.record_failure()
+                self._observe("error", provider, time.monotonic() - start)
+                logging.warning(f"[WARNING] LLM provider {provider.name} stream failed before the first token: {e}")
+                errors.append(e)
+                if candidates:
+                    self._observe("failover", provider)
+                continue
+
+            provider.breaker.record_success()
+            # Streaming latency is time to first token
+            self._observe("ok", provider, time.monotonic() - start)
+            yield provider.name, first
+            yield from ((provider.name, token) for token in tokens)
+            return
+
+        raise LLMUnavailableError(f"All LLM providers failed: {errors or 'no provider available'}")
+
+    def warm(self):
+        """Build the pooled clients of every configured provider ahead of the first call."""
+        for provider in self.providers:
+            if provider.configured:
+                provider.client
+
+    def status(self):
+        return {
+            provider.name: provider.breaker.state if provider.configured else "unconfigured"
+            for provider in self.providers
+        }
@@ -0,0 +1,206 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond scoring up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][position] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: {"counts": list(s["counts"]), "sum": s["sum"]} for key, s in self._series.items()}
+        for key, data in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {data['sum']!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Value read from ``read()`` at scrape time."""
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            logging.warning(f"[WARNING] Failed to read gauge {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """Process-local metrics. Each worker process exposes its own values."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, read):
+        if not callable(read):
+            raise TypeError(f"Gauge {name} needs a zero-argument callable, got {type(read).__name__}")
+        return self._register(Gauge(name, help_text, read))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "rag_stage_seconds", "Time spent in each stage of a chat request.", labelnames=("route", "stage")
+)
+llm_call_seconds = registry.histogram(
+    "llm_call_seconds", "LLM provider call latency by outcome.", labelnames=("provider", "outcome")
+)
+llm_failovers = registry.counter(
+    "llm_failovers_total", "LLM calls that moved on from a failed provider.", labelnames=("provider",)
+)
+llm_hedges = registry.counter(
+    "llm_hedges_total", "Hedged LLM calls fired at a backup provider.", labelnames=("provider",)
+)
+http_request_seconds = registry.histogram(
+    "http_request_seconds", "HTTP request latency.", labelnames=("endpoint", "method", "status")
+)
+
+
+
+def register_cache_gauges(registry, embedding_cache, answer_cache):
+    """Expose this worker's embedding-matrix and answer cache sizes as gauges."""
+    registry.gauge("embedding_cache_bytes", "Bytes held by the per-PDF embedding matrix cache.",
+                   lambda: embedding_cache.size_bytes)
+    registry.gauge("answer_cache_entries", "Entries in this worker's semantic answer cache.",
+                   lambda: answer_cache.stats()["entries"])
+    registry.gauge("answer_cache_hit_ratio", "Semantic answer cache hit rate in this worker.",
+                   lambda: answer_cache.stats()["hit_rate"])
+
+
+class StageTimer:
+    """Per-request stage timings, recorded into ``stage_seconds`` as they finish.
+
+    ``lap(name)`` closes a stage that ran since the previous lap (or since the
+    timer was created); ``stage(name)`` times a block. ``server_timing()``
+    formats the timings for a ``Server-Timing`` response header.
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.timings = []
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.record(name, now - self._last)
+        self._last = now
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.record(name, self._last - start)
+
+    def record(self, name, seconds):
+        self.timings.append((name, seconds))
+        stage_seconds.observe(seconds, route=self.route, stage=name)
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings)
+
+
+def log_sampled(level, message, rate):
+    """Log ``message`` at ``level`` for roughly ``rate`` of calls, skipping disabled levels.
+
+    ``message`` may be a zero-argument callable so that costly formatting
+    only happens when the line is actually emitted.
+    """
+    if not logging.getLogger().isEnabledFor(level) or (rate < 1.0 and random.random() >= rate):
+        return
+    logging.log(level, message() if callable(message) else message)
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+import fitz
+from bson import ObjectId
+
+# Keep stored page text comfortably below MongoDB's 16MB document limit
+MAX_STORED_TEXT_BYTES = 12 * 1024 * 1024
+
+
+def read_gridfs_file(grid_out):
+    """Read a GridFS file into one buffer, hashing it as it arrives.
+
+    Returns ``(data, sha256_hex)``. ``data`` is a ``bytearray`` sized to the
+    file up front and filled GridFS chunk by GridFS chunk, so peak memory is
+    the file size plus one chunk; fitz opens it without another copy.
+    """
+    digest = hashlib.sha256()
+    data = bytearray(grid_out.length)
+    view = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        chunk = grid_out.readchunk()
+        if not chunk:
+            break
+        digest.update(chunk)
+        view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    view.release()
+    if offset < len(data):
+        del data[offset:]
+    return data, digest.hexdigest()
+
+
+def iter_page_texts(pdf_bytes):
+    """Yield the text of each page in turn without holding the other pages open."""
+    document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for page in document:
+            yield page.get_text()
+    finally:
+        document.close()
+
+
+def iter_page_blocks(pdf_bytes):
+    """Yield, per page, the texts of its layout blocks (paragraphs, list items, table cells)."""
+    document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for page in document:
+            # (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+            yield [block[4] for block in page.get_text("blocks") if block[6] == 0]
+    finally:
+        document.close()
+
+
+class PdfTextStore:
+    """Extracted per-page text for GridFS PDFs, stored once in the ``pdf_text`` collection.
+
+    GridFS files are immutable (updates store a new file id), so text stored
+    under a pdf_id stays valid until that file is deleted.
+    """
+
+    def __init__(self, collection, fs):
+        self.collection = collection
+        self.fs = fs
+
+    def get_pages(self, pdf_id):
+        """Return the list of page texts for ``pdf_id``, extracting it on first use."""
+        return self.get_record(pdf_id)["pages"]
+
+    def get_text(self, pdf_id):
+        return "".join(self.get_pages(pdf_id))
+
+    def get_record(self, pdf_id):
+        """Return ``{"pages", "content_hash", "page_count"}`` for ``pdf_id``."""
+        record = self.collection.find_one({"_id": pdf_id}, {"pages": 1, "content_hash": 1, "page_count": 1})
+        # Text too large to store leaves a record holding only page_tokens
+        if record is not None and "pages" in record:
+            return record
+        return self.extract(pdf_id)
+
+    def extract(self, pdf_id):
+        """Parse the PDF from GridFS and persist its page texts and content hash."""
+        pdf_bytes, content_hash = read_gridfs_file(self.fs.get(ObjectId(pdf_id)))
+        pages = list(iter_page_texts(pdf_bytes))
+        record = {
+            "_id": pdf_id,
+            "content_hash": content_hash,
+            "page_count": len(pages),
+            "pages": pages,
+            "extracted_at": datetime.now(timezone.utc),
+        }
+
+        if sum(len(page.encode("utf-8")) for page in pages) <= MAX_STORED_TEXT_BYTES:
+            self.collection.replace_one({"_id": pdf_id}, record, upsert=True)
+        else:
+            logging.warning(f"[WARNING] Extracted text for PDF ID {pdf_id} is too large to store; not cached.")
+        return record
+
+    def get_page_tokens(self, pdf_id, count_tokens):
+        """Per-page token counts, computed with ``count_tokens`` once and stored.
+
+        The counts are stored even when the page text itself was too large to
+        keep, so later calls do not re-extract the PDF.
+        """
+        record = self.collection.find_one({"_id": pdf_id}, {"page_tokens": 1})
+        if record is not None and "page_tokens" in record:
+            return record["page_tokens"]
+
+        counts = [count_tokens(page) for page in self.get_pages(pdf_id)]
+        self.collection.update_one({"_id": pdf_id}, {"$set": {"page_tokens": counts}}, upsert=True)
+        return counts
+
+    def invalidate(self, pdf_id):
+        self.collection.delete_one({"_id": str(pdf_id)})
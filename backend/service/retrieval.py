@@ -0,0 +1,74 @@
+import numpy as np
+
+from service.scoring import reciprocal_rank_fusion, score_top_k, top_k_indices
+
+
+def rank_candidates(query_vector, cached, depth, limit, lexical_index=None, query_text=None, rrf_k=60,
+                    query_scores=None):
+    """Return up to ``limit`` ``(chunk_index, text, cosine)`` candidates for one PDF.
+
+    The top ``depth`` chunks by cosine similarity against ``cached.matrix``
+    are fused by rank with the top ``depth`` BM25 hits for ``query_text``
+    when a ``lexical_index`` is given. Candidates keep their cosine score so
+    score thresholds downstream still apply to lexical-only hits. Also
+    returns the dense scores in rank order.
+
+    ``query_scores``, the cosine of every chunk when it has already been
+    computed (see ``rank_candidates_across``), skips the matrix multiply.
+    """
+    if query_scores is None:
+        indices, scores = score_top_k(query_vector, cached.matrix, depth)
+        indices, scores = indices[0], scores[0]
+    else:
+        indices = top_k_indices(query_scores, depth)
+        scores = query_scores[indices]
+    dense_scores = dict(zip(indices.tolist(), scores.tolist()))
+
+    ranking = indices
+    if lexical_index is not None:
+        lexical_indices, _ = lexical_index.search(query_text, depth)
+        fused = reciprocal_rank_fusion([indices, lexical_indices], k=rrf_k, limit=depth)
+        ranking = [index for index, _ in fused]
+
+    candidates = []
+    for i in ranking[:limit]:
+        score = dense_scores.get(int(i))
+        if score is None:
+            if query_scores is None:
+                query_scores = cached.matrix @ np.asarray(query_vector, dtype=np.float32)
+            score = float(query_scores[i])
+        candidates.append((int(i), cached.texts[i], score))
+    return candidates, scores
+
+
+def rank_candidates_across(query_vector, cached_entries, depth, limit, lexical_indexes=None, query_text=None,
+                           rrf_k=60):
+    """``rank_candidates`` for several PDFs with one matrix multiply.
+
+    The cached matrices are stacked and scored together, then each PDF's
+    slice of scores is ranked on its own, so every PDF contributes up to
+    ``limit`` candidates. ``lexical_indexes`` lines up with
+    ``cached_entries``. Returns one candidate list per entry.
+    """
+    if not cached_entries:
+        return []
+    # Stacking copies the matrices, which costs about as much as the multiply
+    # itself; one BLAS call still beats a call per PDF.
+    matrix = np.vstack([entry.matrix for entry in cached_entries])
+    all_scores = matrix @ np.asarray(query_vector, dtype=np.float32)
+    offsets = np.cumsum([0] + [len(entry.texts) for entry in cached_entries])
+
+    results = []
+    for i, entry in enumerate(cached_entries):
+        candidates, _ = rank_candidates(
+            query_vector,
+            entry,
+            depth,
+            limit,
+            lexical_index=lexical_indexes[i] if lexical_indexes else None,
+            query_text=query_text,
+            rrf_k=rrf_k,
+            query_scores=all_scores[offsets[i]:offsets[i + 1]]
+        )
+        results.append(candidates)
+    return results
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """Return a C-contiguous float32 copy of ``matrix`` with unit-length rows.
+
+    Zero rows are left as zeros so they score 0 against every query.
+    """
+    matrix = np.array(matrix, dtype=np.float32, copy=True, ndmin=2, order="C")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores, k):
+    """Indices of the ``k`` highest scores along the last axis, best first.
+
+    Uses ``argpartition`` so only the selected ``k`` entries are sorted.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def score_top_k(queries, corpus, k):
+    """Score a batch of queries against a normalized corpus in one matrix multiply.
+
+    ``queries`` is ``(q, d)`` or ``(d,)`` and ``corpus`` is ``(n, d)``; both are
+    expected to be unit-normalized so the dot product is the cosine similarity.
+    Returns ``(indices, scores)`` shaped ``(q, k)``, best match first.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[np.newaxis, :]
+
+    if corpus.shape[0] == 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.intp), empty.astype(np.float32)
+
+    scores = queries @ corpus.T
+    indices = top_k_indices(scores, k)
+    return indices, np.take_along_axis(scores, indices, axis=-1)
+
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """Fuse several best-first rankings of item indices with RRF.
+
+    Each item scores ``sum(1 / (k + rank))`` over the rankings it appears in
+    (rank starting at 1). Returns ``[(index, fused_score), ...]`` best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking, start=1):
+            index = int(index)
+            fused[index] = fused.get(index, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+    return ordered[:limit] if limit is not None else ordered
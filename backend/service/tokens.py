@@ -0,0 +1,24 @@
+from service.embedding_service import embedding_service
+
+
+def _tokenize(text, **kwargs):
+    # verbose=False silences the "sequence longer than max length" warning; we
+    # only count and slice here, nothing is fed to the model.
+    return embedding_service.tokenizer(text, add_special_tokens=False, verbose=False, **kwargs)
+
+
+def count_tokens(text):
+    """Count tokens in ``text`` with the local embedding-model tokenizer."""
+    if not text:
+        return 0
+    return len(_tokenize(text)["input_ids"])
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Return the longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    if max_tokens <= 0 or not text:
+        return ""
+    offsets = _tokenize(text, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return text
+    return text[:offsets[max_tokens][0]].rstrip()
@@ -0,0 +1,63 @@
+import numpy as np
+from bson import Binary
+
+# Documents written before binary storage have no "embedding_format" and hold a
+# BSON array of doubles; both layouts are readable during the rollout.
+LEGACY_FORMAT = "list"
+STORAGE_FORMATS = ("float32", "float16", "int8")
+
+_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+# Projection for every field decode_embedding may need
+EMBEDDING_PROJECTION = {"embedding": 1, "embedding_format": 1, "embedding_scale": 1}
+
+
+def encode_embedding(vector, storage_format="float32"):
+    """Pack an embedding into the document fields for ``storage_format``.
+
+    ``int8`` uses symmetric scalar quantization with a per-vector scale, which
+    keeps cosine ranking stable for the unit-normalized vectors we store.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+
+    if storage_format == LEGACY_FORMAT:
+        return {"embedding": vector.tolist()}
+
+    if storage_format not in _DTYPES:
+        raise ValueError(f"Unsupported embedding storage format: {storage_format}")
+
+    fields = {"embedding_format": storage_format}
+    if storage_format == "int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        packed = np.clip(np.rint(vector / scale), -127, 127).astype(_DTYPES["int8"])
+        fields["embedding_scale"] = scale
+    else:
+        packed = vector.astype(_DTYPES[storage_format])
+
+    fields["embedding"] = Binary(packed.tobytes())
+    return fields
+
+
+def decode_embedding(doc):
+    """Return the embedding stored in ``doc`` as a NumPy vector.
+
+    Binary float32 vectors are returned as a read-only view over the BSON bytes
+    (no copy); float16 and int8 are widened to float32.
+    """
+    storage_format = doc.get("embedding_format", LEGACY_FORMAT)
+    raw = doc["embedding"]
+
+    if storage_format == LEGACY_FORMAT:
+        return np.asarray(raw, dtype=np.float32)
+
+    vector = np.frombuffer(raw, dtype=_DTYPES[storage_format])
+    if storage_format == "float16":
+        return vector.astype(np.float32)
+    if storage_format == "int8":
+        return vector.astype(np.float32) * np.float32(doc["embedding_scale"])
+    return vector
@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from service.scoring import normalize_rows, score_top_k, top_k_indices
+
+
+class VectorIndex:
+    """Interface for in-memory vector indexes over chunk embeddings.
+
+    Vectors are grouped by ``pdf_id`` so a syllabus can be added or removed as a
+    unit. ``search`` returns ``(pdf_id, content, score)`` tuples, best first.
+    Implementations that are approximate must still honour ``exact=True``.
+    """
+
+    def add(self, pdf_id, vectors, texts):
+        raise NotImplementedError
+
+    def remove(self, pdf_id):
+        raise NotImplementedError
+
+    def search(self, query, k, exact=False):
+        raise NotImplementedError
+
+    def save(self, path):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force index: one matrix multiply over every stored vector."""
+
+    kind = "exact"
+
+    def __init__(self):
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._pdf_ids = []
+        self._texts = []
+        self._lock = threading.RLock()
+
+    def add(self, pdf_id, vectors, texts):
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            self._remove_rows(pdf_id)
+            if self._vectors.size == 0:
+                self._vectors = vectors
+            else:
+                self._vectors = np.vstack([self._vectors, vectors])
+            self._pdf_ids.extend([pdf_id] * len(texts))
+            self._texts.extend(texts)
+
+    def remove(self, pdf_id):
+        with self._lock:
+            self._remove_rows(pdf_id)
+
+    def _remove_rows(self, pdf_id):
+        keep = [i for i, existing in enumerate(self._pdf_ids) if existing != pdf_id]
+        if len(keep) == len(self._pdf_ids):
+            return
+        self._vectors = self._vectors[keep] if keep else np.empty((0, 0), dtype=np.float32)
+        self._pdf_ids = [self._pdf_ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+
+    def search(self, query, k, exact=False):
+        with self._lock:
+            if not self._texts:
+                return []
+            indices, scores = score_top_k(normalize_rows(query), self._vectors, k)
+            return [(self._pdf_ids[i], self._texts[i], float(s)) for i, s in zip(indices[0], scores[0])]
+
+    def save(self, path):
+        with self._lock:
+            _write_index(path, {"kind": self.kind}, {"vectors": self._vectors}, self._pdf_ids, self._texts)
+
+    @classmethod
+    def load(cls, path):
+        meta, arrays, pdf_ids, texts = _read_index(path)
+        index = cls()
+        index._vectors = arrays["vectors"]
+        index._pdf_ids = pdf_ids
+        index._texts = texts
+        return index
+
+    def __len__(self):
+        return len(self._texts)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: spherical k-means partitions probed ``n_probe`` at a time.
+
+    Below ``train_threshold`` vectors the index stays untrained and every search is
+    exact. Inserts are assigned to the nearest existing centroid; the partitions
+    are retrained once the index has doubled in size since the last training.
+    Deleted rows are tombstoned and compacted when they exceed a quarter of storage.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, train_threshold=2048, kmeans_iterations=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_threshold = train_threshold
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._pdf_ids = []
+        self._texts = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._rows_by_pdf = {}
+        self._centroids = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists = []
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self):
+        return self._centroids is not None
+
+    def add(self, pdf_id, vectors, texts):
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            self._remove_rows(pdf_id)
+            start = len(self._texts)
+            if self._vectors.size == 0:
+                self._vectors = vectors
+            else:
+                self._vectors = np.vstack([self._vectors, vectors])
+            self._pdf_ids.extend([pdf_id] * len(texts))
+            self._texts.extend(texts)
+            self._alive = np.concatenate([self._alive, np.ones(len(texts), dtype=bool)])
+            rows = np.arange(start, start + len(texts))
+            self._rows_by_pdf[pdf_id] = rows
+
+            live = len(self)
+            if live >= self.train_threshold and (not self.is_trained or live >= 2 * self._trained_size):
+                self._train()
+            elif self.is_trained:
+                assignments = self._assign(vectors)
+                self._assignments = np.concatenate([self._assignments, assignments])
+                for list_id in np.unique(assignments):
+                    self._lists[list_id] = np.concatenate([self._lists[list_id], rows[assignments == list_id]])
+
+    def remove(self, pdf_id):
+        with self._lock:
+            self._remove_rows(pdf_id)
+
+    def _remove_rows(self, pdf_id):
+        rows = self._rows_by_pdf.pop(pdf_id, None)
+        if rows is None:
+            return
+        self._alive[rows] = False
+        if self.is_trained:
+            for list_id in np.unique(self._assignments[rows]):
+                members = self._lists[list_id]
+                self._lists[list_id] = members[self._alive[members]]
+        if (~self._alive).sum() > len(self._alive) // 4:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive)
+        remap = np.full(len(self._alive), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        self._vectors = self._vectors[keep] if len(keep) else np.empty((0, 0), dtype=np.float32)
+        self._pdf_ids = [self._pdf_ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._rows_by_pdf = {pdf_id: remap[rows] for pdf_id, rows in self._rows_by_pdf.items()}
+        if self.is_trained:
+            self._assignments = self._assignments[keep]
+            self._lists = [remap[members] for members in self._lists]
+
+    def _train(self):
+        live_rows = np.flatnonzero(self._alive)
+        data = self._vectors[live_rows]
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(data))))
+        n_lists = min(n_lists, len(data))
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(data), n_lists * 256)
+        sample = data[rng.choice(len(data), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = sample[labels == list_id]
+                if len(members):
+                    centroids[list_id] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        self._centroids = centroids
+        self._assignments = np.full(len(self._alive), -1, dtype=np.int32)
+        self._assignments[live_rows] = self._assign(data)
+        self._lists = [live_rows[self._assignments[live_rows] == list_id] for list_id in range(n_lists)]
+        self._trained_size = len(data)
+        logging.info(f"[INFO] IVF index trained with {n_lists} lists over {len(data)} vectors.")
+
+    def _assign(self, vectors, batch_size=4096):
+        labels = [
+            np.argmax(vectors[i:i + batch_size] @ self._centroids.T, axis=1)
+            for i in range(0, len(vectors), batch_size)
+        ]
+        return np.concatenate(labels).astype(np.int32) if labels else np.zeros(0, dtype=np.int32)
+
+    def search(self, query, k, exact=False):
+        query = normalize_rows(query)[0]
+        with self._lock:
+            if len(self) == 0:
+                return []
+
+            if exact or not self.is_trained:
+                candidates = np.flatnonzero(self._alive)
+            else:
+                probe = top_k_indices(self._centroids @ query, self.n_probe)
+                candidates = np.concatenate([self._lists[list_id] for list_id in probe])
+                if len(candidates) == 0:
+                    return []
+
+            scores = self._vectors[candidates] @ query
+            best = top_k_indices(scores, k)
+            return [
+                (self._pdf_ids[candidates[i]], self._texts[candidates[i]], float(scores[i]))
+                for i in best
+            ]
+
+    def save(self, path):
+        with self._lock:
+            self._compact()
+            meta = {
+                "kind": self.kind,
+                "n_lists": self.n_lists,
+                "n_probe": self.n_probe,
+                "train_threshold": self.train_threshold,
+                "kmeans_iterations": self.kmeans_iterations,
+                "seed": self.seed,
+                "trained_size": self._trained_size,
+            }
+            arrays = {"vectors": self._vectors}
+            if self.is_trained:
+                arrays["centroids"] = self._centroids
+                arrays["assignments"] = self._assignments
+            _write_index(path, meta, arrays, self._pdf_ids, self._texts)
+
+    @classmethod
+    def load(cls, path):
+        meta, arrays, pdf_ids, texts = _read_index(path)
+        index = cls(
+            n_lists=meta["n_lists"],
+            n_probe=meta["n_probe"],
+            train_threshold=meta["train_threshold"],
+            kmeans_iterations=meta["kmeans_iterations"],
+            seed=meta["seed"],
+        )
+        index._vectors = arrays["vectors"]
+        index._pdf_ids = pdf_ids
+        index._texts = texts
+        index._alive = np.ones(len(texts), dtype=bool)
+        rows_by_pdf = {}
+        for row, pdf_id in enumerate(pdf_ids):
+            rows_by_pdf.setdefault(pdf_id, []).append(row)
+        index._rows_by_pdf = {pdf_id: np.array(rows) for pdf_id, rows in rows_by_pdf.items()}
+        if "centroids" in arrays:
+            index._centroids = arrays["centroids"]
+            index._assignments = arrays["assignments"]
+            index._lists = [np.flatnonzero(index._assignments == list_id) for list_id in range(len(index._centroids))]
+            index._trained_size = meta["trained_size"]
+        return index
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+
+INDEX_TYPES = {ExactIndex.kind: ExactIndex, IVFIndex.kind: IVFIndex}
+
+
+def create_index(kind, **options):
+    """Build an empty index of the given kind ("exact" or "ivf")."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {kind}")
+    return INDEX_TYPES[kind](**options)
+
+
+def load_index(path):
+    """Load a previously saved index, dispatching on its stored kind."""
+    with open(f"{path}.json", "r", encoding="utf-8") as meta_file:
+        kind = json.load(meta_file)["meta"]["kind"]
+    return INDEX_TYPES[kind].load(path)
+
+
+def _write_index(path, meta, arrays, pdf_ids, texts):
+    """Write arrays to ``<path>.npz`` and metadata to ``<path>.json`` atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(f"{path}.npz.tmp", "wb") as array_file:
+        np.savez(array_file, **arrays)
+    with open(f"{path}.json.tmp", "w", encoding="utf-8") as meta_file:
+        json.dump({"meta": meta, "pdf_ids": pdf_ids, "texts": texts}, meta_file)
+
+    os.replace(f"{path}.npz.tmp", f"{path}.npz")
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+
+
+def _read_index(path):
+    with open(f"{path}.json", "r", encoding="utf-8") as meta_file:
+        payload = json.load(meta_file)
+    with np.load(f"{path}.npz") as arrays:
+        loaded = {name: arrays[name] for name in arrays.files}
+    return payload["meta"], loaded, payload["pdf_ids"], payload["texts"]
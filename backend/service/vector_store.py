@@ -0,0 +1,477 @@
+import os
+import json
+import logging
+import threading
+from itertools import islice
+
+import bson
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import Config
+from service.vector_index import create_index, load_index
+from service.vector_codec import EMBEDDING_PROJECTION, decode_embedding, encode_embedding
+
+# MongoDB rejects documents over 16MB and splits messages over 48MB; stay well under both.
+MAX_BSON_DOCUMENT_BYTES = 16 * 1024 * 1024
+
+
+class _FileLock:
+    """``flock`` on a lock file; a no-op where ``fcntl`` is unavailable (Windows development)."""
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a")
+        fcntl.flock(self._file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class BulkInsertError(Exception):
+    """Raised by an all-or-nothing ``add_chunks`` after rolling back its writes."""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+class CustomMongoDBVectorStore:
+    """Chunk embeddings in MongoDB plus an in-memory cross-syllabus search index.
+
+    The index is loaded from a snapshot at ``index_path`` (or built from the
+    collection) on first search or warmup, and reconciled with MongoDB when it
+    is loaded: the snapshot records a per-PDF fingerprint (chunk count and
+    newest chunk ``_id``), and only PDFs whose fingerprint changed since it was
+    written are reloaded. Writes before the index is loaded leave it alone;
+    reconciliation picks them up. With ``changes`` (a ChangeCounter bumped on
+    every chunk write in any process), ``search`` also reconciles whenever the
+    counter has moved, so syllabi replaced or deleted by another worker drop
+    out of its results. Snapshot writes are debounced by ``persist_delay``
+    seconds and serialized across processes with a file lock.
+    """
+
+    def __init__(self, collection, embedding_function, index=None, index_path=None, search_mode="exact",
+                 storage_format="float32", batch_size=256, max_batch_bytes=8 * 1024 * 1024, persist_delay=5.0,
+                 changes=None):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.storage_format = storage_format
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.index = index
+        self.index_path = index_path
+        self.search_mode = search_mode
+        self.persist_delay = persist_delay
+        self.changes = changes
+        self._reconciled_version = None
+        self._index_lock = threading.Lock()
+        # Fingerprints of the PDFs in ``index``; None until it has been reconciled with MongoDB
+        self._fingerprints = None
+        self._snapshot_fingerprints = {}
+        self._persist_lock = threading.Lock()
+        self._persist_timer = None
+        self._dirty = False
+
+    def _ensure_index(self):
+        """Load the persisted index, or build it from the collection on first use."""
+        if self.index is not None and self._fingerprints is not None:
+            return self.index
+
+        with self._index_lock:
+            if self.index is None:
+                self.index = self._load_snapshot()
+            if self.index is not None and self._fingerprints is None:
+                self._reconciled_version = self._changes_version()
+                self._reconcile(self._snapshot_fingerprints)
+                return self.index
+            if self.index is not None:
+                return self.index
+
+            options = {"n_probe": Config.IVF_N_PROBE} if Config.VECTOR_INDEX_TYPE == "ivf" else {}
+            index = create_index(Config.VECTOR_INDEX_TYPE, **options)
+
+            # Version and fingerprints before the scan: a write racing with it
+            # then only makes the next reconciliation reload that PDF
+            self._reconciled_version = self._changes_version()
+            fingerprints = self.pdf_fingerprints()
+            grouped = {}
+            projection = {"_id": 0, "pdf_id": 1, "content": 1, **EMBEDDING_PROJECTION}
+            for doc in self.collection.find({}, projection):
+                embeddings, texts = grouped.setdefault(doc["pdf_id"], ([], []))
+                embeddings.append(decode_embedding(doc))
+                texts.append(doc["content"])
+            for pdf_id, (embeddings, texts) in grouped.items():
+                index.add(pdf_id, np.array(embeddings, dtype=np.float32), texts)
+
+            logging.info(f"[INFO] Built vector index with {len(index)} vectors from MongoDB.")
+            self.index = index
+            self._fingerprints = fingerprints
+            self._schedule_persist()
+            return self.index
+
+    def pdf_fingerprints(self, pdf_id=None):
+        """Map each PDF (or just ``pdf_id``) to ``[chunk count, newest chunk _id]`` in MongoDB.
+
+        Chunks are only ever inserted and deleted, never rewritten in place, so
+        any change to a PDF's chunks changes its fingerprint.
+        """
+        pipeline = [{"$match": {"pdf_id": pdf_id}}] if pdf_id is not None else []
+        pipeline.append({"$group": {"_id": "$pdf_id", "chunks": {"$sum": 1}, "last_id": {"$max": "$_id"}}})
+        return {doc["_id"]: [doc["chunks"], str(doc["last_id"])] for doc in self.collection.aggregate(pipeline)}
+
+    def _changes_version(self):
+        return self.changes.version() if self.changes is not None else None
+
+    def _current_index(self):
+        """The index, first reconciled with MongoDB if another process changed chunks since."""
+        index = self._ensure_index()
+        if self.changes is None:
+            return index
+        version = self.changes.version()
+        if version == self._reconciled_version:
+            return index
+        with self._index_lock:
+            if version != self._reconciled_version:
+                self._reconcile(self._fingerprints)
+                self._reconciled_version = version
+        return index
+
+    def _reconcile(self, known):
+        """Bring the index from the ``known`` per-PDF fingerprints up to date with MongoDB."""
+        current = self.pdf_fingerprints()
+        removed = [pdf_id for pdf_id in known if pdf_id not in current]
+        changed = [pdf_id for pdf_id, fingerprint in current.items() if known.get(pdf_id) != fingerprint]
+        for pdf_id in removed:
+            self.index.remove(pdf_id)
+        for pdf_id in changed:
+            embeddings, texts = self.load_embeddings(pdf_id)
+            self.index.add(pdf_id, embeddings, texts)
+        self._fingerprints = current
+        if removed or changed:
+            logging.info(f"[INFO] Reconciled vector index with MongoDB: {len(changed)} PDFs reloaded, "
+                         f"{len(removed)} removed.")
+            self._schedule_persist()
+
+    def _snapshot_lock(self, shared=False):
+        """Advisory lock on the snapshot files, shared by every process using ``index_path``."""
+        return _FileLock(f"{self.index_path}.lock", shared=shared)
+
+    def _load_snapshot(self):
+        if not (self.index_path and os.path.exists(f"{self.index_path}.json")):
+            return None
+        try:
+            with self._snapshot_lock(shared=True):
+                index = load_index(self.index_path)
+                self._snapshot_fingerprints = self._read_snapshot_fingerprints()
+            logging.info(f"[INFO] Loaded vector index with {len(index)} vectors.")
+            return index
+        except Exception as e:
+            logging.warning(f"[WARNING] Failed to load vector index, rebuilding: {e}")
+            return None
+
+    def _read_snapshot_fingerprints(self):
+        # A snapshot without fingerprints (older format) reconciles every PDF
+        try:
+            with open(f"{self.index_path}.state.json", "r", encoding="utf-8") as state_file:
+                return json.load(state_file)["fingerprints"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def load_snapshot(self):
+        """Load the persisted index file without touching MongoDB; returns its size (0 without one).
+
+        Safe in a pre-fork server master, where no database connection may be
+        opened. The index is reconciled with MongoDB on its first use.
+        """
+        with self._index_lock:
+            if self.index is None:
+                self.index = self._load_snapshot()
+            return len(self.index) if self.index is not None else 0
+
+    def warm_index(self):
+        """Load or build the search index ahead of the first query; returns its size."""
+        return len(self._ensure_index())
+
+    def _schedule_persist(self):
+        """Write the snapshot ``persist_delay`` seconds from now, coalescing the writes in between."""
+        if not self.index_path:
+            return
+        with self._persist_lock:
+            self._dirty = True
+            if self._persist_timer is not None:
+                return
+            self._persist_timer = threading.Timer(self.persist_delay, self.flush)
+            self._persist_timer.daemon = True
+            self._persist_timer.start()
+
+    def flush(self):
+        """Write the index snapshot now if it has unsaved changes."""
+        with self._persist_lock:
+            if self._persist_timer is not None:
+                self._persist_timer.cancel()
+                self._persist_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._persist_index()
+
+    def _persist_index(self):
+        try:
+            with self._index_lock:
+                fingerprints = dict(self._fingerprints or {})
+            with self._snapshot_lock():
+                self.index.save(self.index_path)
+                with open(f"{self.index_path}.state.json.tmp", "w", encoding="utf-8") as state_file:
+                    json.dump({"fingerprints": fingerprints}, state_file)
+                os.replace(f"{self.index_path}.state.json.tmp", f"{self.index_path}.state.json")
+        except Exception as e:
+            logging.error(f"[ERROR] Failed to persist vector index: {e}", exc_info=True)
+
+    def index_pdf(self, pdf_id, embeddings, texts):
+        """Add (or replace) a PDF's chunk vectors in the search index, if this process has loaded it."""
+        if self.index is None:
+            return
+        with self._index_lock:
+            if self._fingerprints is None:
+                return
+            self.index.add(pdf_id, embeddings, texts)
+            fingerprint = self.pdf_fingerprints(pdf_id).get(pdf_id)
+            if fingerprint is not None:
+                self._fingerprints[pdf_id] = fingerprint
+        self._schedule_persist()
+
+    def build_document(self, pdf_id, content, embedding, chunk_index=None, metadata=None):
+        """Build the embeddings-collection document for one chunk.
+
+        ``metadata`` (page, character offsets, heading, token count) is stored
+        alongside the chunk as top-level fields.
+        """
+        document = {
+            "pdf_id": pdf_id,
+            "content": content,
+            **encode_embedding(embedding, self.storage_format)
+        }
+        if chunk_index is not None:
+            document["chunk_index"] = chunk_index
+        if metadata:
+            document.update(metadata)
+        return document
+
+    def _batches(self, sized_documents):
+        """Group ``(document, encoded_size)`` pairs into batches capped by count and bytes."""
+        batch = []
+        batch_bytes = 0
+        for document, size in sized_documents:
+            if batch and (len(batch) >= self.batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(document)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def add_chunks(self, pdf_id, chunks, embeddings, atomic=True, start_index=0, metadata=None):
+        """Insert chunk embeddings for a PDF with ordered ``insert_many`` batches.
+
+        ``metadata``, if given, is a list of per-chunk dicts parallel to ``chunks``.
+
+        Returns ``{"inserted", "failed", "batches", "errors"}``. With ``atomic``,
+        any failure deletes the chunks this call already wrote and raises
+        ``BulkInsertError``; otherwise the remaining batches are still attempted.
+        """
+        result = {"inserted": 0, "failed": 0, "batches": 0, "errors": []}
+        written_ids = []
+
+        documents = []
+        for offset, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            document = self.build_document(
+                pdf_id, chunk, embedding,
+                chunk_index=start_index + offset,
+                metadata=metadata[offset] if metadata else None
+            )
+            document["_id"] = ObjectId()
+            size = len(bson.encode(document))
+            if size > MAX_BSON_DOCUMENT_BYTES:
+                result["failed"] += 1
+                result["errors"].append(f"Chunk {start_index + offset} exceeds the BSON document size limit.")
+                continue
+            documents.append((document, size))
+
+        if result["failed"] and atomic:
+            raise BulkInsertError(result["errors"][0], result)
+
+        for batch in self._batches(documents):
+            result["batches"] += 1
+            try:
+                self.collection.insert_many(batch, ordered=True)
+                result["inserted"] += len(batch)
+                written_ids.extend(document["_id"] for document in batch)
+            except BulkWriteError as e:
+                inserted = e.details.get("nInserted", 0)
+                result["inserted"] += inserted
+                result["failed"] += len(batch) - inserted
+                result["errors"].append(str(e.details.get("writeErrors", e)))
+                written_ids.extend(document["_id"] for document in batch[:inserted])
+            except Exception as e:
+                result["failed"] += len(batch)
+                result["errors"].append(str(e))
+
+            if result["failed"] and atomic:
+                if written_ids:
+                    self.collection.delete_many({"_id": {"$in": written_ids}})
+                logging.error(f"[ERROR] Bulk insert for PDF ID {pdf_id} failed; rolled back {len(written_ids)} chunks.")
+                raise BulkInsertError(result["errors"][-1], result)
+
+        logging.info(
+            f"[INFO] Stored {result['inserted']} chunks for PDF ID {pdf_id} in {result['batches']} batches "
+            f"({result['failed']} failed)."
+        )
+        return result
+
+    def ingest_chunks(self, pdf_id, chunks, hash_text, reuse_from=(), batch_size=None):
+        """Embed and store a PDF's chunks in place of any it already has.
+
+        ``chunks`` (``Chunk`` objects, typically the ``iter_chunks`` generator)
+        are consumed ``batch_size`` at a time: each batch is hashed, embedded
+        only where no stored chunk of ``pdf_id`` or of a PDF in ``reuse_from``
+        has the same hash, and written with ``add_chunks``. If a batch fails,
+        every chunk written for ``pdf_id`` is deleted and the error re-raised.
+
+        Returns ``({"chunks", "embedded", "reused"}, texts)``.
+        """
+        batch_size = batch_size or self.batch_size
+
+        # Collect reusable vectors before clearing chunks a previous attempt may have written
+        reusable = {}
+        for source_id in (*reuse_from, pdf_id):
+            if source_id:
+                reusable.update(self.embeddings_by_hash(source_id, hash_text))
+        self.collection.delete_many({"pdf_id": pdf_id})
+
+        texts = []
+        vectors = []
+        embedded = 0
+        chunks = iter(chunks)
+        try:
+            while True:
+                batch = list(islice(chunks, batch_size))
+                if not batch:
+                    break
+                batch_texts = [chunk.text for chunk in batch]
+                hashes = [hash_text(text) for text in batch_texts]
+                missing = {digest: text for digest, text in zip(hashes, batch_texts) if digest not in reusable}
+                if missing:
+                    new_embeddings = self.embedding_function.encode(list(missing.values()), normalize_embeddings=True)
+                    reusable.update(zip(missing, new_embeddings))
+                    embedded += len(missing)
+                embeddings = np.vstack([reusable[digest] for digest in hashes]).astype(np.float32)
+                metadata = [{**chunk.metadata(), "chunk_hash": digest} for chunk, digest in zip(batch, hashes)]
+                self.add_chunks(pdf_id, batch_texts, embeddings, atomic=True, start_index=len(texts), metadata=metadata)
+                texts.extend(batch_texts)
+                vectors.append(embeddings)
+        except Exception:
+            self.collection.delete_many({"pdf_id": pdf_id})
+            raise
+
+        if texts:
+            self.index_pdf(pdf_id, np.vstack(vectors), texts)
+        else:
+            self.remove_pdf(pdf_id)
+        return {"chunks": len(texts), "embedded": embedded, "reused": len(texts) - embedded}, texts
+
+    def load_embeddings(self, pdf_id):
+        """Load a PDF's chunk embeddings from MongoDB as ``(matrix, texts)``."""
+        embeddings = []
+        texts = []
+        cursor = self.collection.find({"pdf_id": pdf_id}, {"_id": 0, "content": 1, **EMBEDDING_PROJECTION})
+        for doc in cursor.sort("chunk_index", 1):
+            embeddings.append(decode_embedding(doc))
+            texts.append(doc["content"])
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32), texts
+        return np.vstack(embeddings), texts
+
+    def embeddings_by_hash(self, pdf_id, hash_text):
+        """Map each stored chunk's content hash to its embedding for ``pdf_id``.
+
+        Chunks written before hashes were stored are hashed from their content
+        with ``hash_text``.
+        """
+        embeddings = {}
+        cursor = self.collection.find({"pdf_id": pdf_id}, {"_id": 0, "content": 1, "chunk_hash": 1, **EMBEDDING_PROJECTION})
+        for doc in cursor:
+            embeddings[doc.get("chunk_hash") or hash_text(doc["content"])] = decode_embedding(doc)
+        return embeddings
+
+    def reindex_pdf(self, pdf_id):
+        """Rebuild a PDF's index entry from the chunks stored in MongoDB."""
+        embeddings, texts = self.load_embeddings(pdf_id)
+        if texts:
+            self.index_pdf(pdf_id, embeddings, texts)
+        else:
+            self.remove_pdf(pdf_id)
+
+    def remove_pdf(self, pdf_id):
+        """Drop a PDF's chunk vectors from the search index, if this process has loaded it."""
+        if self.index is None:
+            return
+        with self._index_lock:
+            if self._fingerprints is None:
+                return
+            self.index.remove(pdf_id)
+            self._fingerprints.pop(pdf_id, None)
+        self._schedule_persist()
+
+    def add_document(self, pdf_id, pdf_content):
+        try:
+            embeddings = self.embedding_function.encode([pdf_content], normalize_embeddings=True)
+            start_index = self.collection.count_documents({"pdf_id": pdf_id})
+            result = self.add_chunks(pdf_id, [pdf_content], embeddings, start_index=start_index)
+            self.reindex_pdf(pdf_id)
+            logging.info(f"[INFO] Document added successfully with PDF ID: {pdf_id}")
+            return result
+        except Exception as e:
+            logging.error(f"[ERROR] Failed to add document: {e}", exc_info=True)
+            return None
+
+    def search(self, query, top_k=5, mode=None):
+        """Return the contents of the ``top_k`` chunks closest to ``query`` across all PDFs.
+
+        ``mode`` is "exact" (brute force) or "approximate" (index partitions);
+        it defaults to the store's ``search_mode``.
+        """
+        try:
+            mode = mode or self.search_mode
+            query_vector = self.embedding_function.encode(query, normalize_embeddings=True)
+
+            index = self._current_index()
+            if len(index) == 0:
+                logging.warning("[WARNING] No documents found in the vector store.")
+                return []
+
+            results = index.search(query_vector, top_k, exact=(mode == "exact"))
+            return [content for _, content, _ in results]
+        except Exception as e:
+            logging.error(f"[ERROR] Vector store search failed: {e}", exc_info=True)
+            return []
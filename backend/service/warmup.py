@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+
+
+class Warmup:
+    """Ordered startup steps that preload what requests would otherwise build lazily.
+
+    ``steps`` is a list of ``(name, callable)``. A failing step is logged and
+    skipped; whatever it was meant to preload is then built on first use. The
+    per-step timings are kept in ``report()`` for the readiness endpoint.
+    ``state`` is ``"pending"`` until ``run()`` or ``start()`` is called, then
+    ``"running"`` and finally ``"done"``. The steps run once per process; a
+    second ``run()`` waits for the first to finish.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.state = "pending"
+        self.timings = {}
+        self.errors = {}
+        self.total_seconds = None
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            started = self.state != "pending"
+            if not started:
+                self.state = "running"
+        if started:
+            self._finished.wait()
+            return
+
+        start = time.perf_counter()
+        for name, step in self.steps:
+            step_start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logging.error(f"[ERROR] Warmup step {name} failed: {e}", exc_info=True)
+            self.timings[name] = round(time.perf_counter() - step_start, 3)
+        self.total_seconds = round(time.perf_counter() - start, 3)
+        self.state = "done"
+        self._finished.set()
+
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
+        logging.info(f"[INFO] Warmup finished in {self.total_seconds:.2f}s ({steps}).")
+
+    def start(self):
+        """Run the steps on a background thread so the server can accept liveness probes meanwhile."""
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def report(self):
+        report = {"state": self.state, "steps": dict(self.timings)}
+        if self.total_seconds is not None:
+            report["total_seconds"] = self.total_seconds
+        if self.errors:
+            report["errors"] = dict(self.errors)
+        return report
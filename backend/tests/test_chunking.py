@@ -0,0 +1,48 @@
+from service.chunking import iter_chunks
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+def truncate_to_tokens(text, max_tokens):
+    return " ".join(text.split()[:max_tokens])
+
+
+def test_heading_starts_its_own_chunk():
+    pages = ["First point here. Second point here. Third one.\nWEEK 1\nIntro to the course and its goals."]
+
+    chunks = list(iter_chunks(pages, count_tokens, truncate_to_tokens, strategy="headings",
+                              max_tokens=50, min_tokens=20))
+
+    assert [chunk.text for chunk in chunks] == [
+        "First point here. Second point here. Third one.",
+        "WEEK 1 Intro to the course and its goals.",
+    ]
+    assert "heading" not in chunks[0].metadata()
+    assert chunks[1].metadata()["heading"] == "WEEK 1"
+
+
+def test_small_chunks_after_a_heading_merge_into_its_section():
+    pages = ["WEEK 1\nReadings are posted.\nQuizzes open Monday."]
+
+    chunks = list(iter_chunks(pages, count_tokens, truncate_to_tokens, strategy="headings",
+                              max_tokens=50, min_tokens=20))
+
+    assert len(chunks) == 1
+    assert chunks[0].metadata()["heading"] == "WEEK 1"
+
+
+def test_layout_blocks_record_character_span():
+    pages = ["Office hours:\n  Tuesday   2-4pm\n\nGrading: exams 60%, homework 40%"]
+    blocks = [["Office hours:\nTuesday 2-4pm", "Grading: exams 60%, homework 40%"]]
+
+    chunks = list(iter_chunks(pages, count_tokens, truncate_to_tokens, strategy="layout",
+                              max_tokens=5, min_tokens=1, page_blocks=blocks))
+
+    text = pages[0]
+    spans = [(chunk.metadata()["char_start"], chunk.metadata()["char_end"]) for chunk in chunks]
+    assert [text[start:end] for start, end in spans] == [
+        "Office hours:\n  Tuesday   2-4pm",
+        "Grading: exams 60%, homework 40%",
+    ]
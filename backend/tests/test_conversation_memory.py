@@ -0,0 +1,74 @@
+from service.conversation_memory import ConversationMemory, InMemoryConversationStore, is_follow_up
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_memory(token_budget=1000, summarizer=None):
+    return ConversationMemory(InMemoryConversationStore(), count_words, token_budget=token_budget, summarizer=summarizer)
+
+
+def add_exchanges(memory, count):
+    for i in range(count):
+        memory.add_turn("session", "pdf", f"question {i}", f"answer {i}")
+
+
+def test_history_returns_turns_in_order():
+    memory = make_memory()
+    add_exchanges(memory, 2)
+
+    assert [message["content"] for message in memory.history("session", "pdf")] == [
+        "question 0", "answer 0", "question 1", "answer 1"
+    ]
+
+
+def test_turn_rewinds_discarded_exchanges():
+    memory = make_memory()
+    add_exchanges(memory, 3)
+
+    history = memory.history("session", "pdf", turn=1)
+
+    assert [message["content"] for message in history] == ["question 0", "answer 0"]
+    memory.add_turn("session", "pdf", "edited question", "new answer")
+    assert [message["content"] for message in memory.history("session", "pdf")] == [
+        "question 0", "answer 0", "edited question", "new answer"
+    ]
+
+
+def test_turn_at_or_past_history_keeps_everything():
+    memory = make_memory()
+    add_exchanges(memory, 2)
+
+    assert len(memory.history("session", "pdf", turn=2)) == 4
+    assert len(memory.history("session", "pdf", turn=5)) == 4
+
+
+def test_rewinding_into_summarized_turns_clears_history():
+    memory = make_memory(token_budget=8, summarizer=lambda previous, turns: "earlier questions")
+    add_exchanges(memory, 4)
+    assert memory.history("session", "pdf")[0]["role"] == "system"
+
+    assert memory.history("session", "pdf", turn=0) == []
+    assert memory.history("session", "pdf") == []
+
+
+def test_sessions_and_pdfs_are_separate():
+    memory = make_memory()
+    add_exchanges(memory, 1)
+
+    assert memory.history("other", "pdf") == []
+    assert memory.history("session", "other-pdf") == []
+    assert memory.history(None, "pdf") == []
+
+
+def test_self_contained_questions_are_not_follow_ups():
+    assert not is_follow_up("When is the midterm exam for this course?")
+    assert not is_follow_up("Who is the instructor of CS 101?")
+
+
+def test_follow_ups_are_detected():
+    assert is_follow_up("When is it due?")
+    assert is_follow_up("What about the final exam?")
+    assert is_follow_up("And the office hours for labs?")
+    assert is_follow_up("Why?")
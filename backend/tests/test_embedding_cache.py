@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from service.embedding_cache import EmbeddingMatrixCache
+
+
+def loader_returning(*results):
+    calls = []
+    remaining = list(results)
+
+    def load(pdf_id):
+        calls.append(pdf_id)
+        return remaining.pop(0)
+
+    return load, calls
+
+
+def test_same_version_is_served_from_cache():
+    cache = EmbeddingMatrixCache(max_bytes=1024 * 1024)
+    load, calls = loader_returning((np.ones((1, 2), dtype=np.float32), ["a"]))
+
+    cache.get_or_load("pdf", load, version=3)
+    cache.get_or_load("pdf", load, version=3)
+
+    assert calls == ["pdf"]
+
+
+def test_new_version_reloads_a_stale_entry():
+    cache = EmbeddingMatrixCache(max_bytes=1024 * 1024)
+    partial = (np.ones((1, 2), dtype=np.float32), ["a"])
+    complete = (np.ones((2, 2), dtype=np.float32), ["a", "b"])
+    load, calls = loader_returning(partial, complete)
+
+    assert cache.get_or_load("pdf", load, version=3).texts == ["a"]
+    assert cache.get_or_load("pdf", load, version=4).texts == ["a", "b"]
+    assert calls == ["pdf", "pdf"]
+    assert len(cache) == 1
+    assert cache.size_bytes == cache.get("pdf").nbytes
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("groq")
+pytest.importorskip("httpx")
+pytest.importorskip("numpy")
+
+from service.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError, Provider
+
+
+class FakeChatServer:
+    """OpenAI-compatible chat completions endpoint on localhost.
+
+    Each model name maps to a behaviour: ``("ok", text)``, ``("error", status)``
+    or ``("slow", seconds, text)``. Requests per model are counted in ``hits``.
+    """
+
+    def __init__(self):
+        self.behaviours = {}
+        self.hits = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                model = body["model"]
+                server.hits[model] = server.hits.get(model, 0) + 1
+                behaviour = server.behaviours.get(model, ("ok", "hello"))
+                if behaviour[0] == "error":
+                    self._send_json(behaviour[1], {"error": {"message": "unavailable"}})
+                    return
+                if behaviour[0] == "slow":
+                    time.sleep(behaviour[1])
+                text = behaviour[-1]
+                if body.get("stream"):
+                    self._send_stream(model, text.split(" "))
+                else:
+                    self._send_json(200, {
+                        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": text}}]
+                    })
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model, words):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for index, word in enumerate(words):
+                    chunk = {
+                        "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": model,
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"content": word if index == 0 else f" {word}"}}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._server.block_on_close = False
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    with FakeChatServer() as fake:
+        yield fake
+
+
+def make_provider(server, model, **kwargs):
+    kwargs.setdefault("timeout", 5.0)
+    return Provider(f"groq:{model}", "test-key", model, base_url=server.base_url, **kwargs)
+
+
+MESSAGES = [{"role": "user", "content": "When is the midterm?"}]
+
+
+def test_complete_returns_primary_answer(server):
+    server.behaviours["primary"] = ("ok", "Week 8")
+    gateway = LLMGateway([make_provider(server, "primary"), make_provider(server, "backup")])
+
+    assert gateway.complete(MESSAGES) == ("Week 8", "groq:primary")
+    assert "backup" not in server.hits
+
+
+def test_complete_fails_over_on_server_error(server):
+    server.behaviours["primary"] = ("error", 500)
+    server.behaviours["backup"] = ("ok", "Week 8")
+    events = []
+    gateway = LLMGateway(
+        [make_provider(server, "primary"), make_provider(server, "backup")],
+        observer=lambda event, name, seconds: events.append((event, name))
+    )
+
+    assert gateway.complete(MESSAGES) == ("Week 8", "groq:backup")
+    assert ("failover", "groq:primary") in events
+
+
+def test_complete_without_failover_raises(server):
+    server.behaviours["primary"] = ("error", 503)
+    gateway = LLMGateway([make_provider(server, "primary"), make_provider(server, "backup")])
+
+    with pytest.raises(LLMUnavailableError):
+        gateway.complete(MESSAGES, allow_failover=False)
+    assert "backup" not in server.hits
+
+
+def test_stream_yields_tokens_in_order(server):
+    server.behaviours["primary"] = ("ok", "The midterm is in week 8")
+    gateway = LLMGateway([make_provider(server, "primary")])
+
+    tokens = list(gateway.stream(MESSAGES))
+
+    assert "".join(token for _, token in tokens) == "The midterm is in week 8"
+    assert {name for name, _ in tokens} == {"groq:primary"}
+
+
+def test_stream_fails_over_before_first_token(server):
+    server.behaviours["primary"] = ("error", 500)
+    server.behaviours["backup"] = ("ok", "Week 8")
+    gateway = LLMGateway([make_provider(server, "primary"), make_provider(server, "backup")])
+
+    tokens = list(gateway.stream(MESSAGES))
+
+    assert "".join(token for _, token in tokens) == "Week 8"
+    assert {name for name, _ in tokens} == {"groq:backup"}
+
+
+def test_open_breaker_skips_provider(server):
+    server.behaviours["primary"] = ("error", 500)
+    server.behaviours["backup"] = ("ok", "Week 8")
+    primary = make_provider(server, "primary", failure_threshold=2, reset_timeout=60.0)
+    gateway = LLMGateway([primary, make_provider(server, "backup")])
+
+    for _ in range(3):
+        assert gateway.complete(MESSAGES) == ("Week 8", "groq:backup")
+
+    assert primary.breaker.state == "open"
+    assert server.hits["primary"] == 2
+    assert gateway.status()["groq:primary"] == "open"
+
+
+def test_half_open_trial_closes_breaker_on_success(server):
+    server.behaviours["primary"] = ("ok", "Week 8")
+    primary = make_provider(server, "primary", failure_threshold=1, reset_timeout=0.0)
+    primary.breaker.record_failure()
+    gateway = LLMGateway([primary])
+
+    assert primary.breaker.state == "half-open"
+    assert gateway.complete(MESSAGES) == ("Week 8", "groq:primary")
+    assert primary.breaker.state == "closed"
+
+
+def test_expired_deadline_releases_trial_slot(server):
+    primary = make_provider(server, "primary", failure_threshold=1, reset_timeout=0.0)
+    primary.breaker.record_failure()
+    gateway = LLMGateway([primary], deadline=0.0)
+
+    with pytest.raises(LLMUnavailableError):
+        gateway.complete(MESSAGES)
+    with pytest.raises(LLMUnavailableError):
+        list(gateway.stream(MESSAGES))
+
+    assert "primary" not in server.hits
+    assert primary.breaker.allow()
+
+
+def test_cancelled_hedge_loser_releases_trial_slot(server):
+    server.behaviours["primary"] = ("slow", 1.0, "late")
+    server.behaviours["backup"] = ("ok", "Week 8")
+    primary = make_provider(server, "primary", failure_threshold=1, reset_timeout=0.0)
+    primary.breaker.record_failure()
+    primary.latency.record(0.01)
+    gateway = LLMGateway(
+        [primary, make_provider(server, "backup")], hedge_percentile=50, hedge_min_samples=1
+    )
+
+    async def run():
+        result = await gateway.acomplete(MESSAGES)
+        # Let the loser's cancellation and done callbacks run
+        await asyncio.sleep(0.05)
+        return result
+
+    assert asyncio.run(run()) == ("Week 8", "groq:backup")
+    assert primary.breaker.allow()
+
+
+def test_breaker_allows_one_trial_at_a_time():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_hedged_path_reports_failover(server):
+    server.behaviours["primary"] = ("error", 500)
+    server.behaviours["backup"] = ("ok", "Week 8")
+    primary = make_provider(server, "primary")
+    primary.latency.record(5.0)
+    events = []
+    gateway = LLMGateway(
+        [primary, make_provider(server, "backup")], hedge_percentile=50, hedge_min_samples=1,
+        observer=lambda event, name, seconds: events.append((event, name))
+    )
+
+    assert gateway.complete(MESSAGES) == ("Week 8", "groq:backup")
+    assert ("failover", "groq:primary") in events
+
+
+def test_saturated_pool_runs_unhedged(server):
+    server.behaviours["primary"] = ("slow", 0.3, "Week 8")
+    server.behaviours["backup"] = ("ok", "Week 9")
+    primary = make_provider(server, "primary")
+    primary.latency.record(0.01)
+    events = []
+    gateway = LLMGateway(
+        [primary, make_provider(server, "backup")], hedge_percentile=50, hedge_min_samples=1,
+        observer=lambda event, name, seconds: events.append((event, name)), max_workers=1
+    )
+
+    assert gateway.complete(MESSAGES) == ("Week 8", "groq:primary")
+    assert not any(event == "hedge" for event, _ in events)
+    assert "backup" not in server.hits
+
+
+def test_hedge_fires_when_the_pool_has_room(server):
+    server.behaviours["primary"] = ("slow", 0.3, "Week 8")
+    server.behaviours["backup"] = ("ok", "Week 9")
+    primary = make_provider(server, "primary")
+    primary.latency.record(0.01)
+    gateway = LLMGateway([primary, make_provider(server, "backup")], hedge_percentile=50, hedge_min_samples=1)
+
+    assert gateway.complete(MESSAGES) == ("Week 9", "groq:backup")
+    time.sleep(0.4)
+    assert gateway._pool_in_use == 0
@@ -0,0 +1,75 @@
+import pytest
+
+from service.metrics import MetricsRegistry
+
+
+def test_render_includes_every_metric_type():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", labelnames=("route",), buckets=(0.1, 1.0))
+    counter = registry.counter("calls_total", "Calls.", labelnames=("provider",))
+    registry.gauge("cache_bytes", "Cache size.", lambda: 2048)
+
+    histogram.observe(0.05, route="chat")
+    histogram.observe(0.5, route="chat")
+    counter.inc(provider="groq")
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{route="chat",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="chat",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{route="chat"} 2' in lines
+    assert 'calls_total{provider="groq"} 1' in lines
+    assert "# TYPE cache_bytes gauge" in lines
+    assert "cache_bytes 2048" in lines
+
+
+def test_gauge_reads_current_value_at_scrape_time():
+    registry = MetricsRegistry()
+    state = {"size": 1}
+    registry.gauge("cache_bytes", "Cache size.", lambda: state["size"])
+
+    assert "cache_bytes 1" in registry.render().splitlines()
+    state["size"] = 4096
+    assert "cache_bytes 4096" in registry.render().splitlines()
+
+
+def test_gauge_rejects_a_value_instead_of_a_reader():
+    registry = MetricsRegistry()
+
+    with pytest.raises(TypeError):
+        registry.gauge("cache_bytes", "Cache size.", 2048)
+
+
+def test_failing_gauge_is_skipped_without_breaking_the_scrape():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "Calls.").inc()
+
+    def broken():
+        raise RuntimeError("unavailable")
+
+    registry.gauge("broken_gauge", "Always fails.", broken)
+
+    rendered = registry.render()
+
+    assert "calls_total 1" in rendered
+    assert "broken_gauge" not in rendered
+
+
+def test_app_cache_gauges_render_through_the_real_registry():
+    pytest.importorskip("numpy")
+    import numpy as np
+
+    from service.answer_cache import SemanticAnswerCache
+    from service.embedding_cache import EmbeddingMatrixCache
+    from service.metrics import register_cache_gauges, registry
+
+    embedding_cache = EmbeddingMatrixCache(max_bytes=1024 * 1024)
+    embedding_cache.put("pdf", np.ones((2, 4), dtype=np.float32), ["a", "b"])
+    register_cache_gauges(registry, embedding_cache, SemanticAnswerCache())
+
+    lines = registry.render().splitlines()
+
+    assert f"embedding_cache_bytes {embedding_cache.size_bytes}" in lines
+    assert embedding_cache.size_bytes > 0
+    assert "answer_cache_entries 0" in lines
+    assert "answer_cache_hit_ratio 0" in lines
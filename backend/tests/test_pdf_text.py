@@ -0,0 +1,53 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+mongomock = pytest.importorskip("mongomock")
+
+from bson import ObjectId
+
+from service import pdf_text
+from service.pdf_text import PdfTextStore
+
+
+class FakeGridOut:
+    def __init__(self, data):
+        self.length = len(data)
+        self._chunks = [data]
+
+    def readchunk(self):
+        return self._chunks.pop() if self._chunks else b""
+
+
+class FakeFS:
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+
+    def get(self, file_id):
+        self.reads += 1
+        return FakeGridOut(self.data)
+
+
+def make_pdf(pages):
+    document = fitz.open()
+    for text in pages:
+        document.new_page().insert_text((72, 72), text)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def test_page_tokens_are_stored_when_the_text_is_too_large(monkeypatch):
+    monkeypatch.setattr(pdf_text, "MAX_STORED_TEXT_BYTES", 1)
+    fs = FakeFS(make_pdf(["Midterm in week eight", "Final exam in December"]))
+    store = PdfTextStore(mongomock.MongoClient().db.pdf_text, fs)
+    pdf_id = str(ObjectId())
+
+    first = store.get_page_tokens(pdf_id, lambda text: len(text.split()))
+    second = store.get_page_tokens(pdf_id, lambda text: len(text.split()))
+
+    assert first == second == [4, 4]
+    assert fs.reads == 1
+    # The counts-only record does not stand in for the page text
+    assert len(store.get_pages(pdf_id)) == 2
+    assert fs.reads == 2
@@ -0,0 +1,143 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from service.chunking import Chunk, Segment
+from service.vector_store import BulkInsertError, CustomMongoDBVectorStore
+
+
+def make_store(collection, index_path):
+    return CustomMongoDBVectorStore(
+        collection=collection, embedding_function=None, index_path=str(index_path), persist_delay=60.0
+    )
+
+
+def add_pdf(store, pdf_id, vectors):
+    texts = [f"{pdf_id} chunk {i}" for i in range(len(vectors))]
+    store.add_chunks(pdf_id, texts, np.asarray(vectors, dtype=np.float32))
+    store.index_pdf(pdf_id, np.asarray(vectors, dtype=np.float32), texts)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.embeddings
+
+
+def test_writes_before_the_index_is_loaded_do_not_build_it(collection, tmp_path):
+    store = make_store(collection, tmp_path / "index")
+
+    add_pdf(store, "a", [[1.0, 0.0]])
+    store.remove_pdf("b")
+
+    assert store.index is None
+    assert store.warm_index() == 1
+
+
+def test_snapshot_is_written_on_flush_only(collection, tmp_path):
+    store = make_store(collection, tmp_path / "index")
+    store.warm_index()
+    add_pdf(store, "a", [[1.0, 0.0], [0.0, 1.0]])
+
+    assert not (tmp_path / "index.json").exists()
+    store.flush()
+    assert (tmp_path / "index.json").exists()
+    assert (tmp_path / "index.state.json").exists()
+
+
+def test_loaded_snapshot_is_reconciled_with_mongodb(collection, tmp_path):
+    writer = make_store(collection, tmp_path / "index")
+    writer.warm_index()
+    add_pdf(writer, "a", [[1.0, 0.0]])
+    add_pdf(writer, "gone", [[0.0, 1.0]])
+    writer.flush()
+
+    # Another process changes the collection after the snapshot was written
+    other = make_store(collection, tmp_path / "other-index")
+    other.add_chunks("b", ["b chunk 0"], np.array([[0.6, 0.8]], dtype=np.float32))
+    collection.delete_many({"pdf_id": "gone"})
+
+    reader = make_store(collection, tmp_path / "index")
+    assert reader.load_snapshot() == 2
+    assert reader.warm_index() == 2
+
+    results = reader.index.search(np.array([[0.6, 0.8]], dtype=np.float32), 5, exact=True)
+    assert {pdf_id for pdf_id, _, _ in results} == {"a", "b"}
+
+
+class FixedEmbedder:
+    def encode(self, text, normalize_embeddings=True):
+        return np.array([[1.0, 0.0]], dtype=np.float32)
+
+
+class FakeCounter:
+    def __init__(self):
+        self.value = 0
+
+    def version(self):
+        return self.value
+
+
+def test_search_reconciles_after_another_process_writes(collection, tmp_path):
+    counter = FakeCounter()
+    reader = CustomMongoDBVectorStore(collection, FixedEmbedder(), index_path=str(tmp_path / "index"), changes=counter)
+    reader.add_chunks("old", ["old syllabus"], np.array([[1.0, 0.0]], dtype=np.float32))
+    assert reader.search("query", mode="exact") == ["old syllabus"]
+
+    # Another worker replaces the syllabus and bumps the shared counter
+    writer = make_store(collection, tmp_path / "writer-index")
+    collection.delete_many({"pdf_id": "old"})
+    writer.add_chunks("new", ["new syllabus"], np.array([[1.0, 0.0]], dtype=np.float32))
+    counter.value += 1
+
+    assert reader.search("query", mode="exact") == ["new syllabus"]
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.calls.append(list(texts))
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunks(texts, consumed=None):
+    for text in texts:
+        if consumed is not None:
+            consumed.append(text)
+        yield Chunk([Segment(text, 1, None, None, len(text.split()))])
+
+
+def test_ingest_chunks_embeds_and_writes_in_batches(collection, tmp_path):
+    embedder = CountingEmbedder()
+    store = CustomMongoDBVectorStore(collection, embedder, index_path=str(tmp_path / "index"), batch_size=2)
+    store.add_chunks("old", ["week one"], np.array([[8.0, 1.0]], dtype=np.float32),
+                     metadata=[{"chunk_hash": hash_text("week one")}])
+    consumed = []
+
+    result, texts = store.ingest_chunks(
+        "new", make_chunks(["week one", "week two", "week three"], consumed), hash_text, reuse_from=("old",)
+    )
+
+    assert result == {"chunks": 3, "embedded": 2, "reused": 1}
+    assert texts == consumed == ["week one", "week two", "week three"]
+    assert embedder.calls == [["week two"], ["week three"]]
+    stored = collection.find({"pdf_id": "new"}).sort("chunk_index", 1)
+    assert [(doc["chunk_index"], doc["content"]) for doc in stored] == list(enumerate(texts))
+
+
+def test_failed_ingest_batch_removes_the_pdf_chunks(collection, tmp_path):
+    store = CustomMongoDBVectorStore(collection, CountingEmbedder(), index_path=str(tmp_path / "index"), batch_size=1)
+    oversized = "x" * (17 * 1024 * 1024)
+
+    with pytest.raises(BulkInsertError):
+        store.ingest_chunks("pdf", make_chunks(["fine", oversized]), hash_text)
+
+    assert collection.count_documents({"pdf_id": "pdf"}) == 0
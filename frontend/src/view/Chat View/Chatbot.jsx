@@ -134,7 +134,9 @@ const Chatbot = ({ pdfId, pdfContent, onClose, syllabus }) => {
       setCurrentBotMessage('');
       setShowLoadingDots(true);
       try {
-        const payload = { message: userInput, pdfId, pdfContent };
+        // Exchanges already on screen, so the server history matches what the user sees
+        const turn = messages.filter((msg) => msg.sender === 'user').length;
+        const payload = { message: userInput, pdfId, pdfContent, turn };
 
         const response = await axios.post(
           'http://localhost:5000/chatbot/chat_with_pdf_embeddings',
@@ -194,7 +196,9 @@ const Chatbot = ({ pdfId, pdfContent, onClose, syllabus }) => {
       setMessages(truncatedMessages);
 
       // Send the updated question to the chatbot and display its response
-      const payload = { message: editingText, pdfId, pdfContent };
+      // The server drops its history from the edited message onwards
+      const turn = messages.slice(0, editingMessage).filter((msg) => msg.sender === 'user').length;
+      const payload = { message: editingText, pdfId, pdfContent, turn };
       setLoading(true);
       setShowLoadingDots(true); // Show loading dots for the new response
       try {